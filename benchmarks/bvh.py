@@ -0,0 +1,63 @@
+"""
+Time culling N random boxes through a BVH against testing every box at
+once, the two ways ObjModel culls clusters, checking both agree (no GL
+context required). BVH_MIN_BOXES is where the BVH starts to pay off.
+
+usage: python -m benchmarks.bvh [repeat] [spread]
+"""
+import sys
+import time
+
+import numpy as np
+
+from utils.bvh import BVH
+from utils.math import (
+    boxes_in_frustum,
+    frustum_planes,
+    make_look_at,
+    make_perspective,
+)
+
+COUNTS = [43, 500, 5000, 50000]
+
+
+def run(repeat=200, spread=1000.0):
+    rng = np.random.default_rng(24)
+    for count in COUNTS:
+        centers = rng.uniform(-spread, spread, (count, 3)).astype(np.float32)
+        extents = rng.uniform(0.1, 3.0, (count, 3)).astype(np.float32)
+        bvh = BVH(centers, extents)
+
+        frustums = [
+            frustum_planes(
+                make_perspective(60.0, 16 / 9, 0.2, 200.0)
+                * make_look_at(
+                    rng.uniform(-spread, spread, 3),
+                    rng.uniform(-spread, spread, 3) * 0.1,
+                    [0.0, 1.0, 0.0],
+                )
+            )
+            for _ in range(repeat)
+        ]
+
+        start = time.perf_counter()
+        through_bvh = [bvh.cull(planes) for planes in frustums]
+        tree = time.perf_counter() - start
+
+        start = time.perf_counter()
+        at_once = [
+            boxes_in_frustum(planes, centers, extents) for planes in frustums
+        ]
+        flat = time.perf_counter() - start
+
+        assert all((a == b).all() for a, b in zip(through_bvh, at_once))
+        visible = np.mean([mask.mean() for mask in at_once])
+        print(
+            f"{count} boxes ({visible:.1%} visible): "
+            f"bvh {tree / repeat * 1e6:.0f}us, "
+            f"all at once {flat / repeat * 1e6:.0f}us per frustum"
+        )
+
+
+if __name__ == "__main__":
+    run(*[cast(arg) for cast, arg in zip([int, float], sys.argv[1:])])
@@ -0,0 +1,86 @@
+"""
+Orbit the camera around the car and treadmill of the scene, as the mouse
+does in View.calculate_angle, and compare no culling, frustum culling
+and frustum culling with the far plane clamped to the fog: segments
+culled, draw calls issued and the Python time of culling and rendering.
+The far plane is pushed out to FAR, past the fog. Every OpenGL entry
+point is replaced by a counting no-op as in render_model, so no GL
+context is required.
+
+usage: python -m benchmarks.culling [frames]
+"""
+import sys
+import time
+from collections import defaultdict
+
+from benchmarks.render_model import calls, replace_gl
+
+SEGMENTS = [6, 50, 500]
+FAR = 20000.0
+
+
+class Input:
+    delta = (0, 0)
+    state = defaultdict(bool)
+
+
+def run(frames=360):
+    replace_gl()
+    import constants
+    from entities.Car import Car
+    from entities.Treadmill import Treadmill
+    from renderer.frame_data import fog_distance, frame_data
+    from renderer.View import View
+    from shader.texture_loader import texture_loader
+    from utils.lod_builder import lod_builder
+    from utils.stats import stats
+
+    car = Car()
+    for count in SEGMENTS:
+        treadmill = Treadmill(car=car, count=count)
+        # the same LODs as a warm mesh cache
+        lod_builder.wait()
+        for name, culling, fog in [
+            ("no culling", False, False),
+            ("frustum culling", True, False),
+            ("frustum and fog culling", True, True),
+        ]:
+            constants.FRUSTUM_CULLING = culling
+            view = View(mouse=Input(), keyboard=Input())
+            view.distance_far = FAR
+            if fog:
+                view.distance_fog = fog_distance()
+            stats.counters.clear()
+            calls.clear()
+
+            elapsed = 0.0
+            for frame in range(frames):
+                view.angle_yaw = frame * 360.0 / frames
+                view.update(1280, 720, view_target=car)
+                frame_data.update(view)
+
+                start = time.perf_counter()
+                for entity in [car, treadmill]:
+                    if entity.in_frustum(view):
+                        entity.render(view=view)
+                elapsed += time.perf_counter() - start
+
+            draws = calls["glDrawElements"] + calls["glDrawElementsInstanced"]
+            print(
+                f"{count} segments, {name}: "
+                f"{elapsed / frames * 1e3:.2f}ms, "
+                f"{draws / frames:.0f} draw calls, "
+                f"{stats.counters['triangles'] / frames / 1e6:.2f}M "
+                "triangles, "
+                f"{stats.counters['instances culled'] / frames:.1f} segments "
+                f"and {stats.counters['clusters culled'] / frames:.1f} "
+                "clusters culled per frame"
+            )
+        treadmill.release()
+    car.release()
+    texture_loader.shutdown()
+    lod_builder.shutdown()
+
+
+if __name__ == "__main__":
+    run(*map(int, sys.argv[1:]))
@@ -0,0 +1,112 @@
+"""
+Compare peak memory of reading .obj files with readlines() against the
+streaming reader, on the bundled models and a synthetic 1M triangle grid.
+Every measurement runs in a fresh process and only the growth of the peak
+RSS over the RSS before loading is reported, so Linux only.
+
+usage: python -m benchmarks.load_memory [triangles]
+"""
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+
+import numpy as np
+
+from benchmarks.load_obj import MODELS
+from utils.obj import deindex, parse_obj, parse_obj_stream
+
+LOADERS = ["readlines", "stream"]
+
+
+def write_grid(filename, num_tris, num_materials=4):
+    """Square grid of quads split into triangles, with a few usemtl
+    switches so chunks span several read blocks."""
+    side = max(1, int(np.sqrt(num_tris / 2)))
+    u, v = np.meshgrid(np.arange(side + 1), np.arange(side + 1))
+    u, v = u.reshape(-1) / side, v.reshape(-1) / side
+    heights = 0.1 * np.sin(8 * u) * np.cos(8 * v)
+
+    quad = np.arange(side * side)
+    a = (quad // side) * (side + 1) + quad % side + 1
+    corners = np.stack([a, a + 1, a + side + 2, a, a + side + 2, a + side + 1])
+    corners = corners.T.reshape(-1, 3)
+
+    with open(filename, "w") as out_file:
+        np.savetxt(out_file, np.stack([u, heights, v], 1), "v %.6f %.6f %.6f")
+        np.savetxt(out_file, np.stack([u, v], 1), "vt %.6f %.6f")
+        out_file.write("vn 0.0 1.0 0.0\n")
+        for i, tris in enumerate(np.array_split(corners, num_materials)):
+            out_file.write(f"usemtl grid{i}\n")
+            np.savetxt(
+                out_file,
+                np.repeat(tris, 2, axis=1),
+                "f %d/%d/1 %d/%d/1 %d/%d/1",
+            )
+    return len(corners)
+
+
+def reset_peak_rss():
+    # resets VmHWM, otherwise the peak reached while importing would hide
+    # that of loading small models
+    with open("/proc/self/clear_refs", "w") as out_file:
+        out_file.write("5")
+
+
+def peak_rss():
+    with open("/proc/self/status") as in_file:
+        for line in in_file:
+            if line.startswith("VmHWM:"):
+                return int(line.split()[1]) * 1024
+    raise RuntimeError("VmHWM not available")
+
+
+def current_rss():
+    with open("/proc/self/statm") as in_file:
+        return int(in_file.read().split()[1]) * resource.getpagesize()
+
+
+def measure(loader, filename):
+    reset_peak_rss()
+    before = current_rss()
+    if loader == "readlines":
+        with open(filename, "r", encoding="utf8") as in_file:
+            obj_data = parse_obj(in_file.readlines())
+    else:
+        with open(filename, "rb") as in_file:
+            obj_data = parse_obj_stream(in_file)
+    streams = deindex(obj_data)[:3]
+
+    output = sum(array.nbytes for array in streams)
+    print(peak_rss() - before, output)
+
+
+def run(num_tris=1_000_000):
+    with tempfile.TemporaryDirectory() as temp_dir:
+        grid = os.path.join(temp_dir, "grid.obj")
+        write_grid(grid, num_tris)
+
+        for filename in MODELS + [grid]:
+            size = os.path.getsize(filename) / 2**20
+            print(f"{os.path.basename(filename)} ({size:.1f}MiB):")
+            for loader in LOADERS:
+                result = subprocess.run(
+                    [sys.executable, "-m", __spec__.name, loader, filename],
+                    capture_output=True,
+                    check=True,
+                    text=True,
+                )
+                peak, output = (int(v) for v in result.stdout.split())
+                print(
+                    f"  {loader:>9}: peak {peak / 2**20:7.1f}MiB, "
+                    f"output {output / 2**20:6.1f}MiB "
+                    f"({peak / output:.2f}x)"
+                )
+
+
+if __name__ == "__main__":
+    if len(sys.argv) == 3:
+        measure(*sys.argv[1:])
+    else:
+        run(int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000)
@@ -0,0 +1,44 @@
+"""
+Time .obj parsing and vertex stream packing (no GL context required).
+
+usage: python -m benchmarks.load_obj [repeat]
+"""
+import sys
+import time
+
+import numpy as np
+
+from utils.obj import deindex, parse_obj
+
+MODELS = [
+    "assets/bridge/brije.obj",
+    "assets/camaro/Chevrolet_Camaro_SS_Low.obj",
+]
+
+
+def load(filename):
+    with open(filename, "r", encoding="utf8") as in_file:
+        positions, normals, uvs, chunks = deindex(
+            parse_obj(in_file.readlines())
+        )
+    for stream in [positions, normals, uvs]:
+        np.ascontiguousarray(stream, dtype=np.float32)
+    return positions, chunks
+
+
+def run(repeat=10):
+    for filename in MODELS:
+        timings = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            positions, chunks = load(filename)
+            timings.append(time.perf_counter() - start)
+        print(
+            f"{filename}: {len(positions)} verts, {len(chunks)} chunks, "
+            f"best {min(timings) * 1000:.1f}ms, "
+            f"median {sorted(timings)[len(timings) // 2] * 1000:.1f}ms"
+        )
+
+
+if __name__ == "__main__":
+    run(int(sys.argv[1]) if len(sys.argv) > 1 else 10)
@@ -0,0 +1,66 @@
+"""
+Time parallel .obj parsing at 1/2/4/8 workers against the serial streaming
+parser on a synthetic grid, checking that every result matches exactly.
+
+usage: python -m benchmarks.parse_parallel [triangles] [repeat]
+"""
+import os
+import sys
+import tempfile
+import time
+
+from benchmarks.load_memory import write_grid
+from utils.obj import OBJ_ARRAYS, parse_obj_parallel, parse_obj_stream
+
+WORKERS = [1, 2, 4, 8]
+
+
+def same(a, b):
+    return (
+        all(
+            getattr(a, field).dtype == getattr(b, field).dtype
+            and getattr(a, field).tobytes() == getattr(b, field).tobytes()
+            for field in OBJ_ARRAYS
+        )
+        and a.material_chunks == b.material_chunks
+        and a.material_libs == b.material_libs
+    )
+
+
+def best_of(repeat, parse):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = parse()
+        timings.append(time.perf_counter() - start)
+    return result, min(timings)
+
+
+def serial(filename):
+    with open(filename, "rb") as in_file:
+        return parse_obj_stream(in_file)
+
+
+def run(num_tris=1_000_000, repeat=3):
+    with tempfile.TemporaryDirectory() as temp_dir:
+        grid = os.path.join(temp_dir, "grid.obj")
+        # many materials so chunks are cut at range boundaries
+        write_grid(grid, num_tris, num_materials=37)
+        print(f"{os.cpu_count()} cpus, {num_tris} triangles")
+
+        expected, serial_time = best_of(repeat, lambda: serial(grid))
+        print(f"   serial: {serial_time * 1000:7.1f}ms")
+
+        for workers in WORKERS:
+            result, parallel_time = best_of(
+                repeat, lambda: parse_obj_parallel(grid, workers)
+            )
+            print(
+                f"{workers:>2} worker: {parallel_time * 1000:7.1f}ms "
+                f"({serial_time / parallel_time:.2f}x), "
+                f"{'matches' if same(expected, result) else 'DIFFERS'}"
+            )
+
+
+if __name__ == "__main__":
+    run(*(int(arg) for arg in sys.argv[1:]))
@@ -0,0 +1,93 @@
+"""
+Time the Python side of ObjModel.render for the shipped models. Every
+OpenGL entry point is replaced by a counting no-op, so no GL context is
+required and only the work done in Python is measured.
+
+usage: python -m benchmarks.render_model [frames]
+"""
+import itertools
+import sys
+import time
+from collections import Counter
+
+import OpenGL.GL as gl
+
+from benchmarks.load_obj import MODELS
+from shader.texture_loader import texture_loader
+from shader.uniforms import GLSL_TYPES, declared_uniforms
+from shader.utils import load_glsl
+
+calls = Counter()
+
+
+def counting(name):
+    def call(*args, **kwargs):
+        calls[name] += 1
+        return 1
+
+    return call
+
+
+def replace_gl():
+    for name in dir(gl):
+        if name.startswith("gl") and callable(getattr(gl, name)):
+            setattr(gl, name, counting(name))
+    # shader.utils keeps programs by name, and ObjModel checks the one
+    # in use, so programs get distinct names and are tracked
+    programs = itertools.count(1)
+    current = {gl.GL_CURRENT_PROGRAM: 0}
+    use_program = counting("glUseProgram")
+
+    def use(program):
+        current[gl.GL_CURRENT_PROGRAM] = program
+        use_program(program)
+
+    gl.glCreateProgram = lambda: next(programs)
+    gl.glUseProgram = use
+    gl.glGetIntegerv = lambda name: current.get(name, 1)
+
+    # keep the loader on the raw path, its s3tc check needs a context
+    texture_loader.compressed = False
+
+    # reflection reports what the ObjModel shader declares
+    declared = list(
+        declared_uniforms(
+            [load_glsl("objmodel_vertex"), load_glsl("objmodel_fragment")]
+        ).items()
+    )
+
+    def active_uniform(program, index):
+        name, glsl_type = declared[index]
+        return name.encode(), 1, GLSL_TYPES[glsl_type]
+
+    gl.glGetProgramiv = lambda program, name: len(declared)
+    gl.glGetActiveUniform = active_uniform
+
+
+def run(frames=1000):
+    replace_gl()
+    from entities.ObjModel import ObjModel
+
+    for filename in MODELS:
+        model = ObjModel(filename)
+        for flags in [ObjModel.RF_All, ObjModel.RF_Opaque]:
+            model.render(renderFlags=flags, transforms={})
+            calls.clear()
+
+            start = time.perf_counter()
+            for _ in range(frames):
+                model.render(renderFlags=flags, transforms={})
+            elapsed = time.perf_counter() - start
+
+            print(
+                f"{filename} (flags {flags}): "
+                f"{elapsed / frames * 1e6:.1f}us, "
+                f"{sum(calls.values()) / frames:.0f} gl calls, "
+                f"{calls['glDrawElements'] / frames:.0f} draws per frame"
+            )
+        model.delete()
+    texture_loader.shutdown()
+
+
+if __name__ == "__main__":
+    run(*map(int, sys.argv[1:]))
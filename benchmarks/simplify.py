@@ -0,0 +1,42 @@
+"""
+Time building the LODs of each model, as the lod_builder worker does on
+a cache miss, and print their triangles and errors. build_lods checks
+every LOD with check_lods, so this fails on a broken simplification (no
+GL context required).
+
+usage: python -m benchmarks.simplify
+"""
+import time
+
+from utils.obj import build_lods, load_obj
+
+MODELS = [
+    "assets/bridge/brije.obj",
+    "assets/camaro/Chevrolet_Camaro_SS_Low.obj",
+]
+
+
+def run():
+    for filename in MODELS:
+        mesh = load_obj(filename)
+        start = time.perf_counter()
+        mesh = build_lods(mesh)
+        elapsed = time.perf_counter() - start
+
+        triangles = [sum(count for _, _, count in mesh.chunks) // 3]
+        emptied = []
+        for _, chunks in mesh.lods:
+            triangles.append(sum(count for _, _, count in chunks) // 3)
+            emptied.append(sum(count == 0 for _, _, count in chunks))
+        print(
+            f"{filename}: {elapsed:.2f}s, triangles "
+            + " / ".join(map(str, triangles))
+            + ", error "
+            + " / ".join(f"{error:.3f}" for error, _ in mesh.lods)
+            + ", chunks simplified away "
+            + " / ".join(map(str, emptied))
+        )
+
+
+if __name__ == "__main__":
+    run()
@@ -0,0 +1,114 @@
+"""
+Time deriving the model to view, model to clip and normal matrices of N
+entities one at a time, as prepare_uniforms does without a batch, against
+TransformBatch.update doing all of them at once (no GL context required).
+
+usage: python -m benchmarks.transform_batch [frames]
+"""
+import math
+import sys
+import time
+
+import numpy as np
+
+from entities.Entity import Entity
+from renderer.transform_batch import TransformBatch
+from renderer.uniform import transform_matrices
+from utils.math import (
+    make_look_at,
+    make_perspective,
+    make_rotation_y,
+    make_scale,
+    make_translation,
+)
+
+COUNTS = [11, 100, 1000, 5000]
+
+
+class View:
+    world_to_view_transform = None
+    view_to_clip_transform = make_perspective(60.0, 16 / 9, 0.2, 2000.0)
+
+    def move(self, frame: int) -> None:
+        angle = frame * 0.01
+        self.world_to_view_transform = make_look_at(
+            [20.0 * math.sin(angle), 8.0, 20.0 * math.cos(angle)],
+            [0.0, 1.6, 0.0],
+            [0.0, 1.0, 0.0],
+        )
+
+
+def make_entities(count: int, rng: np.random.Generator):
+    """A mix of rigid, uniformly and non uniformly scaled entities, every
+    fourth attached to the one before it, like the lights to the car."""
+    entities = []
+    for index in range(count):
+        entity = Entity(name=f"entity {index}")
+        transform = make_translation(
+            *rng.uniform(-100.0, 100.0, 3)
+        ) * make_rotation_y(rng.uniform(-math.pi, math.pi))
+        if index % 3 == 1:
+            transform = transform * make_scale(*[rng.uniform(0.1, 10.0)] * 3)
+        elif index % 3 == 2:
+            transform = transform * make_scale(*rng.uniform(0.1, 10.0, 3))
+        entity.set_transform(transform)
+        if index % 4 == 3:
+            entity.set_parent(entities[-1])
+        entities.append(entity)
+    return entities
+
+
+def run(frames=200):
+    rng = np.random.default_rng(21)
+    view = View()
+    for count in COUNTS:
+        entities = make_entities(count, rng)
+        batch = TransformBatch()
+        for entity in entities:
+            batch.add(entity)
+
+        start = time.perf_counter()
+        for frame in range(frames):
+            view.move(frame)
+            for entity in entities:
+                transform_matrices(
+                    view,
+                    entity.model_to_world_transform(),
+                    entity.model_to_world_normal(),
+                )
+        single = time.perf_counter() - start
+
+        start = time.perf_counter()
+        for frame in range(frames):
+            view.move(frame)
+            batch.update(view)
+            for entity in entities:
+                batch.get(entity)
+        batched = time.perf_counter() - start
+
+        error = 0.0
+        for entity in entities:
+            expected = transform_matrices(
+                view,
+                entity.model_to_world_transform(),
+                entity.model_to_world_normal(),
+            )
+            for value, reference in zip(batch.get(entity), expected):
+                error = max(
+                    error,
+                    float(
+                        np.abs(value.getData() - reference.getData()).max()
+                        / np.abs(reference.getData()).max()
+                    ),
+                )
+
+        print(
+            f"{count} entities: one at a time {single / frames * 1e3:.3f}ms, "
+            f"batched {batched / frames * 1e3:.3f}ms per frame "
+            f"({single / batched:.1f}x), largest relative difference "
+            f"{error:.1e}"
+        )
+
+
+if __name__ == "__main__":
+    run(*map(int, sys.argv[1:]))
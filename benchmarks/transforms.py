@@ -0,0 +1,161 @@
+"""
+Time the transforms the entities of the scene update and upload every
+frame, with the car moving and at rest. Every OpenGL entry point is
+replaced by a counting no-op as in render_model, so no GL context is
+required.
+
+The closed form inverses and normal matrices of rigid, uniformly scaled
+and affine transforms are first checked against np.linalg.inv in float64.
+
+usage: python -m benchmarks.transforms [frames]
+"""
+import math
+import sys
+import time
+
+import numpy as np
+
+from benchmarks.render_model import replace_gl
+from utils.math import (
+    AFFINE,
+    RIGID,
+    UNIFORM,
+    inverse,
+    make_rotation_x,
+    make_rotation_y,
+    make_rotation_z,
+    make_scale,
+    make_translation,
+    normal_matrix,
+)
+
+KIND_NAMES = {RIGID: "rigid", UNIFORM: "uniform", AFFINE: "affine"}
+
+
+def random_transform(rng: np.random.Generator, kind: int):
+    m = (
+        make_translation(*rng.uniform(-100.0, 100.0, 3))
+        * make_rotation_z(rng.uniform(-math.pi, math.pi))
+        * make_rotation_x(rng.uniform(-math.pi, math.pi))
+        * make_rotation_y(rng.uniform(-math.pi, math.pi))
+    )
+    if kind == UNIFORM:
+        m = m * make_scale(*[rng.uniform(0.05, 400.0)] * 3)
+    elif kind == AFFINE:
+        m = m * make_scale(*rng.uniform(0.05, 400.0, 3))
+    assert m.kind == kind
+    return m
+
+
+def relative_error(value: np.ndarray, expected: np.ndarray) -> float:
+    return float(np.abs(value - expected).max() / np.abs(expected).max())
+
+
+def check_accuracy(count=2000):
+    rng = np.random.default_rng(19)
+    for kind, name in KIND_NAMES.items():
+        errors = []
+        for _ in range(count):
+            m = random_transform(rng, kind)
+            data = m.getData().astype(np.float64)
+            errors.append(
+                (
+                    relative_error(inverse(m).getData(), np.linalg.inv(data)),
+                    relative_error(
+                        normal_matrix(m).getData(),
+                        np.linalg.inv(data[:3, :3]).T,
+                    ),
+                )
+            )
+        inverse_error, normal_error = np.max(errors, axis=0)
+        print(
+            f"{name}: largest relative error of inverse {inverse_error:.1e}, "
+            f"normal matrix {normal_error:.1e}"
+        )
+        assert max(inverse_error, normal_error) < 1e-5
+
+
+def run(frames=20000):
+    check_accuracy()
+    replace_gl()
+    from entities.Car import Car
+    from entities.Entity import Entity
+    from entities.Treadmill import Treadmill
+    from renderer.uniform import LIGHT_L, LIGHT_R, prepare_uniforms
+    from utils.math import Mat4, make_look_at, make_perspective
+
+    # the entities of neon_drive.load_assets without models or programs,
+    # only their transforms are needed
+    car = object.__new__(Car)
+    Entity.__init__(car, name="Car")
+    car.translation = Mat4()
+    car.rotation = Mat4()
+    car.place()
+
+    lights = [Entity(name="Sphere") for _ in range(2)]
+    for light, transform in zip(lights, [LIGHT_L, LIGHT_R]):
+        light.set_parent(car)
+        light.set_transform(transform)
+
+    ground = Entity(name="Ground")
+    ground.set_transform(make_scale(150, 1, 150))
+    cubemap = Entity(name="CubeMap")
+    cubemap.set_transform(make_scale(400.0, 400.0, 400.0))
+
+    treadmill = object.__new__(Treadmill)
+    # skip loading the model
+    treadmill._init_resources = lambda: None
+    Treadmill.__init__(treadmill, car=car)
+
+    view = type("View", (), {})()
+    view.world_to_view_transform = make_look_at(
+        [0.0, 8.0, 20.0], [0.0, 1.6, 0.0], [0.0, 1.0, 0.0]
+    )
+    view.view_to_clip_transform = make_perspective(60.0, 16 / 9, 0.2, 2000.0)
+
+    groups = [
+        ("car", [car]),
+        ("lights", lights),
+        ("static", [ground, cubemap]),
+        ("treadmill", [treadmill]),
+    ]
+    for moving in [True, False]:
+        elapsed = {name: 0.0 for name, _ in groups}
+        for frame in range(frames):
+            start = time.perf_counter()
+            # what Car.update and Treadmill.update change every frame
+            if moving:
+                car.drift_yaw = math.sin(frame * 0.01) * 30.0
+                car.place()
+            treadmill.position = (
+                treadmill.position + car.velocity
+            ) % treadmill.range
+            treadmill.place()
+            elapsed["treadmill"] += time.perf_counter() - start
+
+            for name, entities in groups:
+                start = time.perf_counter()
+                for entity in entities:
+                    prepare_uniforms(
+                        program=1,
+                        view=view,
+                        model_to_world_transform=(
+                            entity.model_to_world_transform()
+                        ),
+                        model_to_world_normal=entity.model_to_world_normal(),
+                    )
+                elapsed[name] += time.perf_counter() - start
+
+        print(
+            f"car {'moving' if moving else 'at rest'}: "
+            f"{sum(elapsed.values()) / frames * 1e6:.1f}us per frame ("
+            + ", ".join(
+                f"{name} {value / frames * 1e6:.1f}us"
+                for name, value in elapsed.items()
+            )
+            + ")"
+        )
+
+
+if __name__ == "__main__":
+    run(*map(int, sys.argv[1:]))
@@ -0,0 +1,49 @@
+"""
+Report vertex shader invocations for the shipped models, assuming a FIFO
+post-transform cache (no GL context required).
+
+usage: python -m benchmarks.vertex_cache [cache size]
+"""
+import sys
+import time
+
+from benchmarks.load_obj import MODELS
+from utils.mesh import optimize_vertex_cache, simulate_vertex_cache, weld
+from utils.obj import deindex, parse_obj
+
+
+def run(cache_size):
+    for filename in MODELS:
+        with open(filename, "r", encoding="utf8") as in_file:
+            positions, normals, uvs, chunks = deindex(
+                parse_obj(in_file.readlines())
+            )
+
+        start = time.perf_counter()
+        unique, welded = weld(positions, normals, uvs)
+        weld_time = time.perf_counter() - start
+
+        start = time.perf_counter()
+        optimized, _ = optimize_vertex_cache(
+            welded, [(offset, count) for _, offset, count in chunks]
+        )
+        optimize_time = time.perf_counter() - start
+
+        drawn = len(positions)
+        before = simulate_vertex_cache(welded, cache_size)
+        after = simulate_vertex_cache(optimized, cache_size)
+        print(
+            f"{filename}: {len(welded) // 3} triangles\n"
+            f"  glDrawArrays:              {drawn} invocations\n"
+            f"  welded ({len(unique[0])} verts):     {before} invocations "
+            f"(ACMR {3 * before / drawn:.2f})\n"
+            f"  welded + cache ordered:    {after} invocations "
+            f"(ACMR {3 * after / drawn:.2f}, "
+            f"{100 * (1 - after / drawn):.0f}% fewer than glDrawArrays)\n"
+            f"  weld {weld_time * 1000:.0f}ms, "
+            f"ordering {optimize_time * 1000:.0f}ms"
+        )
+
+
+if __name__ == "__main__":
+    run(int(sys.argv[1]) if len(sys.argv) > 1 else 24)
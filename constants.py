@@ -40,3 +40,45 @@ CAPTURE_MOUSE = True  # get_env_bool("CAPTURE_MOUSE")
 TARGET_FPS = 120
 
 WIREFRAME = False
+
+# parsed .obj files are cached here, keyed on the .obj/.mtl contents
+MESH_CACHE_DIR = os.environ.get("MESH_CACHE_DIR", ".cache/meshes")
+DISABLE_MESH_CACHE = get_env_bool("DISABLE_MESH_CACHE", "false")
+
+# "compact": half float uvs and 2_10_10_10 normals/tangents in one
+# interleaved buffer, "full": float32 for every attribute
+VERTEX_FORMAT = os.environ.get("VERTEX_FORMAT", "compact")
+# store ObjModel positions as normalized uint16 within the model bounds
+QUANTIZE_POSITIONS = get_env_bool("QUANTIZE_POSITIONS", "false")
+# material chunks of more triangles are split into clusters of at most
+# this many when loaded, so parts of a large mesh are culled on their own,
+# 0 keeps chunks whole
+MESH_CLUSTER_TRIANGLES = int(os.environ.get("MESH_CLUSTER_TRIANGLES", "0"))
+# worker processes used to parse large .obj files, 1 parses serially
+OBJ_PARSE_WORKERS = int(os.environ.get("OBJ_PARSE_WORKERS", "1"))
+
+# largest screen space error, in pixels, a simplified LOD may cause, 0
+# always renders full detail
+LOD_PIXEL_ERROR = float(os.environ.get("LOD_PIXEL_ERROR", "1.0"))
+# worker processes simplifying LODs of meshes loaded without them
+LOD_BUILD_WORKERS = int(os.environ.get("LOD_BUILD_WORKERS", "1"))
+# extra margin needed before switching to a coarser LOD, so models near a
+# switching distance do not pop back and forth
+LOD_HYSTERESIS = 0.25
+# skip entities, instances and index ranges outside of the view frustum
+FRUSTUM_CULLING = get_env_bool("FRUSTUM_CULLING", "true")
+# fraction of its colour the fog may leave of geometry that is culled,
+# and where the far plane is clamped to, 0 disables
+FOG_CULL_VISIBILITY = float(os.environ.get("FOG_CULL_VISIBILITY", "0.002"))
+# segments of road the treadmill draws with one instanced draw call
+TREADMILL_SEGMENTS = int(os.environ.get("TREADMILL_SEGMENTS", "6"))
+
+# threads decoding textures in the background
+TEXTURE_LOAD_THREADS = int(os.environ.get("TEXTURE_LOAD_THREADS", "4"))
+# bytes of texture data copied for upload per frame, at least one image
+TEXTURE_UPLOAD_BUDGET = 8 << 20
+# skip glUniform calls that would upload the value a program already has
+SHADOW_UNIFORMS = get_env_bool("SHADOW_UNIFORMS", "true")
+# textures compressed ahead of time by cook.py are read from here
+COOKED_TEXTURE_DIR = os.environ.get("COOKED_TEXTURE_DIR", ".cache/textures")
+DISABLE_COOKED_TEXTURES = get_env_bool("DISABLE_COOKED_TEXTURES", "false")
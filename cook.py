@@ -0,0 +1,8 @@
+import sys
+
+from utils.log import init_logger
+from utils.texture_cook import main
+
+if __name__ == "__main__":
+    init_logger()
+    main(sys.argv[1:])
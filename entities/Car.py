@@ -4,7 +4,7 @@ from entities.Entity import Entity
 from renderer.control import Keyboard, Mouse, Time
 from renderer.uniform import prepare_uniforms
 from renderer.View import View
-from utils.math import clamp, make_rotation_y, make_translation
+from utils.math import Mat4, clamp, make_rotation_y, make_translation
 
 
 class Car(Entity):
@@ -25,11 +25,18 @@ class Car(Entity):
     yaw_max = 35
     yaw_min = -35
 
+    # rewritten by every place
+    translation: Mat4
+    rotation: Mat4
+
     def __init__(self):
         super().__init__(
             name="Car",
             filename="assets/camaro/Chevrolet_Camaro_SS_Low.obj",
         )
+        self.translation = Mat4()
+        self.rotation = Mat4()
+        self.place()
 
     def update(
         self,
@@ -91,8 +98,18 @@ class Car(Entity):
         elif yaw < 0:
             yaw = min(yaw + 10 * self.return_speed, 0)
 
-        self.drift_yaw = yaw
-        self.position = [x, z, y]
+        # the lights and everything else attached stay put with the car
+        if yaw != self.drift_yaw or [x, z, y] != self.position:
+            self.drift_yaw = yaw
+            self.position = [x, z, y]
+            self.place()
+
+    def place(self):
+        translation = make_translation(*self.position, out=self.translation)
+        rotation = make_rotation_y(
+            math.radians(self.drift_yaw), out=self.rotation
+        )
+        self.set_transform(translation * rotation)
 
     def render(self, view: View = None):
         super().render(view=view)
@@ -100,10 +117,7 @@ class Car(Entity):
         prepare_uniforms(
             program=self.model.defaultShader,
             view=view,
-            light_position=self.position,
-            light_rotation=self.drift_yaw,
-            model_to_world_transform=make_translation(*self.position)
-            * make_rotation_y(math.radians(self.drift_yaw)),
+            entity=self,
         )
 
-        self.model.render(transforms={})
+        self.model.render(transforms={}, lod=self.lod, frustum=self.frustum)
@@ -1,15 +1,16 @@
-from typing import Any
+from typing import Any, Callable
 
 import OpenGL.GL as gl
-from PIL import Image
 
 from entities.Entity import Entity
+from renderer.gl_state import gl_state
 from renderer.uniform import prepare_uniforms
 from renderer.View import View
 from shader.Shader import Shader
+from shader.texture_loader import TextureRequest, texture_loader
 from shader.utils import create_vertex_obj, prepare_vertex_data_buffer
 from utils.log import get_logger
-from utils.math import Mat4, make_scale, make_translation, vec3
+from utils.math import make_scale, make_translation, vec3
 
 logger = get_logger()
 
@@ -60,37 +61,7 @@ CUBE_VERTICES = [
 ]
 
 
-def load_cube_textures() -> int:
-    texture_id = gl.glGenTextures(1)
-    gl.glBindTexture(gl.GL_TEXTURE_CUBE_MAP, texture_id)
-
-    surfaces = {
-        "posx": gl.GL_TEXTURE_CUBE_MAP_POSITIVE_X,
-        "negx": gl.GL_TEXTURE_CUBE_MAP_NEGATIVE_X,
-        "posy": gl.GL_TEXTURE_CUBE_MAP_POSITIVE_Y,
-        "negy": gl.GL_TEXTURE_CUBE_MAP_NEGATIVE_Y,
-        "posz": gl.GL_TEXTURE_CUBE_MAP_POSITIVE_Z,
-        "negz": gl.GL_TEXTURE_CUBE_MAP_NEGATIVE_Z,
-    }
-
-    for surface, face_id in surfaces.items():
-        path = f"assets/skybox/{surface}.dds"
-        with Image.open(path).transpose(Image.FLIP_TOP_BOTTOM) as image:
-            data = image.tobytes("raw", "RGBA", 0, -1)
-            gl.glTexImage2D(
-                face_id,
-                0,
-                gl.GL_RGBA,
-                image.size[0],
-                image.size[1],
-                0,
-                gl.GL_RGBA,
-                gl.GL_UNSIGNED_BYTE,
-                data,
-            )
-
-    gl.glGenerateMipmap(gl.GL_TEXTURE_CUBE_MAP)
-
+def set_cube_parameters():
     gl.glTexParameteri(
         gl.GL_TEXTURE_CUBE_MAP,
         gl.GL_TEXTURE_MAG_FILTER,
@@ -102,49 +73,61 @@ def load_cube_textures() -> int:
         gl.GL_LINEAR_MIPMAP_LINEAR,
     )
     gl.glTexParameteri(
-        gl.GL_TEXTURE_2D,
+        gl.GL_TEXTURE_CUBE_MAP,
         gl.GL_TEXTURE_WRAP_R,
         gl.GL_CLAMP_TO_EDGE,
     )
     gl.glTexParameteri(
-        gl.GL_TEXTURE_2D,
+        gl.GL_TEXTURE_CUBE_MAP,
         gl.GL_TEXTURE_WRAP_S,
         gl.GL_CLAMP_TO_EDGE,
     )
     gl.glTexParameteri(
-        gl.GL_TEXTURE_2D,
+        gl.GL_TEXTURE_CUBE_MAP,
         gl.GL_TEXTURE_WRAP_T,
         gl.GL_CLAMP_TO_EDGE,
     )
-    gl.glTexParameteri(
-        gl.GL_TEXTURE_2D,
-        gl.GL_TEXTURE_MAG_FILTER,
-        gl.GL_LINEAR,
-    )
-    gl.glTexParameteri(
-        gl.GL_TEXTURE_2D,
-        gl.GL_TEXTURE_MIN_FILTER,
-        gl.GL_LINEAR,
-    )
 
-    return texture_id
+
+def load_cube_textures(on_ready: Callable[[int], None]) -> TextureRequest:
+    surfaces = {
+        "posx": gl.GL_TEXTURE_CUBE_MAP_POSITIVE_X,
+        "negx": gl.GL_TEXTURE_CUBE_MAP_NEGATIVE_X,
+        "posy": gl.GL_TEXTURE_CUBE_MAP_POSITIVE_Y,
+        "negy": gl.GL_TEXTURE_CUBE_MAP_NEGATIVE_Y,
+        "posz": gl.GL_TEXTURE_CUBE_MAP_POSITIVE_Z,
+        "negz": gl.GL_TEXTURE_CUBE_MAP_NEGATIVE_Z,
+    }
+
+    return texture_loader.load_cube(
+        {
+            face_id: f"assets/skybox/{surface}.dds"
+            for surface, face_id in surfaces.items()
+        },
+        flip=True,
+        parameters=set_cube_parameters,
+        on_ready=on_ready,
+    )
 
 
 class CubeMap(Entity):
     vertex_obj: Any
 
-    texture_id: int
+    # -1 until the faces are loaded, a white placeholder is bound until then
+    texture_id: int = -1
+    texture_request: TextureRequest
+    # the unit the cubemap sampler reads
+    texture_unit: int = 3
 
     shader: Shader
 
-    position: Mat4 = make_scale(400.0, 400.0, 400.0)
-
     def __init__(self):
         super().__init__("CubeMap")
+        self.set_transform(make_scale(400.0, 400.0, 400.0))
 
         self.upload_data()
 
-        self.texture_id = load_cube_textures()
+        self.texture_request = load_cube_textures(self.textures_loaded)
 
         self.shader = Shader(
             vertex_source_filename="cubemap_vertex",
@@ -157,9 +140,24 @@ class CubeMap(Entity):
         self.vertex_obj = create_vertex_obj()
         prepare_vertex_data_buffer(self.vertex_obj, CUBE_VERTICES, 0)
 
+    def textures_loaded(self, texture_id: int):
+        self.texture_id = texture_id
+
+    def release(self):
+        texture_loader.cancel(self.texture_request)
+        if self.texture_id != -1:
+            gl_state.delete_textures([self.texture_id])
+        self.shader.release()
+        super().release()
+
     def use(self):
-        gl.glActiveTexture(gl.GL_TEXTURE3)
-        gl.glBindTexture(gl.GL_TEXTURE_CUBE_MAP, self.texture_id)
+        gl_state.bind_texture(
+            gl.GL_TEXTURE_CUBE_MAP,
+            self.texture_id
+            if self.texture_id != -1
+            else texture_loader.placeholder(gl.GL_TEXTURE_CUBE_MAP),
+            unit=self.texture_unit,
+        )
 
     def render(self, view: View = None):
         super().render(view=view)
@@ -168,17 +166,12 @@ class CubeMap(Entity):
         prepare_uniforms(
             program=self.shader.program,
             view=view,
-            model_to_world_transform=self.position,
-            light_position=vec3(0),
-            light_rotation=vec3(0),
+            entity=self,
             uniform_overrides={
-                "cubemap": 0,
+                "cubemap": self.texture_unit,
                 "fogColor": vec3(0.63),
             },
         )
 
-        gl.glBindVertexArray(self.vertex_obj)
+        gl_state.bind_vertex_array(self.vertex_obj)
         gl.glDrawArrays(gl.GL_TRIANGLES, 0, len(CUBE_VERTICES))
-        gl.glBindVertexArray(0)
-
-        gl.glUseProgram(0)
@@ -1,14 +1,126 @@
+import math
+import os
+from typing import List
+
+import numpy as np
+
+import constants
 from entities.ObjModel import ObjModel
 from renderer.control import Keyboard, Mouse, Time
 from renderer.View import View
+from utils.math import (
+    AFFINE,
+    Mat3,
+    Mat4,
+    classify_spheres,
+    multiply,
+    normal_matrix,
+)
+from utils.registry import Registry
+
+# entities naming the same file share one ObjModel (buffers, textures and
+# program), each entity only keeps its own transform
+models = Registry("model")
+
+
+def model_key(filename: str) -> str:
+    return os.path.normcase(os.path.abspath(filename))
+
+
+def bounding_spheres(model: ObjModel, transforms: np.ndarray):
+    """
+    World space centers, (N, 3), and scales, (N,), of the bounding sphere
+    of the model under each of the (N, 4, 4) model to world transforms,
+    the radius being model.boundingRadius times the scale. Non uniform
+    scales are rounded up to be safe.
+    """
+    linear = transforms[:, :3, :3]
+    centers = linear @ model.boundingCenter + transforms[:, :3, 3]
+    scales = np.linalg.norm(linear, axis=1).max(axis=1)
+    return centers, scales
+
+
+def select_lod(
+    model: ObjModel, model_to_world: Mat4, view: View, current: int = 0
+) -> int:
+    """
+    Coarsest LOD of the model whose error, projected to the screen at the
+    distance of the bounding sphere, stays below LOD_PIXEL_ERROR pixels.
+    Moving to a coarser LOD than the current one needs LOD_HYSTERESIS more
+    margin than moving back.
+    """
+    return int(
+        select_lods(
+            model, model_to_world.getData()[None], view, np.array([current])
+        )[0]
+    )
+
+
+def select_lods(
+    model: ObjModel, transforms: np.ndarray, view: View, current: np.ndarray
+) -> np.ndarray:
+    """
+    select_lod of every model to world transform in transforms, an
+    (N, 4, 4) array, at once. current holds the LOD of each from the
+    last frame.
+    """
+    if len(model.lods) == 1 or constants.LOD_PIXEL_ERROR <= 0.0:
+        return np.zeros(len(transforms), dtype=int)
+
+    centers, scales = bounding_spheres(model, transforms)
+    distances = np.maximum(
+        np.linalg.norm(centers - view.position, axis=1)
+        - model.boundingRadius * scales,
+        view.distance_near,
+    )
+    # screen size of one world unit at that distance
+    pixels = view.height / (
+        2.0 * math.tan(math.radians(view.fov) / 2.0) * distances
+    )
+
+    lods = np.zeros(len(transforms), dtype=int)
+    # coarser LODs overwrite finer ones wherever they are good enough
+    for lod in range(1, len(model.lods)):
+        errors = model.lods[lod][0] * scales * pixels
+        errors = np.where(
+            lod > current, errors * (1.0 + constants.LOD_HYSTERESIS), errors
+        )
+        lods[errors <= constants.LOD_PIXEL_ERROR] = lod
+    return lods
 
 
 class Entity:
+    """
+    A node of the scene graph. The model to world transform is the local
+    transform below the parent's, cached with its normal matrix until
+    the local transform of the entity or one of its ancestors changes.
+    """
+
     name: str
     filename: str
     model: ObjModel
     position = [0.0, 0.0, 0.0]
 
+    # level of detail of the model picked by the last render
+    lod: int = 0
+    # view frustum planes in model space while the bounding sphere
+    # crosses one of them, for ObjModel.render to cull ranges against
+    frustum: np.ndarray = None
+
+    parent: "Entity" = None
+    children: List["Entity"]
+    # relative to the parent, or the world without one
+    transform: Mat4
+    world: Mat4
+    world_normal: Mat3
+    # upper left of the world transform world_normal was computed from
+    world_linear: np.ndarray
+    # set while world and world_normal are stale, every descendant of a
+    # dirty entity is dirty as well
+    dirty: bool = True
+    # row of world in renderer.transform_batch once added there
+    batch_index: int = None
+
     def __init__(self, name: str = None, filename: str = None):
         """
         kwargs:
@@ -18,12 +130,26 @@ class Entity:
         assert name is not None
 
         self.name = name
+        self.children = []
+        self.transform = Mat4()
+        self.world = Mat4()
+        self.world_normal = Mat3()
+        self.world_linear = np.full((3, 3), np.nan, dtype=np.float32)
         if filename is not None:
             self.filename = filename
             self._init_resources()
 
     def _init_resources(self):
-        self.model = ObjModel(self.filename)
+        self.model = models.acquire(
+            model_key(self.filename),
+            lambda: ObjModel(self.filename),
+            ObjModel.delete,
+        )
+
+    def release(self):
+        if getattr(self, "model", None) is not None:
+            models.release(model_key(self.filename))
+            self.model = None
 
     def update(
         self,
@@ -41,9 +167,80 @@ class Entity:
         assert mouse is not None
         assert time is not None
 
+    def set_parent(self, parent: "Entity" = None) -> None:
+        if self.parent is not None:
+            self.parent.children.remove(self)
+        self.parent = parent
+        if parent is not None:
+            parent.children.append(self)
+        self.invalidate()
+
+    def set_transform(self, transform: Mat4) -> None:
+        self.transform = transform
+        self.invalidate()
+
+    def invalidate(self) -> None:
+        if self.dirty:
+            return
+        self.dirty = True
+        for child in self.children:
+            child.invalidate()
+
+    def model_to_world_transform(self) -> Mat4:
+        if self.dirty:
+            if self.parent is None:
+                np.copyto(self.world.matData, self.transform.matData)
+                self.world.kind = self.transform.kind
+            else:
+                multiply(
+                    self.parent.model_to_world_transform(),
+                    self.transform,
+                    self.world,
+                )
+            # only the affine case inverts, skip that while the entity
+            # just moves, like the treadmill
+            linear = self.world.matData[:3, :3]
+            if self.world.kind < AFFINE or not np.array_equal(
+                linear, self.world_linear
+            ):
+                normal_matrix(self.world, self.world_normal)
+                self.world_linear[:] = linear
+            self.dirty = False
+        return self.world
+
+    def model_to_world_normal(self) -> Mat3:
+        self.model_to_world_transform()
+        return self.world_normal
+
+    def in_frustum(self, view: View) -> bool:
+        """
+        Whether the bounding sphere of the model is at least partly in the
+        view frustum, entities without a model always are. Called by the
+        engine before render, which is skipped otherwise.
+        """
+        self.frustum = None
+        if not constants.FRUSTUM_CULLING:
+            return True
+        if getattr(self, "model", None) is None:
+            return True
+
+        transform = self.model_to_world_transform().getData()
+        centers, scales = bounding_spheres(self.model, transform[None])
+        visible, crossing = classify_spheres(
+            view.frustum_planes, centers, self.model.boundingRadius * scales
+        )
+        if crossing[0]:
+            self.frustum = view.frustum_planes @ transform
+        return bool(visible[0])
+
     def render(self, view: View = None):
         """
         kwargs:
             view: View
         """
         assert view is not None
+
+        if getattr(self, "model", None) is not None:
+            self.lod = select_lod(
+                self.model, self.model_to_world_transform(), view, self.lod
+            )
@@ -4,10 +4,12 @@ import OpenGL.GL as gl
 
 from entities.Car import Car
 from entities.Entity import Entity
+from renderer.gl_state import gl_state
 from renderer.uniform import prepare_uniforms
 from renderer.View import View
 from shader.Shader import Shader
 from shader.Texture import Texture
+from shader.texture_cache import Sampling
 from shader.utils import create_vertex_obj, prepare_vertex_data_buffer
 from utils.math import make_scale, vec3
 
@@ -26,27 +28,8 @@ TEXTURE_COORDINATES = [
 ]
 
 
-def set_texture_parameters():
-    gl.glTexParameteri(
-        gl.GL_TEXTURE_2D,
-        gl.GL_TEXTURE_WRAP_S,
-        gl.GL_REPEAT,
-    )
-    gl.glTexParameteri(
-        gl.GL_TEXTURE_2D,
-        gl.GL_TEXTURE_WRAP_T,
-        gl.GL_REPEAT,
-    )
-    gl.glTexParameteri(
-        gl.GL_TEXTURE_2D,
-        gl.GL_TEXTURE_MAG_FILTER,
-        gl.GL_LINEAR,
-    )
-    gl.glTexParameteri(
-        gl.GL_TEXTURE_2D,
-        gl.GL_TEXTURE_MIN_FILTER,
-        gl.GL_LINEAR,
-    )
+# no mipmaps are sampled on the ground
+GROUND_SAMPLING = Sampling(gl.GL_REPEAT, gl.GL_LINEAR, gl.GL_LINEAR)
 
 
 class Ground(Entity):
@@ -62,12 +45,13 @@ class Ground(Entity):
         assert car is not None
 
         self.car = car
+        self.set_transform(make_scale(150, 1, 150))
 
         self.upload_data()
 
         self.texture = Texture(
             "ground/ground.png",
-            set_parameters=set_texture_parameters,
+            sampling=GROUND_SAMPLING,
             mode="RGBX",
         )
 
@@ -81,6 +65,11 @@ class Ground(Entity):
         prepare_vertex_data_buffer(self.vertex_obj, SQUARE_VERTS, 0)
         prepare_vertex_data_buffer(self.vertex_obj, TEXTURE_COORDINATES, 1)
 
+    def release(self):
+        self.texture.release()
+        self.shader.release()
+        super().release()
+
     def render(self, view: View = None):
         super().render(view=view)
 
@@ -89,9 +78,7 @@ class Ground(Entity):
         prepare_uniforms(
             program=self.shader.program,
             view=view,
-            model_to_world_transform=make_scale(150, 1, 150),
-            light_position=self.car.position,
-            light_rotation=self.car.drift_yaw,
+            entity=self,
             uniform_overrides={
                 "groundTexture": 0,
                 "texCoordScale": 10.0,
@@ -102,8 +89,5 @@ class Ground(Entity):
             },
         )
 
-        gl.glBindVertexArray(self.vertex_obj)
+        gl_state.bind_vertex_array(self.vertex_obj)
         gl.glDrawArrays(gl.GL_TRIANGLE_FAN, 0, len(SQUARE_VERTS))
-        gl.glBindVertexArray(0)
-
-        gl.glUseProgram(0)
@@ -1,15 +1,15 @@
-import math
 from typing import Any, Literal
 
 import OpenGL.GL as gl
 
 from entities.Car import Car
 from entities.Entity import Entity
+from renderer.gl_state import gl_state
 from renderer.uniform import LIGHT_COLOR, LIGHT_L, LIGHT_R, prepare_uniforms
 from renderer.View import View
 from shader.Shader import Shader
 from shader.utils import create_vertex_obj, prepare_vertex_data_buffer
-from utils.math import Mat4, create_sphere, make_rotation_y, make_translation
+from utils.math import create_sphere
 
 
 class Light(Entity):
@@ -18,8 +18,6 @@ class Light(Entity):
     shader: Shader
     car: Car
 
-    position: Mat4
-
     def __init__(
         self,
         car: Car = None,
@@ -30,10 +28,12 @@ class Light(Entity):
         assert position == "L" or position == "R"
         self.car = car
 
+        # attached to the car, in its model space
+        self.set_parent(car)
         if position == "L":
-            self.position = LIGHT_L
+            self.set_transform(LIGHT_L)
         elif position == "R":
-            self.position = LIGHT_R
+            self.set_transform(LIGHT_R)
         else:
             raise AssertionError(f"position '{position}' was not 'L' or 'R'")
 
@@ -49,19 +49,19 @@ class Light(Entity):
         prepare_vertex_data_buffer(self.vertex_obj, self.vertices, 0)
         prepare_vertex_data_buffer(self.vertex_obj, self.vertices, 1)
 
+    def release(self):
+        self.shader.release()
+        super().release()
+
     def render(self, view: View = None):
         super().render(view=view)
 
         prepare_uniforms(
             program=self.shader.program,
             view=view,
-            model_to_world_transform=make_translation(*self.car.position)
-            * make_rotation_y(math.radians(self.car.drift_yaw))
-            * self.position,
-            light_position=self.car.position,
-            light_rotation=self.car.drift_yaw,
+            entity=self,
             uniform_overrides={"sphereColour": LIGHT_COLOR},
         )
 
-        gl.glBindVertexArray(self.vertex_obj)
+        gl_state.bind_vertex_array(self.vertex_obj)
         gl.glDrawArrays(gl.GL_TRIANGLES, 0, len(self.vertices))
@@ -1,17 +1,30 @@
 # flake8: noqa
 
+import ctypes
 import os
 
+import numpy as np
 import OpenGL.GL as gl
-from PIL import Image
 
+import constants
+from renderer.gl_state import gl_state
+from shader.texture_cache import Sampling, texture_cache
 from shader.utils import (
+    acquire_shader,
     bind_texture,
-    build_shader,
-    create_bind_vertex_attrib_array_float,
+    create_bind_interleaved_vertex_buffer,
     load_glsl,
+    prepare_index_data_buffer,
+    program_uniforms,
+    release_shader,
 )
-from utils.math import Mat3, Mat4
+from utils.bvh import BVH, BVH_MIN_BOXES, split_clusters
+from utils.lod_builder import lod_builder
+from utils.math import Mat3, Mat4, boxes_in_frustum
+from utils.mesh_cache import load_mesh
+from utils.obj import build_mesh
+from utils.stats import stats
+from utils.vertex_format import pack_vertices
 
 
 class ObjModel:
@@ -25,6 +38,9 @@ class ObjModel:
     AA_TexCoord = 2
     AA_Tangent = 3
     AA_Bitangent = 4
+    # per instance, a mat4 in 5 to 8 and a mat3 in 9 to 11
+    AA_InstanceTransform = 5
+    AA_InstanceNormal = 9
 
     TU_Diffuse = 0
     TU_Opacity = 1
@@ -32,12 +48,19 @@ class ObjModel:
     TU_Normal = 3
     TU_EnvMap = 4
 
+    # gl.GL_TEXTURE_MAX_ANISOTROPY_EXT 16 would go here
+    textureSampling = Sampling(
+        gl.GL_REPEAT, gl.GL_LINEAR_MIPMAP_LINEAR, gl.GL_LINEAR
+    )
+
     fileName = "ObjModel"
+    # LODs being built in the background, see load
+    lodRequest = None
 
     def __init__(self, fileName):
         self.fileName = os.path.basename(fileName)
         self.defaultTextureOne = gl.glGenTextures(1)
-        gl.glBindTexture(gl.GL_TEXTURE_2D, self.defaultTextureOne)
+        gl_state.bind_texture(gl.GL_TEXTURE_2D, self.defaultTextureOne)
         gl.glTexImage2D(
             gl.GL_TEXTURE_2D,
             0,
@@ -51,7 +74,7 @@ class ObjModel:
         )
 
         self.defaultNormalTexture = gl.glGenTextures(1)
-        gl.glBindTexture(gl.GL_TEXTURE_2D, self.defaultNormalTexture)
+        gl_state.bind_texture(gl.GL_TEXTURE_2D, self.defaultNormalTexture)
         gl.glTexImage2D(
             gl.GL_TEXTURE_2D,
             0,
@@ -63,291 +86,407 @@ class ObjModel:
             gl.GL_FLOAT,
             [0.5, 0.5, 0.5, 1.0],
         )
-        gl.glBindTexture(gl.GL_TEXTURE_2D, 0)
 
         self.overrideDiffuseTextureWithDefault = False
         self.load(fileName)
 
-        self.defaultShader = build_shader(
+        self.defaultShader = acquire_shader(
             self.defaultVertexShader,
             self.defaultFragmentShader,
             self.getDefaultAttributeBindings(),
         )
-        gl.glUseProgram(self.defaultShader)
+        gl_state.use_program(self.defaultShader)
         self.setDefaultUniformBindings(self.defaultShader)
-        gl.glUseProgram(0)
+
+        self.instancedShader = acquire_shader(
+            self.instancedVertexShader,
+            self.defaultFragmentShader,
+            self.getDefaultAttributeBindings(),
+        )
+        gl_state.use_program(self.instancedShader)
+        self.setDefaultUniformBindings(self.instancedShader)
+        # created by the first renderInstanced
+        self.instanceBuffer = None
+
+    def delete(self):
+        if self.lodRequest is not None:
+            lod_builder.cancel(self.lodRequest)
+            self.lodRequest = None
+
+        # material textures may be shared with other models
+        for key, onReady in self.textureUsers:
+            texture_cache.release(key, onReady)
+        self.textureUsers = []
+
+        gl_state.delete_textures(
+            [self.defaultTextureOne, self.defaultNormalTexture]
+        )
+
+        gl.glDeleteBuffers(2, [self.vertexBuffer, self.indexBuffer])
+        if self.instanceBuffer is not None:
+            gl.glDeleteBuffers(1, [self.instanceBuffer])
+        gl_state.delete_vertex_arrays([self.vertexArrayObject])
+        release_shader(self.defaultShader)
+        release_shader(self.instancedShader)
 
     def load(self, fileName):
         basePath, _ = os.path.split(fileName)
-        with open(fileName, "r", encoding="utf8") as inFile:
-            self.loadObj(inFile.readlines(), basePath)
+        mesh = load_mesh(fileName)
+        self.loadMesh(mesh, basePath)
+        # simplifying takes seconds, full detail is drawn until it is done
+        if not mesh.simplified and constants.LOD_PIXEL_ERROR > 0.0:
+            self.lodRequest = lod_builder.build(
+                fileName, mesh, self.onLodsBuilt
+            )
 
     def loadObj(self, objLines, basePath):
-        positions = []
-        normals = []
-        uvs = []
-        materialChunks = []
-        materials = {}
-
-        for l in objLines:
-            # 1 standardize line
-            if len(l) > 0 and l[:1] != "#":
-                tokens = l.split()
-                if len(tokens):
-                    if tokens[0] == "mtllib":
-                        assert len(tokens) >= 2
-                        materialName = " ".join(tokens[1:])
-                        materials = self.loadMaterials(
-                            os.path.join(basePath, materialName), basePath
-                        )
-                    if tokens[0] == "usemtl":
-                        assert len(tokens) >= 2
-                        materialName = " ".join(tokens[1:])
-                        if (
-                            len(materialChunks) == 0
-                            or materialChunks[-1][0] != materialName
-                        ):
-                            materialChunks.append([materialName, []])
-                    elif tokens[0] == "v":
-                        assert len(tokens[1:]) >= 3
-                        positions.append([float(v) for v in tokens[1:4]])
-                    elif tokens[0] == "vn":
-                        assert len(tokens[1:]) >= 3
-                        normals.append([float(v) for v in tokens[1:4]])
-                    elif tokens[0] == "vt":
-                        assert len(tokens[1:]) >= 2
-                        uvs.append([float(v) for v in tokens[1:3]])
-                    elif tokens[0] == "f":
-                        materialChunks[-1][1] += self.parseFace(tokens[1:])
-
-        self.numVerts = 0
-        for mc in materialChunks:
-            self.numVerts += len(mc[1])
-
-        self.positions = [None] * self.numVerts
-        self.normals = [None] * self.numVerts
-        self.uvs = [[0.0, 0.0]] * self.numVerts
-        self.tangents = [[0.0, 1.0, 0.0]] * self.numVerts
-        self.bitangents = [[1.0, 0.0, 0.0]] * self.numVerts
-        self.chunks = []
-
-        start = 0
-        end = 0
-
-        for matId, tris in materialChunks:
-            material = materials[matId]
-            renderFlags = 0
-            if material["alpha"] != 1.0:
-                renderFlags |= self.RF_Transparent
-            elif material["texture"]["opacity"] != -1:
-                renderFlags |= self.RF_AlphaTested
-            else:
-                renderFlags |= self.RF_Opaque
-            start = end
-            end = start + int(len(tris) / 3)
-
-            chunkOffset = start * 3
-            chunkCount = len(tris)
-
-            # De-index mesh and (TODO) compute tangent frame
-            for k in range(0, len(tris), 3):
-                for j in [0, 1, 2]:
-                    p = positions[tris[k + j][0]]
-                    oo = chunkOffset + k + j
-                    self.positions[oo] = p
-                    if tris[k + j][1] != -1:
-                        self.uvs[oo] = uvs[tris[k + j][1]]
-                    self.normals[oo] = normals[tris[k + j][2]]
-            self.chunks.append(
-                (material, chunkOffset, chunkCount, renderFlags)
-            )
+        self.loadMesh(build_mesh(objLines, basePath), basePath)
+
+    def loadMesh(self, mesh, basePath):
+        self.materials = self.loadMaterials(mesh.materials, basePath)
+
+        self.positions = mesh.positions
+        self.normals = mesh.normals
+        self.uvs = mesh.uvs
+        # None unless a material has a normal map, see render for the
+        # constant tangent frame used otherwise
+        self.tangents = mesh.tangents
+        self.numVerts = len(self.positions)
+
+        # bounding box, and sphere around its center, used to select a lod
+        # and to cull
+        self.boundingBox = (np.zeros(3, np.float32), np.zeros(3, np.float32))
+        self.boundingCenter = np.zeros(3, dtype=np.float32)
+        self.boundingRadius = 0.0
+        if self.numVerts:
+            low = self.positions.min(axis=0)
+            high = self.positions.max(axis=0)
+            self.boundingBox = (low, high)
+            self.boundingCenter = (low + high) * 0.5
+            offsets = self.positions - self.boundingCenter
+            self.boundingRadius = float(np.linalg.norm(offsets, axis=1).max())
+
+        self.chunks = self.loadChunks(mesh.chunks)
+        # (error in model units, chunks), full detail first, and per lod
+        # the (offset, count) of every cluster, their bounding boxes, a BVH
+        # over these if there are enough of them, and the draw lists for
+        # every combination of render flags, see addLods
+        self.lods = []
+        self.clusterRanges = []
+        self.clusterBounds = []
+        self.clusterBVHs = []
+        self.drawLists = []
+        self.indices = mesh.indices[:0]
+        self.addLods(mesh.indices, [(0.0, mesh.chunks)] + mesh.lods)
+        # (uniform table, material setters) per shader program
+        self.programUniforms = {}
 
         self.vertexArrayObject = gl.glGenVertexArrays(1)
-        gl.glBindVertexArray(self.vertexArrayObject)
-
-        self.positionBuffer = create_bind_vertex_attrib_array_float(
-            self.positions, self.AA_Position
-        )
-        self.normalBuffer = create_bind_vertex_attrib_array_float(
-            self.normals, self.AA_Normal
-        )
-        self.uvBuffer = create_bind_vertex_attrib_array_float(
-            self.uvs, self.AA_TexCoord
+        gl_state.bind_vertex_array(self.vertexArrayObject)
+
+        self.vertexData, self.vertexLayout = pack_vertices(
+            self.positions,
+            self.normals,
+            self.uvs,
+            self.tangents,
+            compact=constants.VERTEX_FORMAT == "compact",
+            quantize=constants.QUANTIZE_POSITIONS,
+            locations=(
+                self.AA_Position,
+                self.AA_Normal,
+                self.AA_TexCoord,
+                self.AA_Tangent,
+                self.AA_Bitangent,
+            ),
         )
-        self.tangentBuffer = create_bind_vertex_attrib_array_float(
-            self.tangents, self.AA_Tangent
+        self.vertexBuffer = create_bind_interleaved_vertex_buffer(
+            self.vertexData, self.vertexLayout
         )
-        self.biTangentBuffer = create_bind_vertex_attrib_array_float(
-            self.bitangents, self.AA_Bitangent
+        self.indexBuffer = prepare_index_data_buffer(
+            self.vertexArrayObject, self.indices
         )
 
         gl.glBindBuffer(gl.GL_ARRAY_BUFFER, 0)
-        gl.glBindVertexArray(0)
-
-    def parseFloats(self, tokens, minNum):
-        assert len(tokens) >= minNum
-        return [float(v) for v in tokens[0:minNum]]
-
-    def parseFaceIndexSet(self, s):
-        inds = s.split("/")
-        assert len(inds) == 3
-        return [int(ind) - 1 if ind != "" else -1 for ind in inds]
-
-    def parseFace(self, tokens):
-        assert len(tokens) >= 3
-        result = []
-        v0 = self.parseFaceIndexSet(tokens[0])
-        v1 = self.parseFaceIndexSet(tokens[1])
-        for t in tokens[2:]:
-            v2 = self.parseFaceIndexSet(t)
-            result += [v0, v1, v2]
-            v1 = v2
-        return result
-
-    def loadMaterials(self, materialFileName, basePath):
-        materials = {}
-        with open(materialFileName, "r", encoding="utf8") as inFile:
-            currentMaterial = ""
-            for l in inFile.readlines():
-                tokens = l.split()
-                if len(tokens):
-                    if tokens[0] == "newmtl":
-                        assert len(tokens) >= 2
-                        currentMaterial = " ".join(tokens[1:])
-                        materials[currentMaterial] = {
-                            "color": {
-                                "diffuse": [0.5, 0.5, 0.5],
-                                "ambient": [0.5, 0.5, 0.5],
-                                "specular": [0.5, 0.5, 0.5],
-                                "emissive": [0.0, 0.0, 0.0],
-                            },
-                            "texture": {
-                                "diffuse": -1,
-                                "opacity": -1,
-                                "specular": -1,
-                                "normal": -1,
-                            },
-                            "alpha": 1.0,
-                            "specularExponent": 22.0,
-                            "offset": 0,
-                        }
-                    elif tokens[0] == "Ka":
-                        materials[currentMaterial]["color"][
-                            "ambient"
-                        ] = self.parseFloats(tokens[1:], 3)
-                    elif tokens[0] == "Ns":
-                        materials[currentMaterial]["specularExponent"] = float(
-                            tokens[1]
-                        )
-                    elif tokens[0] == "Kd":
-                        materials[currentMaterial]["color"][
-                            "diffuse"
-                        ] = self.parseFloats(tokens[1:], 3)
-                    elif tokens[0] == "Ks":
-                        materials[currentMaterial]["color"][
-                            "specular"
-                        ] = self.parseFloats(tokens[1:], 3)
-                    elif tokens[0] == "Ke":
-                        materials[currentMaterial]["color"][
-                            "emissive"
-                        ] = self.parseFloats(tokens[1:], 3)
-                    elif tokens[0] == "map_Kd":
-                        materials[currentMaterial]["texture"][
-                            "diffuse"
-                        ] = self.loadTexture(
-                            " ".join(tokens[1:]), basePath, True
-                        )
-                    elif tokens[0] == "map_Ks":
-                        materials[currentMaterial]["texture"][
-                            "specular"
-                        ] = self.loadTexture(
-                            " ".join(tokens[1:]), basePath, True
-                        )
-                    elif tokens[0] == "map_bump" or tokens[0] == "bump":
-                        materials[currentMaterial]["texture"][
-                            "normal"
-                        ] = self.loadTexture(
-                            " ".join(tokens[1:]), basePath, False
-                        )
-                    elif tokens[0] == "map_d":
-                        materials[currentMaterial]["texture"][
-                            "opacity"
-                        ] = self.loadTexture(
-                            " ".join(tokens[1:]), basePath, False
-                        )
-                    elif tokens[0] == "d":
-                        materials[currentMaterial]["alpha"] = float(tokens[1])
-
-        for id, m in materials.items():
-            for ch in ["diffuse", "specular"]:
-                if m["texture"][ch] != -1 and sum(m["color"][ch]) == 0.0:
-                    m["color"][ch] = [1, 1, 1]
-                if m["texture"][ch] != -1 and sum(m["color"][ch]) == 0.0:
-                    m["color"][ch] = [1, 1, 1]
-        return materials
-
-    def loadTexture(self, fileName, basePath, srgb):
-        fullFileName = os.path.join(basePath, fileName)
-
-        width = 0
-        height = 0
-        channels = 0
-        try:
-            im = Image.open(fullFileName)
-            texId = gl.glGenTextures(1)
-            gl.glActiveTexture(gl.GL_TEXTURE0)
-            gl.glBindTexture(gl.GL_TEXTURE_2D, texId)
 
-            data = im.tobytes(
-                "raw", "RGBX" if im.mode == "RGB" else "RGBA", 0, -1
-            )
-            gl.glTexImage2D(
-                gl.GL_TEXTURE_2D,
-                0,
-                gl.GL_SRGB_ALPHA if srgb else gl.GL_RGBA,
-                im.size[0],
-                im.size[1],
-                0,
-                gl.GL_RGBA,
-                gl.GL_UNSIGNED_BYTE,
-                data,
+    def addLods(self, indices, lods):
+        """
+        Append lods, (error, chunk ranges), whose ranges index into indices
+        past the ones loaded already, splitting their large chunks into
+        clusters culled on their own.
+        """
+        first = len(self.indices)
+        indices, clusters = split_clusters(
+            self.positions,
+            indices,
+            [
+                (start, count)
+                for _, ranges in lods
+                for _, start, count in ranges
+            ],
+            constants.MESH_CLUSTER_TRIANGLES,
+        )
+        self.indices = np.concatenate([self.indices, indices[first:]])
+
+        for error, chunkRanges in lods:
+            chunks = self.loadChunks(chunkRanges)
+            chunkClusters = clusters[: len(chunks)]
+            clusters = clusters[len(chunks) :]
+            ranges = np.array(
+                [cluster for ranges in chunkClusters for cluster in ranges],
+                dtype=np.int64,
+            ).reshape(-1, 2)
+            bounds = self.loadClusterBounds(ranges)
+            self.lods.append((error, chunks))
+            self.clusterRanges.append(ranges)
+            self.clusterBounds.append(bounds)
+            self.clusterBVHs.append(
+                BVH(*bounds) if len(ranges) >= BVH_MIN_BOXES else None
             )
-            gl.glGenerateMipmap(gl.GL_TEXTURE_2D)
+            self.drawLists.append(self.loadDrawLists(chunks, chunkClusters))
+
+    def onLodsBuilt(self, mesh):
+        """Append the lods lod_builder made and upload the longer index
+        buffer, the full detail indices are kept as they are."""
+        self.lodRequest = None
+        self.addLods(mesh.indices, mesh.lods)
+        gl_state.bind_vertex_array(self.vertexArrayObject)
+        indices = np.ascontiguousarray(self.indices, dtype=np.uint32)
+        gl.glBufferData(
+            gl.GL_ELEMENT_ARRAY_BUFFER,
+            indices.nbytes,
+            indices,
+            gl.GL_STATIC_DRAW,
+        )
 
-            gl.glTexParameterf(
-                gl.GL_TEXTURE_2D, gl.GL_TEXTURE_MAG_FILTER, gl.GL_LINEAR
-            )
-            gl.glTexParameterf(
-                gl.GL_TEXTURE_2D,
-                gl.GL_TEXTURE_MIN_FILTER,
-                gl.GL_LINEAR_MIPMAP_LINEAR,
+    def loadChunks(self, chunkRanges):
+        chunks = []
+        for matId, chunkOffset, chunkCount in chunkRanges:
+            material = self.materials[matId]
+            renderFlags = 0
+            if material["alpha"] != 1.0:
+                renderFlags |= self.RF_Transparent
+            elif material["textureFile"]["opacity"] is not None:
+                renderFlags |= self.RF_AlphaTested
+            else:
+                renderFlags |= self.RF_Opaque
+            chunks.append((material, chunkOffset, chunkCount, renderFlags))
+        return chunks
+
+    def loadClusterBounds(self, ranges):
+        """Centers and half extents of the axis aligned bounding box of
+        each (offset, count) index range."""
+        centers = np.zeros((len(ranges), 3), dtype=np.float32)
+        extents = np.zeros_like(centers)
+        for cluster, (offset, count) in enumerate(ranges):
+            # ranges a LOD simplified away take the box of the model
+            points = (
+                self.positions[self.indices[offset : offset + count]]
+                if count
+                else self.positions
             )
-            gl.glTexParameteri(
-                gl.GL_TEXTURE_2D, gl.GL_TEXTURE_WRAP_S, gl.GL_REPEAT
+            low = points.min(axis=0)
+            high = points.max(axis=0)
+            centers[cluster] = (low + high) * 0.5
+            extents[cluster] = (high - low) * 0.5
+        return centers, extents
+
+    def loadDrawLists(self, chunks, chunkClusters):
+        """
+        Group the chunks matching each render flag combination by
+        material, in material order, merging ranges that follow each other
+        in the index buffer, so render switches material at most once per
+        material.
+
+        returns:
+            {renderFlags: [(material, [(index pointer, count)], triangles,
+                cluster ids)]}, the clusters of the material in index order,
+                for drawMaterials to draw only the visible ones
+        """
+        clusterIds = []
+        first = 0
+        for ranges in chunkClusters:
+            clusterIds.append(list(range(first, first + len(ranges))))
+            first += len(ranges)
+
+        drawLists = {}
+        for flags in range(self.RF_All + 1):
+            selected = sorted(
+                (index for index, ch in enumerate(chunks) if ch[3] & flags),
+                key=lambda index: (
+                    chunks[index][0]["order"],
+                    chunks[index][1],
+                ),
             )
-            gl.glTexParameteri(
-                gl.GL_TEXTURE_2D, gl.GL_TEXTURE_WRAP_T, gl.GL_REPEAT
+            groups = []
+            for index in selected:
+                material, chunkOffset, chunkCount, _ = chunks[index]
+                if not groups or groups[-1][0] is not material:
+                    groups.append((material, [], []))
+                ranges = groups[-1][1]
+                if ranges and sum(ranges[-1]) == chunkOffset:
+                    ranges[-1][1] += chunkCount
+                else:
+                    ranges.append([chunkOffset, chunkCount])
+                groups[-1][2].extend(clusterIds[index])
+
+            drawLists[flags] = [
+                (
+                    material,
+                    [
+                        (
+                            ctypes.c_void_p(offset * self.indices.itemsize),
+                            count,
+                        )
+                        for offset, count in ranges
+                    ],
+                    sum(count for _, count in ranges) // 3,
+                    np.array(clusters, dtype=np.int64),
+                )
+                for material, ranges, clusters in groups
+            ]
+        return drawLists
+
+    def cullClusters(self, lod, frustums):
+        """Mask of the clusters of a lod in at least one of the (6, 4) or
+        (F, 6, 4) frustum planes, in model space."""
+        bvh = self.clusterBVHs[lod]
+        if bvh is not None:
+            return bvh.cull(frustums)
+        centers, extents = self.clusterBounds[lod]
+        visible = np.zeros(len(centers), dtype=bool)
+        for planes in frustums.reshape(-1, 6, 4):
+            visible |= boxes_in_frustum(planes, centers, extents)
+        return visible
+
+    def mergeClusters(self, ranges):
+        """Draw ranges, (index pointer, count), of the (offset, count)
+        ranges of clusters in index order, joining neighbours."""
+        offsets = ranges[:, 0]
+        counts = ranges[:, 1]
+        starts = np.flatnonzero(
+            np.concatenate([[True], offsets[1:] != offsets[:-1] + counts[:-1]])
+        )
+        return [
+            (ctypes.c_void_p(int(offset) * self.indices.itemsize), int(count))
+            for offset, count in zip(
+                offsets[starts], np.add.reduceat(counts, starts)
             )
-            # gl.glTexParameterf(gl.GL_TEXTURE_2D, gl.GL_TEXTURE_MAX_ANISOTROPY_EXT, 16);
-            gl.glBindTexture(gl.GL_TEXTURE_2D, 0)
-            return texId
-        except:
-            print("WARNING: FAILED to load texture '%s'" % fileName)
-            # print("Could not load image :(")
-
-        return -1
+        ]
+
+    def packMaterialUniforms(self, material):
+        """(uniform name, value) of every material uniform, with the values
+        already converted for their setters."""
+        uniforms = [
+            ("material_%s_color" % k, np.array(v, dtype=np.float32))
+            for k, v in material["color"].items()
+        ]
+        uniforms.append(
+            ("material_specular_exponent", float(material["specularExponent"]))
+        )
+        uniforms.append(("material_alpha", float(material["alpha"])))
+        return uniforms
+
+    def getProgramUniforms(self, shaderProgram):
+        """
+        Uniform table of a program and, per material name, the setters and
+        values render issues when switching to it. Material values the
+        program has no uniform for, e.g. the ambient color, are dropped.
+        """
+        cached = self.programUniforms.get(shaderProgram)
+        if cached is not None:
+            return cached
+
+        uniforms = program_uniforms(shaderProgram)
+        materialUniforms = {
+            material["name"]: [
+                (uniforms.uniforms[name].set, value)
+                for name, value in material["uniforms"]
+                if name in uniforms.uniforms
+            ]
+            for material in self.materials.values()
+        }
+        self.programUniforms[shaderProgram] = (uniforms, materialUniforms)
+        return uniforms, materialUniforms
 
-    def render(self, shaderProgram=None, renderFlags=None, transforms=None):
-        if not renderFlags:
-            renderFlags = self.RF_All
+    def loadMaterials(self, descriptors, basePath):
+        materials = {}
+        # (key, on_ready) of every texture acquired, see loadTexture
+        self.textureUsers = []
+        for name, descriptor in descriptors.items():
+            material = {
+                "name": name,
+                # position in the draw lists, see loadDrawLists
+                "order": len(materials),
+                "color": {k: list(v) for k, v in descriptor["color"].items()},
+                # filled in as the textures finish loading in the background,
+                # the default textures are bound until then
+                "texture": {
+                    "diffuse": -1,
+                    "opacity": -1,
+                    "specular": -1,
+                    "normal": -1,
+                },
+                "textureFile": dict(descriptor["texture"]),
+                "alpha": descriptor["alpha"],
+                "specularExponent": descriptor["specularExponent"],
+                "offset": descriptor["offset"],
+            }
+            for ch, srgb in [
+                ("diffuse", True),
+                ("opacity", False),
+                ("specular", True),
+                ("normal", False),
+            ]:
+                self.loadTexture(
+                    material["textureFile"][ch],
+                    basePath,
+                    srgb,
+                    material["texture"],
+                    ch,
+                )
+            for ch in ["diffuse", "specular"]:
+                if (
+                    material["textureFile"][ch] is not None
+                    and sum(material["color"][ch]) == 0.0
+                ):
+                    material["color"][ch] = [1, 1, 1]
+            material["uniforms"] = self.packMaterialUniforms(material)
+            materials[name] = material
+        return materials
 
+    def loadTexture(self, fileName, basePath, srgb, slots, slot):
+        """Start loading a texture, or share it if another model already
+        uses the same image, slots[slot] is set to its id once it is
+        ready."""
+        if fileName is None:
+            return
+
+        # released with the texture, so a deleted model is not called
+        onReady = lambda texId: slots.__setitem__(slot, texId)
+        key = texture_cache.acquire(
+            os.path.join(basePath, fileName),
+            srgb=srgb,
+            sampling=self.textureSampling,
+            on_ready=onReady,
+        )
+        self.textureUsers.append((key, onReady))
+
+    def render(
+        self,
+        shaderProgram=None,
+        renderFlags=None,
+        transforms=None,
+        lod=0,
+        frustum=None,
+    ):
+        """
+        frustum: planes in model space, see Entity.in_frustum, clusters
+            with a bounding box outside of one of them are not drawn
+        """
         if not shaderProgram:
             shaderProgram = self.defaultShader
 
-        chunks = [ch for ch in self.chunks if ch[3] & renderFlags]
-
-        gl.glBindVertexArray(self.vertexArrayObject)
-        gl.glUseProgram(shaderProgram)
+        uniforms, materialUniforms = self.beginRender(shaderProgram)
 
         defaultTfms = (
             transforms
@@ -358,65 +497,177 @@ class ObjModel:
                 "modelToViewNormalTransform": Mat3(),
             }
         )
-
-        for tfmName, tfm in defaultTfms.items():
-            loc = gl.glGetUniformLocation(shaderProgram, tfmName)
-            tfm._set_open_gl_uniform(loc)
-
-        previousMaterial = None
-        for material, chunkOffset, chunkCount, renderFlags in chunks:
-            if material != previousMaterial:
-                previousMaterial = material
-                if self.overrideDiffuseTextureWithDefault:
-                    bind_texture(
-                        self.TU_Diffuse,
-                        self.defaultTextureOne,
-                        self.defaultTextureOne,
-                    )
-                else:
-                    bind_texture(
-                        self.TU_Diffuse,
-                        material["texture"]["diffuse"],
-                        self.defaultTextureOne,
-                    )
-                bind_texture(
-                    self.TU_Opacity,
-                    material["texture"]["opacity"],
-                    self.defaultTextureOne,
-                )
-                bind_texture(
-                    self.TU_Specular,
-                    material["texture"]["specular"],
-                    self.defaultTextureOne,
+        uniforms.update(defaultTfms)
+
+        lod, flags = self.getDrawKey(renderFlags, lod)
+        visible = None
+        if frustum is not None:
+            visible = self.cullClusters(lod, frustum)
+        self.drawMaterials(lod, flags, materialUniforms, visible=visible)
+
+    def renderInstanced(
+        self,
+        transforms,
+        normals=None,
+        renderFlags=None,
+        lod=0,
+        frustums=None,
+    ):
+        """
+        Draw the model once per model to world transform in transforms, an
+        (N, 4, 4) array of Mat4 data, with one glDrawElementsInstanced per
+        chunk. normals are the matching (N, 3, 3) normal matrices, derived
+        from transforms unless given. The view comes from FrameData.
+
+        frustums: (F, 6, 4) planes in model space, clusters outside of all
+            of them are not drawn for any instance
+        """
+        count = len(transforms)
+        if count == 0:
+            return
+        if normals is None:
+            normals = np.linalg.inv(transforms[:, :3, :3]).transpose(0, 2, 1)
+
+        gl_state.bind_vertex_array(self.vertexArrayObject)
+        self.uploadInstances(transforms, normals)
+
+        _, materialUniforms = self.beginRender(self.instancedShader)
+        lod, flags = self.getDrawKey(renderFlags, lod)
+        visible = None
+        if frustums is not None:
+            visible = self.cullClusters(lod, frustums)
+        self.drawMaterials(lod, flags, materialUniforms, count, visible)
+
+    def uploadInstances(self, transforms, normals):
+        count = len(transforms)
+        # attributes take matrices a column at a time
+        data = np.empty((count, 25), dtype=np.float32)
+        data[:, :16] = transforms.transpose(0, 2, 1).reshape(count, 16)
+        data[:, 16:] = normals.transpose(0, 2, 1).reshape(count, 9)
+
+        if self.instanceBuffer is None:
+            self.instanceBuffer = gl.glGenBuffers(1)
+            gl.glBindBuffer(gl.GL_ARRAY_BUFFER, self.instanceBuffer)
+            stride = data.strides[0]
+            for column in range(4):
+                location = self.AA_InstanceTransform + column
+                gl.glVertexAttribPointer(
+                    location,
+                    4,
+                    gl.GL_FLOAT,
+                    gl.GL_FALSE,
+                    stride,
+                    ctypes.c_void_p(16 * column),
                 )
-                bind_texture(
-                    self.TU_Normal,
-                    material["texture"]["normal"],
-                    self.defaultNormalTexture,
+                gl.glEnableVertexAttribArray(location)
+                gl.glVertexAttribDivisor(location, 1)
+            for column in range(3):
+                location = self.AA_InstanceNormal + column
+                gl.glVertexAttribPointer(
+                    location,
+                    3,
+                    gl.GL_FLOAT,
+                    gl.GL_FALSE,
+                    stride,
+                    ctypes.c_void_p(64 + 12 * column),
                 )
+                gl.glEnableVertexAttribArray(location)
+                gl.glVertexAttribDivisor(location, 1)
+        else:
+            gl.glBindBuffer(gl.GL_ARRAY_BUFFER, self.instanceBuffer)
+        # orphaned every call, the previous draw may still read it
+        gl.glBufferData(
+            gl.GL_ARRAY_BUFFER, data.nbytes, data, gl.GL_STREAM_DRAW
+        )
+        gl.glBindBuffer(gl.GL_ARRAY_BUFFER, 0)
+
+    def getDrawKey(self, renderFlags, lod):
+        """Indices of the draw list in drawLists."""
+        if not renderFlags:
+            renderFlags = self.RF_All
+        return min(lod, len(self.drawLists) - 1), renderFlags & self.RF_All
+
+    def beginRender(self, shaderProgram):
+        """Bind the model and program for drawMaterials, returns the
+        getProgramUniforms of the program."""
+        gl_state.bind_vertex_array(self.vertexArrayObject)
+        gl_state.use_program(shaderProgram)
+        uniforms, materialUniforms = self.getProgramUniforms(shaderProgram)
+
+        uniforms.update(
+            {
+                "positionDequantScale": self.vertexLayout.dequant_scale,
+                "positionDequantOffset": self.vertexLayout.dequant_offset,
+            },
+            strict=False,
+        )
 
-                for k, v in material["color"].items():
-                    gl.glUniform3fv(
-                        gl.glGetUniformLocation(
-                            shaderProgram, "material_%s_color" % k
-                        ),
-                        1,
-                        v,
+        if self.tangents is None:
+            # generic attribute values are context state, not VAO state
+            gl.glVertexAttrib4f(self.AA_Tangent, 0.0, 1.0, 0.0, 1.0)
+            gl.glVertexAttrib3f(self.AA_Bitangent, 1.0, 0.0, 0.0)
+
+        return uniforms, materialUniforms
+
+    def drawMaterials(
+        self, lod, flags, materialUniforms, instances=None, visible=None
+    ):
+        """visible masks the clusters of the lod, see cullClusters."""
+        for material, ranges, triangles, clusters in self.drawLists[lod][
+            flags
+        ]:
+            if visible is not None:
+                shown = visible[clusters]
+                if not shown.all():
+                    stats.add(
+                        "clusters culled", len(clusters) - int(shown.sum())
                     )
-                gl.glUniform1f(
-                    gl.glGetUniformLocation(
-                        shaderProgram, "material_specular_exponent"
-                    ),
-                    material["specularExponent"],
-                )
-                gl.glUniform1f(
-                    gl.glGetUniformLocation(shaderProgram, "material_alpha"),
-                    material["alpha"],
-                )
+                    if not shown.any():
+                        continue
+                    shownRanges = self.clusterRanges[lod][clusters[shown]]
+                    ranges = self.mergeClusters(shownRanges)
+                    triangles = int(shownRanges[:, 1].sum()) // 3
+            textures = material["texture"]
+            bind_texture(
+                self.TU_Diffuse,
+                -1
+                if self.overrideDiffuseTextureWithDefault
+                else textures["diffuse"],
+                self.defaultTextureOne,
+            )
+            bind_texture(
+                self.TU_Opacity, textures["opacity"], self.defaultTextureOne
+            )
+            bind_texture(
+                self.TU_Specular, textures["specular"], self.defaultTextureOne
+            )
+            bind_texture(
+                self.TU_Normal, textures["normal"], self.defaultNormalTexture
+            )
 
-            gl.glDrawArrays(gl.GL_TRIANGLES, chunkOffset, chunkCount)
+            for setter, value in materialUniforms[material["name"]]:
+                setter(value)
 
-        gl.glUseProgram(0)
+            if instances is None:
+                for indexPointer, count in ranges:
+                    gl.glDrawElements(
+                        gl.GL_TRIANGLES,
+                        count,
+                        gl.GL_UNSIGNED_INT,
+                        indexPointer,
+                    )
+                stats.add("triangles", triangles)
+            else:
+                for indexPointer, count in ranges:
+                    gl.glDrawElementsInstanced(
+                        gl.GL_TRIANGLES,
+                        count,
+                        gl.GL_UNSIGNED_INT,
+                        indexPointer,
+                        instances,
+                    )
+                stats.add("triangles", triangles * instances)
+            stats.add("draw calls", len(ranges))
 
     def getDefaultAttributeBindings(self):
         return {
@@ -425,32 +676,27 @@ class ObjModel:
             "texCoordAttribute": self.AA_TexCoord,
             "tangentAttribute": self.AA_Tangent,
             "bitangentAttribute": self.AA_Bitangent,
+            "instanceModelToWorldTransform": self.AA_InstanceTransform,
+            "instanceModelToWorldNormalTransform": self.AA_InstanceNormal,
         }
 
     def setDefaultUniformBindings(self, shaderProgram):
         assert gl.glGetIntegerv(gl.GL_CURRENT_PROGRAM) == shaderProgram
 
-        gl.glUniform1i(
-            gl.glGetUniformLocation(shaderProgram, "diffuse_texture"),
-            self.TU_Diffuse,
-        )
-        gl.glUniform1i(
-            gl.glGetUniformLocation(shaderProgram, "opacity_texture"),
-            self.TU_Opacity,
-        )
-        gl.glUniform1i(
-            gl.glGetUniformLocation(shaderProgram, "specular_texture"),
-            self.TU_Specular,
-        )
-        gl.glUniform1i(
-            gl.glGetUniformLocation(shaderProgram, "normal_texture"),
-            self.TU_Normal,
-        )
-        gl.glUniform1i(
-            gl.glGetUniformLocation(shaderProgram, "cube_texture"),
-            self.TU_EnvMap,
+        # not every program samples every unit, e.g. the environment map
+        program_uniforms(shaderProgram).update(
+            {
+                "diffuse_texture": self.TU_Diffuse,
+                "opacity_texture": self.TU_Opacity,
+                "specular_texture": self.TU_Specular,
+                "normal_texture": self.TU_Normal,
+                "cube_texture": self.TU_EnvMap,
+            },
+            strict=False,
         )
 
     defaultVertexShader = load_glsl("objmodel_vertex")
 
     defaultFragmentShader = load_glsl("objmodel_fragment")
+
+    instancedVertexShader = load_glsl("objmodel_instanced_vertex")
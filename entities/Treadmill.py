@@ -1,41 +1,83 @@
 import math
 
+import numpy as np
+
+import constants
 from entities.Car import Car
-from entities.Entity import Entity
+from entities.Entity import Entity, bounding_spheres, select_lods
 from renderer.control import Keyboard, Mouse, Time
 from renderer.uniform import prepare_uniforms
 from renderer.View import View
-from utils.math import make_rotation_y, make_scale, make_translation
+from utils.math import (
+    classify_spheres,
+    make_rotation_y,
+    make_scale,
+    make_translation,
+    normal_matrix,
+)
+from utils.stats import stats
 
 
 class Treadmill(Entity):
+    """
+    The road, count segments scrolled past the car and wrapped around,
+    all drawn by one ObjModel.renderInstanced.
+    """
+
     model_to_world = make_scale(8, 2, 2)
+    rotation = make_rotation_y(math.radians(90))
 
     position = 0
     scaling = 21
+    count: int
     range: int
     offset: int
 
-    index: int
+    # model to world transform and normal matrix of each segment, only
+    # the translations are rewritten by place
+    transforms: np.ndarray
+    normals: np.ndarray
+    # translation of the segment at the car, and the world space
+    # direction the others are laid out along
+    origin: np.ndarray
+    step: np.ndarray
+    lods: np.ndarray
+    # segments in the view frustum, and those crossing one of its
+    # planes, see in_frustum
+    visible: np.ndarray
+    crossing: np.ndarray
 
     car: Car
 
     def __init__(
         self,
         car: Car = None,
-        position: int = 0,
-        count: int = 1,
+        count: int = constants.TREADMILL_SEGMENTS,
     ):
         super().__init__(name="Ground", filename="assets/bridge/brije.obj")
         assert car is not None
-        assert position > -1
+        assert count > 0
 
-        self.index = position
         self.car = car
-
-        self.position = position * self.scaling
+        self.count = count
         self.range = count * self.scaling
         self.offset = self.range / 2
+        self.lods = np.zeros(count, dtype=int)
+        self.visible = np.ones(count, dtype=bool)
+        self.crossing = np.zeros(count, dtype=bool)
+
+        base = (
+            self.model_to_world
+            * make_translation(0.5, -1.8, 0)
+            * self.rotation
+        )
+        self.transforms = np.repeat(base.getData()[None], count, axis=0)
+        self.normals = np.repeat(
+            normal_matrix(base).getData()[None], count, axis=0
+        )
+        self.origin = base.getData()[:3, 3].copy()
+        self.step = self.model_to_world.getData()[:3, 2].copy()
+        self.place()
 
     def update(
         self,
@@ -46,18 +88,54 @@ class Treadmill(Entity):
         super().update(keyboard=keyboard, mouse=mouse, time=time)
 
         self.position = (self.position + self.car.velocity) % self.range
+        self.place()
+
+    def place(self):
+        positions = (
+            np.arange(self.count) * self.scaling + self.position
+        ) % self.range
+        self.transforms[:, :3, 3] = self.origin + np.outer(
+            self.offset - positions, self.step
+        )
+
+    def in_frustum(self, view: View) -> bool:
+        """Culls each segment, the treadmill is drawn if any is left."""
+        if not constants.FRUSTUM_CULLING:
+            self.visible[:] = True
+            self.crossing[:] = False
+            return True
+
+        centers, scales = bounding_spheres(self.model, self.transforms)
+        self.visible, self.crossing = classify_spheres(
+            view.frustum_planes, centers, self.model.boundingRadius * scales
+        )
+        stats.add("instances culled", self.count - int(self.visible.sum()))
+        return bool(self.visible.any())
 
     def render(self, view: View = None):
-        super().render(view=view)
+        assert view is not None
+
+        self.lods = select_lods(self.model, self.transforms, view, self.lods)
 
+        # the view and lighting, the transforms come with the instances
         prepare_uniforms(
-            program=self.model.defaultShader,
+            program=self.model.instancedShader,
             view=view,
-            light_position=self.position,
-            light_rotation=self.car.drift_yaw,
-            model_to_world_transform=self.model_to_world
-            * make_translation(0.5, -1.8, -self.position + self.offset)
-            * make_rotation_y(math.radians(90)),
+            entity=self,
         )
 
-        self.model.render(transforms={})
+        for lod in np.unique(self.lods[self.visible]):
+            selected = self.visible & (self.lods == lod)
+            # clusters are culled for all segments at once, unless one of
+            # them is entirely in view
+            frustums = None
+            if self.crossing[selected].all():
+                frustums = np.matmul(
+                    view.frustum_planes, self.transforms[selected]
+                )
+            self.model.renderInstanced(
+                self.transforms[selected],
+                self.normals[selected],
+                lod=lod,
+                frustums=frustums,
+            )
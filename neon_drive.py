@@ -14,17 +14,14 @@ def load_assets(engine: Engine):
     lightL = Light(car=car, position="L")
     lightR = Light(car=car, position="R")
     ground = Ground(car=car)
-    treadmill_parts = [
-        Treadmill(car=car, position=i, count=6) for i in range(6)
-    ]
+    treadmill = Treadmill(car=car)
 
     engine.add_resource(cubemap)
     engine.add_resource(lightL)
     engine.add_resource(lightR)
     engine.add_resource(car, view_target=True)
     engine.add_resource(ground)
-    for part in treadmill_parts:
-        engine.add_resource(part)
+    engine.add_resource(treadmill)
 
 
 def run():
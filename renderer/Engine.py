@@ -9,8 +9,14 @@ import OpenGL.GL as gl
 import constants
 from entities.Entity import Entity
 from renderer.control import Keyboard, Mouse, Time
+from renderer.frame_data import fog_distance, frame_data
+from renderer.gl_state import gl_state
+from renderer.transform_batch import transform_batch
 from renderer.View import View
+from shader.texture_loader import texture_loader
+from utils.lod_builder import lod_builder
 from utils.log import get_logger
+from utils.stats import stats
 
 warnings.simplefilter(action="ignore", category=FutureWarning)
 warnings.simplefilter(action="ignore", category=glfw.GLFWError)
@@ -48,9 +54,9 @@ def init_window() -> Window:
     if constants.CAPTURE_MOUSE:
         glfw.set_input_mode(window, glfw.CURSOR, glfw.CURSOR_DISABLED)
 
-    gl.glDisable(gl.GL_CULL_FACE)
-    gl.glEnable(gl.GL_DEPTH_TEST)
-    gl.glDepthFunc(gl.GL_LEQUAL)
+    gl_state.set_enabled(gl.GL_CULL_FACE, False)
+    gl_state.set_enabled(gl.GL_DEPTH_TEST, True)
+    gl_state.set_depth_func(gl.GL_LEQUAL)
 
     return window
 
@@ -83,6 +89,8 @@ class Engine:
         self.mouse = Mouse(self.window)
         self.time = Time()
         self.view = View(mouse=self.mouse, keyboard=self.keyboard)
+        # geometry the fog hides entirely is clipped and culled
+        self.view.distance_fog = fog_distance()
 
         self.init_resources()
 
@@ -90,6 +98,7 @@ class Engine:
         self, resource: Entity, view_target: bool = False
     ) -> None:
         self.resources.append(resource)
+        transform_batch.add(resource)
 
         if view_target:
             self.view_target = resource
@@ -128,20 +137,29 @@ class Engine:
         gl.glClear(gl.GL_DEPTH_BUFFER_BIT | gl.GL_COLOR_BUFFER_BIT)
 
         if constants.WIREFRAME:
-            gl.glPolygonMode(gl.GL_FRONT_AND_BACK, gl.GL_LINE)
+            gl_state.set_polygon_mode(gl.GL_LINE)
             gl.glLineWidth(1.0)
 
         for resource in self.resources:
+            if not resource.in_frustum(self.view):
+                stats.add("entities culled")
+                continue
+            stats.add("entities drawn")
             resource.render(view=self.view)
 
     def tick(self) -> None:
         width, height = glfw.get_framebuffer_size(self.window)
 
         self.update(width, height)
+        texture_loader.update()
+        lod_builder.update()
+        frame_data.update(self.view)
+        transform_batch.update(self.view)
         self.render(width, height)
 
         glfw.swap_buffers(self.window)
         glfw.poll_events()
+        stats.end_frame(self.time.now)
 
         # ensure movement speed scaling is right
         leftover = self.s_per_frame - self.time.delta
@@ -149,4 +167,10 @@ class Engine:
             sleep(leftover)
 
     def _cleanup(self):
+        for resource in self.resources:
+            resource.release()
+        texture_loader.shutdown()
+        lod_builder.shutdown()
+        frame_data.release()
+
         glfw.terminate()
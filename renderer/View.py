@@ -1,11 +1,14 @@
 import math
 from typing import Tuple
 
+import numpy as np
+
 from renderer.control import Keyboard, Mouse
 from utils.math import (
     Mat3,
     Mat4,
     clamp,
+    frustum_planes,
     make_look_at,
     make_perspective,
     make_rotation_x,
@@ -28,9 +31,14 @@ class View:
     camera_distance: float = 20.0
     distance_near: float = 0.2
     distance_far: float = 2000.0
+    # where fog hides everything, the far plane is clamped to it, see
+    # frame_data.fog_distance
+    distance_fog: float = math.inf
 
     view_to_clip_transform: Mat4 = Mat4()
     world_to_view_transform: Mat4 = Mat4()
+    # see utils.math.frustum_planes, in world space
+    frustum_planes: np.ndarray
 
     view_offset: list[float] = DEFAULT_VIEW_OFFSET
     view_target: list[float] = DEFAULT_VIEW_TARGET
@@ -106,7 +114,7 @@ class View:
             self.fov,
             self.aspect_ratio,
             self.distance_near,
-            self.distance_far,
+            min(self.distance_far, self.distance_fog),
         )
 
         self.angle_yaw, self.angle_pitch, angle = self.calculate_angle()
@@ -128,3 +136,6 @@ class View:
             offset_target,
             self.view_up,
         )
+        self.frustum_planes = frustum_planes(
+            self.view_to_clip_transform * self.world_to_view_transform
+        )
@@ -0,0 +1,177 @@
+import math
+from typing import Any, Dict
+
+import numpy as np
+import OpenGL.GL as gl
+
+import constants
+from renderer.View import View
+from shader.utils import UNIFORM_BLOCK_BINDINGS
+from utils.math import transform_point, vec3
+
+# std140 layouts of the blocks in shader/uniform_blocks.glsl, matrices
+# are declared row_major so Mat4 data is copied as is
+FRAME_DATA = np.dtype(
+    {
+        "names": [
+            "worldToViewTransform",
+            "viewToClipTransform",
+            "lightPositionL",
+            "attenuationLinear",
+            "lightPositionR",
+            "attenuationQuadratic",
+            "ambientLightColourAndIntensity",
+            "enableSrgb",
+        ],
+        "formats": [
+            ("<f4", (4, 4)),
+            ("<f4", (4, 4)),
+            ("<f4", 3),
+            "<f4",
+            ("<f4", 3),
+            "<f4",
+            ("<f4", 3),
+            "<i4",
+        ],
+        "offsets": [0, 64, 128, 140, 144, 156, 160, 172],
+        "itemsize": 176,
+    }
+)
+DRAW_DATA = np.dtype(
+    {
+        "names": [
+            "lightColourAndIntensityL",
+            "fogExtinctionOffset",
+            "lightColourAndIntensityR",
+            "fogExtinctionCoeff",
+            "fogColor",
+        ],
+        "formats": [("<f4", 3), "<f4", ("<f4", 3), "<f4", ("<f4", 3)],
+        "offsets": [0, 12, 16, 28, 32],
+        "itemsize": 48,
+    }
+)
+
+# world space, TODO follow the car
+LIGHT_POSITION_L = vec3(-1.1, 1.0, 5.0)
+LIGHT_POSITION_R = vec3(1.1, 1.0, 5.0)
+
+FRAME_DEFAULTS = {
+    "attenuationLinear": 0.07,
+    "attenuationQuadratic": 0.017,
+    "ambientLightColourAndIntensity": vec3(0.05),
+    "enableSrgb": True,
+}
+DRAW_DEFAULTS = {
+    "lightColourAndIntensityL": vec3(0.4, 0.4, 0.2),
+    "lightColourAndIntensityR": vec3(0.4, 0.4, 0.2),
+    "fogExtinctionOffset": 35.0,
+    "fogExtinctionCoeff": 0.0015,
+    "fogColor": vec3(0.73),
+}
+
+
+def fog_distance(overrides: Dict[str, Any] = {}) -> float:
+    """
+    View distance beyond which the fog of the shaders, 1 - exp((offset -
+    distance) * coeff), leaves less than FOG_CULL_VISIBILITY of the
+    colour of anything, for the DrawData defaults with overrides applied.
+    Only the defaults set the far plane, overrides may thicken the fog
+    but not thin it.
+    """
+    offset = overrides.get(
+        "fogExtinctionOffset", DRAW_DEFAULTS["fogExtinctionOffset"]
+    )
+    coeff = overrides.get(
+        "fogExtinctionCoeff", DRAW_DEFAULTS["fogExtinctionCoeff"]
+    )
+    if coeff <= 0.0 or constants.FOG_CULL_VISIBILITY <= 0.0:
+        return math.inf
+    return offset - math.log(constants.FOG_CULL_VISIBILITY) / coeff
+
+
+def create_uniform_buffer(data: np.ndarray, usage: int) -> int:
+    buffer = gl.glGenBuffers(1)
+    gl.glBindBuffer(gl.GL_UNIFORM_BUFFER, buffer)
+    gl.glBufferData(gl.GL_UNIFORM_BUFFER, data.nbytes, data, usage)
+    gl.glBindBuffer(gl.GL_UNIFORM_BUFFER, 0)
+    return buffer
+
+
+class FrameData:
+    """
+    Values every draw of a frame shares, uploaded once per frame into the
+    FrameData uniform buffer, and the DrawData buffers holding per entity
+    overrides of the remaining defaults.
+    """
+
+    buffer: int = None
+    data: np.ndarray
+    # draw data buffers by their contents, entities with the same
+    # overrides share one, most use the defaults
+    draw_buffers: Dict[bytes, int]
+    draw_defaults: np.ndarray
+
+    def __init__(self):
+        self.data = np.zeros(1, dtype=FRAME_DATA)
+        for name, value in FRAME_DEFAULTS.items():
+            self.data[name] = value
+        self.draw_defaults = np.zeros(1, dtype=DRAW_DATA)
+        for name, value in DRAW_DEFAULTS.items():
+            self.draw_defaults[name] = value
+        self.draw_buffers = {}
+
+    def update(self, view: View) -> None:
+        """Upload this frame's values, before anything is rendered."""
+        data = self.data
+        data["worldToViewTransform"] = view.world_to_view_transform.getData()
+        data["viewToClipTransform"] = view.view_to_clip_transform.getData()
+        data["lightPositionL"] = transform_point(
+            view.world_to_view_transform, LIGHT_POSITION_L
+        )
+        data["lightPositionR"] = transform_point(
+            view.world_to_view_transform, LIGHT_POSITION_R
+        )
+
+        if self.buffer is None:
+            self.buffer = create_uniform_buffer(data, gl.GL_DYNAMIC_DRAW)
+        else:
+            gl.glBindBuffer(gl.GL_UNIFORM_BUFFER, self.buffer)
+            gl.glBufferSubData(gl.GL_UNIFORM_BUFFER, 0, data.nbytes, data)
+            gl.glBindBuffer(gl.GL_UNIFORM_BUFFER, 0)
+        gl.glBindBufferBase(
+            gl.GL_UNIFORM_BUFFER,
+            UNIFORM_BLOCK_BINDINGS["FrameData"],
+            self.buffer,
+        )
+
+    def use_draw_data(self, overrides: Dict[str, Any] = {}) -> None:
+        """Bind the DrawData buffer of the defaults with overrides, a
+        subset of DRAW_DATA.names, applied."""
+        data = self.draw_defaults
+        if overrides:
+            data = data.copy()
+            for name, value in overrides.items():
+                data[name] = value
+
+        key = data.tobytes()
+        buffer = self.draw_buffers.get(key)
+        if buffer is None:
+            buffer = create_uniform_buffer(data, gl.GL_STATIC_DRAW)
+            self.draw_buffers[key] = buffer
+        gl.glBindBufferBase(
+            gl.GL_UNIFORM_BUFFER, UNIFORM_BLOCK_BINDINGS["DrawData"], buffer
+        )
+
+    def release(self) -> None:
+        buffers = list(self.draw_buffers.values())
+        if self.buffer is not None:
+            buffers.append(self.buffer)
+            self.buffer = None
+        if buffers:
+            gl.glDeleteBuffers(len(buffers), buffers)
+        self.draw_buffers = {}
+
+
+# shared by every program, see UNIFORM_BLOCK_BINDINGS
+frame_data = FrameData()
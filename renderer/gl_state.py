@@ -0,0 +1,113 @@
+from typing import Dict, List, Tuple
+
+import OpenGL.GL as gl
+
+from utils.stats import stats
+
+
+class GLState:
+    """
+    Last value set for the context state that changes between draws, the
+    program, vertex array, texture bindings, depth test and polygon mode,
+    so setting what is already set issues no GL call. Nothing is unbound
+    after a draw, the next one binds what it needs.
+
+    The cache is only right while every change goes through it, deleting
+    bound objects included. Call invalidate after anything else touches
+    this state, e.g. a library drawing into the same context.
+    """
+
+    program: int
+    vertex_array: int
+    active_unit: int
+    # texture bound by (unit, target)
+    textures: Dict[Tuple[int, int], int]
+    capabilities: Dict[int, bool]
+    depth_func: int
+    polygon_mode: int
+
+    def __init__(self):
+        self.invalidate()
+
+    def invalidate(self) -> None:
+        """Forget everything, the next call of each kind is issued."""
+        self.program = None
+        self.vertex_array = None
+        self.active_unit = None
+        self.textures = {}
+        self.capabilities = {}
+        self.depth_func = None
+        self.polygon_mode = None
+
+    def _count(self, issued: bool) -> bool:
+        stats.add("state calls issued" if issued else "state calls skipped")
+        return issued
+
+    def use_program(self, program: int) -> None:
+        if self._count(program != self.program):
+            gl.glUseProgram(program)
+            self.program = program
+
+    def bind_vertex_array(self, vertex_array: int) -> None:
+        if self._count(vertex_array != self.vertex_array):
+            gl.glBindVertexArray(vertex_array)
+            self.vertex_array = vertex_array
+
+    def active_texture(self, unit: int) -> None:
+        if self._count(unit != self.active_unit):
+            gl.glActiveTexture(gl.GL_TEXTURE0 + unit)
+            self.active_unit = unit
+
+    def bind_texture(
+        self, target: int, texture: int, unit: int = None
+    ) -> None:
+        """Bind texture on unit, or on the active unit when only its
+        contents are to be changed, e.g. for an upload."""
+        if unit is None:
+            if self.active_unit is None:
+                self.active_texture(0)
+            unit = self.active_unit
+        if self._count(self.textures.get((unit, target)) != texture):
+            self.active_texture(unit)
+            gl.glBindTexture(target, texture)
+            self.textures[unit, target] = texture
+
+    def set_enabled(self, capability: int, enabled: bool) -> None:
+        if self._count(self.capabilities.get(capability) != enabled):
+            if enabled:
+                gl.glEnable(capability)
+            else:
+                gl.glDisable(capability)
+            self.capabilities[capability] = enabled
+
+    def set_depth_func(self, func: int) -> None:
+        if self._count(func != self.depth_func):
+            gl.glDepthFunc(func)
+            self.depth_func = func
+
+    def set_polygon_mode(self, mode: int) -> None:
+        if self._count(mode != self.polygon_mode):
+            gl.glPolygonMode(gl.GL_FRONT_AND_BACK, mode)
+            self.polygon_mode = mode
+
+    def delete_textures(self, textures: List[int]) -> None:
+        # deleted textures are unbound, their names may be handed out again
+        gl.glDeleteTextures(len(textures), textures)
+        for binding, texture in list(self.textures.items()):
+            if texture in textures:
+                self.textures[binding] = 0
+
+    def delete_vertex_arrays(self, vertex_arrays: List[int]) -> None:
+        gl.glDeleteVertexArrays(len(vertex_arrays), vertex_arrays)
+        if self.vertex_array in vertex_arrays:
+            self.vertex_array = 0
+
+    def delete_program(self, program: int) -> None:
+        # a program in use is only deleted once another one is used
+        gl.glDeleteProgram(program)
+        if program == self.program:
+            self.use_program(0)
+
+
+# the one context everything renders into
+gl_state = GLState()
@@ -0,0 +1,118 @@
+from typing import Any, List, Optional, Tuple
+
+import numpy as np
+
+from renderer.View import View
+from utils.math import Mat3, Mat4, normal_matrix
+
+# Entity, not imported to keep entities free to import the renderer
+Entity = Any
+Matrices = Tuple[Mat4, Mat4, Mat3]
+
+
+class TransformBatch:
+    """
+    World transforms of every added entity in one (N, 4, 4) array, from
+    which update derives the model to view, model to clip and normal
+    matrices of all of them with one np.matmul each per frame.
+
+    The world and world_normal of an added entity are views into these
+    arrays, so the scene graph writes straight into them. Entities must
+    not move between update and rendering.
+    """
+
+    entities: List[Entity]
+    capacity: int = 0
+    # entities added since the last update have no matrices yet
+    computed: int = 0
+
+    world: np.ndarray
+    world_normal: np.ndarray
+    model_to_view: np.ndarray
+    model_to_clip: np.ndarray
+    model_to_view_normal: np.ndarray
+    # a Mat4/Mat3 around each row of the derived matrices, for the
+    # uniform setters
+    matrices: List[Matrices]
+    view_normal: Mat3
+
+    def __init__(self, capacity: int = 16):
+        self.entities = []
+        self.matrices = []
+        self.view_normal = Mat3()
+        self._allocate(capacity)
+
+    def _allocate(self, capacity: int) -> None:
+        self.capacity = capacity
+        self.world = np.zeros((capacity, 4, 4), dtype=np.float32)
+        self.world_normal = np.zeros((capacity, 3, 3), dtype=np.float32)
+        self.model_to_view = np.zeros((capacity, 4, 4), dtype=np.float32)
+        self.model_to_clip = np.zeros((capacity, 4, 4), dtype=np.float32)
+        self.model_to_view_normal = np.zeros(
+            (capacity, 3, 3), dtype=np.float32
+        )
+
+    def _bind(self, index: int) -> None:
+        """Move the transforms of an entity into its rows."""
+        entity = self.entities[index]
+        self.world[index] = entity.world.matData
+        self.world_normal[index] = entity.world_normal.matData
+        entity.world = Mat4.wrap(self.world[index], entity.world.kind)
+        entity.world_normal = Mat3.wrap(
+            self.world_normal[index], entity.world_normal.kind
+        )
+        matrices = (
+            Mat4.wrap(self.model_to_view[index]),
+            Mat4.wrap(self.model_to_clip[index]),
+            Mat3.wrap(self.model_to_view_normal[index]),
+        )
+        if index < len(self.matrices):
+            self.matrices[index] = matrices
+        else:
+            self.matrices.append(matrices)
+
+    def add(self, entity: Entity) -> None:
+        if len(self.entities) == self.capacity:
+            # the rows of everything added so far move as well
+            self._allocate(self.capacity * 2)
+            self.computed = 0
+            for index in range(len(self.entities)):
+                self._bind(index)
+        entity.batch_index = len(self.entities)
+        self.entities.append(entity)
+        self._bind(entity.batch_index)
+
+    def update(self, view: View) -> None:
+        """Derive this frame's matrices, after every entity moved."""
+        count = len(self.entities)
+        for entity in self.entities:
+            if entity.dirty:
+                entity.model_to_world_transform()
+
+        world_to_view = view.world_to_view_transform
+        model_to_view = self.model_to_view[:count]
+        np.matmul(world_to_view.matData, self.world[:count], out=model_to_view)
+        np.matmul(
+            view.view_to_clip_transform.matData,
+            model_to_view,
+            out=self.model_to_clip[:count],
+        )
+        # normal matrices multiply like the transforms they belong to
+        np.matmul(
+            normal_matrix(world_to_view, self.view_normal).matData,
+            self.world_normal[:count],
+            out=self.model_to_view_normal[:count],
+        )
+        self.computed = count
+
+    def get(self, entity: Entity) -> Optional[Matrices]:
+        """Model to view, model to clip and model to view normal matrices
+        of an entity, None unless update computed them."""
+        index = entity.batch_index
+        if index is None or index >= self.computed:
+            return None
+        return self.matrices[index]
+
+
+# the entities of the engine, see Engine.add_resource
+transform_batch = TransformBatch()
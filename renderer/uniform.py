@@ -1,17 +1,18 @@
-from typing import Any, Dict
-
-import OpenGL.GL as gl
+from typing import Any, Dict, Tuple
 
+from renderer.frame_data import DRAW_DATA, frame_data
+from renderer.gl_state import gl_state
+from renderer.transform_batch import transform_batch
 from renderer.View import View
-from shader.utils import set_uniform
+from shader.utils import program_uniforms
 from utils.math import (
+    AFFINE,
     Mat3,
     Mat4,
-    inverse,
     make_scale,
     make_translation,
-    transform_point,
-    transpose,
+    multiply,
+    normal_matrix,
     vec3,
 )
 
@@ -22,63 +23,103 @@ LIGHT_TRANSLATE_R = make_translation(7.2, -0.85, 23)
 LIGHT_L = LIGHT_SCALE * LIGHT_TRANSLATE_L
 LIGHT_R = LIGHT_SCALE * LIGHT_TRANSLATE_R
 
+MODEL_TO_VIEW = Mat4()
+MODEL_TO_CLIP = Mat4()
+MODEL_TO_VIEW_NORMAL = Mat3()
+VIEW_NORMAL = Mat3()
+
+
+def transform_matrices(
+    view: View, model_to_world: Mat4, model_to_world_normal: Mat3 = None
+) -> Tuple[Mat4, Mat4, Mat3]:
+    """Model to view, model to clip and model to view normal matrices of
+    one transform, see TransformBatch for doing many at once."""
+    # uploaded before they are needed again, so the same storage serves
+    # every call
+    model_to_view = multiply(
+        view.world_to_view_transform, model_to_world, MODEL_TO_VIEW
+    )
+    if model_to_world_normal is None or model_to_view.kind < AFFINE:
+        model_to_view_normal = normal_matrix(
+            model_to_view, MODEL_TO_VIEW_NORMAL
+        )
+    else:
+        # normal matrices multiply like the transforms they belong to, this
+        # saves inverting the affine ones
+        model_to_view_normal = multiply(
+            normal_matrix(view.world_to_view_transform, VIEW_NORMAL),
+            model_to_world_normal,
+            MODEL_TO_VIEW_NORMAL,
+        )
+    model_to_clip = multiply(
+        view.view_to_clip_transform, model_to_view, MODEL_TO_CLIP
+    )
+    return model_to_view, model_to_clip, model_to_view_normal
+
 
 def prepare_uniforms(
     program: Any = None,
     view: View = None,
-    light_position: list[float] = None,
-    light_rotation: float = None,
     model_to_world_transform: Mat4 = None,
+    model_to_world_normal: Mat3 = None,
+    entity: Any = None,
     uniform_overrides: Dict[str, Any] = {},
 ):
+    """
+    Set the per draw uniforms of program, the values shared by the whole
+    frame come from frame_data.
+
+    args:
+        model_to_world_normal: normal matrix of model_to_world_transform
+            if the caller keeps one, e.g. Entity.model_to_world_normal
+        entity: the Entity drawn, replacing both transforms, its matrices
+            are read from transform_batch once computed there
+        uniform_overrides: uniforms of this program, or DrawData values
+            replacing the frame defaults, e.g. the fog
+    """
     assert program is not None
     assert view is not None
-    assert light_position is not None
-    assert light_rotation is not None
-    assert model_to_world_transform is not None
 
-    model_to_view = view.world_to_view_transform * model_to_world_transform
-    model_to_view_normal = inverse(transpose(Mat3(model_to_view)))
-    model_to_clip: Mat4 = (
-        view.view_to_clip_transform
-        * view.world_to_view_transform
-        * model_to_world_transform
-    )
-    offset_light_position_l = transform_point(
-        view.world_to_view_transform,
-        # TODO light_position +
-        vec3(-1.1, 1.0, 5.0),
-    )
-    offset_light_position_r = transform_point(
-        view.world_to_view_transform,
-        # TODO light_position +
-        vec3(1.1, 1.0, 5.0),
-    )
-
-    gl.glUseProgram(program)
+    matrices = transform_batch.get(entity) if entity is not None else None
+    if matrices is not None:
+        model_to_view, model_to_clip, model_to_view_normal = matrices
+    else:
+        if entity is not None:
+            model_to_world_transform = entity.model_to_world_transform()
+            model_to_world_normal = entity.model_to_world_normal()
+        assert model_to_world_transform is not None
+        (
+            model_to_view,
+            model_to_clip,
+            model_to_view_normal,
+        ) = transform_matrices(
+            view, model_to_world_transform, model_to_world_normal
+        )
 
-    uniforms = {
-        # transforms
-        "modelToClipTransform": model_to_clip,
-        "modelToViewTransform": model_to_view,
-        "modelToViewNormalTransform": model_to_view_normal,
-        "viewToWorldRotationTransform": inverse(Mat3(model_to_view)),
-        # lighting and color
-        "attenuationLinear": 0.07,
-        "attenuationQuadratic": 0.017,
-        "lightPositionL": offset_light_position_l,
-        "lightPositionR": offset_light_position_r,
-        "lightColourAndIntensityL": vec3(0.4, 0.4, 0.2),
-        "lightColourAndIntensityR": vec3(0.4, 0.4, 0.2),
-        "ambientLightColourAndIntensity": vec3(0.05),
-        "enableSrgb": True,
-        # fog
-        "fogExtinctionOffset": 35.0,
-        "fogExtinctionCoeff": 0.0015,
-        "fogColor": vec3(0.73),
-    }
+    gl_state.use_program(program)
 
-    uniforms.update(uniform_overrides)
+    frame_data.use_draw_data(
+        {
+            name: value
+            for name, value in uniform_overrides.items()
+            if name in DRAW_DATA.names
+        }
+    )
 
-    for key, value in uniforms.items():
-        set_uniform(program, key, value)
+    table = program_uniforms(program)
+    # not every program uses every transform
+    table.update(
+        {
+            "modelToClipTransform": model_to_clip,
+            "modelToViewTransform": model_to_view,
+            "modelToViewNormalTransform": model_to_view_normal,
+        },
+        strict=False,
+    )
+    table.update(
+        {
+            name: value
+            for name, value in uniform_overrides.items()
+            if name not in DRAW_DATA.names
+        }
+    )
@@ -1,16 +1,16 @@
 from typing import Any, Dict
 
-import OpenGL.GL as gl
-
 from entities.ObjModel import ObjModel
+from renderer.gl_state import gl_state
 from shader.utils import (
     Program,
     ShaderSource,
     Texture,
-    build_shader,
+    acquire_shader,
     create_default_texture,
     load_glsl,
-    set_uniform,
+    program_uniforms,
+    release_shader,
 )
 from utils.log import get_logger
 
@@ -46,7 +46,7 @@ class Shader:
         vertex_attributes.update(vertex_attribute_overrides)
         fragment_attributes.update(fragment_attribute_overrides)
 
-        self.program = build_shader(
+        self.program = acquire_shader(
             self.vertex_source,
             self.fragment_source,
             attrib_locs=vertex_attributes,
@@ -61,14 +61,16 @@ class Shader:
             "specular_texture": ObjModel.TU_Specular,
             "normal_texture": ObjModel.TU_Normal,
         }
-        for item, value in default_bindings.items():
-            set_uniform(self.program, item, value)
-
-        gl.glUseProgram(0)
+        # programs without an ObjModel style material skip these
+        program_uniforms(self.program).update(default_bindings, strict=False)
 
         logger.debug(
             f"loaded shader: {vertex_source_filename}, {fragment_source_filename}"
         )
 
     def use(self):
-        gl.glUseProgram(self.program)
+        gl_state.use_program(self.program)
+
+    def release(self):
+        gl_state.delete_textures([self.texture, self.texture_normal])
+        release_shader(self.program)
@@ -1,54 +1,54 @@
-from typing import Callable, Tuple
+from typing import Tuple
 
 import OpenGL.GL as gl
-from numpy import void
-from PIL import Image
 
-from shader.utils import set_uniform
+from renderer.gl_state import gl_state
+from shader.texture_cache import Sampling, TextureKey, texture_cache
+from shader.texture_loader import texture_loader
 from utils.log import get_logger
 
 logger = get_logger()
 
 
 class Texture:
-    texture_id: int
-    size: Tuple[float, float]
+    # -1 until loaded, a white placeholder is bound until then
+    texture_id: int = -1
+    key: TextureKey = None
 
     def __init__(
         self,
         filename: str,
-        set_parameters: Callable[[], None] = lambda _: None,
+        sampling: Sampling = Sampling(),
         mode="RGB",
     ) -> None:
-        self.texture_id = gl.glGenTextures(1)
-        gl.glBindTexture(gl.GL_TEXTURE_2D, self.texture_id)
-
-        with Image.open(f"assets/{filename}") as image:
-            self.size = image.size
-            data = image.tobytes("raw", mode, 0, -1)
-
-            gl.glTexImage2D(
-                gl.GL_TEXTURE_2D,
-                0,
-                gl.GL_RGBA,
-                *self.size,
-                0,
-                gl.GL_RGBA,
-                gl.GL_UNSIGNED_BYTE,
-                data,
-            )
-
-            gl.glGenerateMipmap(gl.GL_TEXTURE_2D)
-
-            set_parameters()
+        self.key = texture_cache.acquire(
+            f"assets/{filename}",
+            mode=mode,
+            sampling=sampling,
+            on_ready=self.loaded,
+        )
 
-            gl.glBindTexture(gl.GL_TEXTURE_2D, 0)
+    def loaded(self, texture_id: int):
+        self.texture_id = texture_id
 
-        logger.debug(f"loaded texture: (id {self.texture_id}) {filename}")
+    @property
+    def size(self) -> Tuple[int, int]:
+        if self.texture_id == -1:
+            return (0, 0)
+        return texture_cache.size(self.key)
 
     def use(self):
-        gl.glActiveTexture(gl.GL_TEXTURE0)
-        gl.glBindTexture(
+        gl_state.bind_texture(
             gl.GL_TEXTURE_2D,
-            self.texture_id,
+            self.texture_id
+            if self.texture_id != -1
+            else texture_loader.placeholder(),
+            unit=0,
         )
+
+    def release(self):
+        # the texture itself is deleted with its last user
+        if self.key is not None:
+            texture_cache.release(self.key, self.loaded)
+            self.key = None
+        self.texture_id = -1
@@ -5,8 +5,9 @@ in VertexData {
     vec3 v2f_viewSpacePosition;
 };
 
+#include "uniform_blocks"
+
 uniform samplerCube cubemap;
-uniform vec3 fogColor;
 
 out vec4 fragmentColor;
 
@@ -6,6 +6,8 @@ uniform mat4 modelToClipTransform;
 uniform mat4 modelToViewTransform;
 uniform mat3 modelToViewNormalTransform;
 
+#include "uniform_blocks"
+
 out VertexData {
     vec3 v2f_textureCoord;
     vec3 v2f_viewSpacePosition;
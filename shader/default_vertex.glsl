@@ -5,6 +5,8 @@ in vec2 texCoordAttribute;
 
 uniform mat4 modelToClipTransform;
 
+#include "uniform_blocks"
+
 out vec2 v2f_texCoord;
 
 void main() {
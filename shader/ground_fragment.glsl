@@ -7,21 +7,7 @@ in VertexData {
     vec3 v2f_worldSpacePosition;
 };
 
-uniform mat4 modelToClipTransform;
-uniform mat4 modelToViewTransform;
-uniform mat3 modelToViewNormalTransform;
-uniform mat3 viewToWorldRotationTransform;
-uniform float attenuationLinear;
-uniform float attenuationQuadratic;
-uniform vec3 lightPositionL;
-uniform vec3 lightColourAndIntensityL;
-uniform vec3 lightPositionR;
-uniform vec3 lightColourAndIntensityR;
-uniform vec3 ambientLightColourAndIntensity;
-uniform float fogExtinctionOffset;
-uniform float fogExtinctionCoeff;
-uniform vec3 fogColor;
-uniform bool enableSrgb;
+#include "uniform_blocks"
 
 uniform vec3 material_diffuse_color;
 uniform float material_alpha;
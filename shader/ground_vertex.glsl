@@ -7,12 +7,8 @@ layout(location = 2) in vec2 texCoordAttribute;
 uniform mat4 modelToClipTransform;
 uniform mat4 modelToViewTransform;
 uniform mat3 modelToViewNormalTransform;
-uniform vec3 lightColourAndIntensity;
-uniform vec3 ambientLightColourAndIntensity;
-uniform float fogExtinctionOffset;
-uniform float fogExtinctionCoeff;
-uniform vec3 fogColor;
-uniform bool enableSrgb;
+
+#include "uniform_blocks"
 
 // overrides
 uniform float texCoordScale;
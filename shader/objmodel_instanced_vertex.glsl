@@ -0,0 +1,32 @@
+#version 330
+
+layout(location = 0) in vec3 positionAttribute;
+layout(location = 1) in vec3 normalAttribute;
+layout(location = 2) in vec2 texCoordAttribute;
+// per instance, see ObjModel.renderInstanced
+layout(location = 5) in mat4 instanceModelToWorldTransform;
+layout(location = 9) in mat3 instanceModelToWorldNormalTransform;
+
+// identity unless the model uses quantized (normalized integer) positions
+uniform vec3 positionDequantScale = vec3(1.0);
+uniform vec3 positionDequantOffset = vec3(0.0);
+
+#include "uniform_blocks"
+
+out VertexData {
+    vec3 v2f_viewSpaceNormal;
+    vec3 v2f_viewSpacePosition;
+    vec2 v2f_textureCoordinate;
+    vec3 v2f_worldSpacePosition;
+};
+
+void main() {
+    vec3 position = positionAttribute * positionDequantScale + positionDequantOffset;
+    vec4 viewSpacePosition = worldToViewTransform * (instanceModelToWorldTransform * vec4(position, 1.0));
+    gl_Position = viewToClipTransform * viewSpacePosition;
+    // the view is rigid, its rotation is its normal matrix
+    v2f_viewSpaceNormal = normalize(mat3(worldToViewTransform) * (instanceModelToWorldNormalTransform * normalAttribute));
+    v2f_viewSpacePosition = viewSpacePosition.xyz;
+    v2f_textureCoordinate = texCoordAttribute;
+    v2f_worldSpacePosition = position;
+}
\ No newline at end of file
@@ -7,12 +7,11 @@ layout(location = 2) in vec2 texCoordAttribute;
 uniform mat4 modelToClipTransform;
 uniform mat4 modelToViewTransform;
 uniform mat3 modelToViewNormalTransform;
-uniform vec3 lightColourAndIntensity;
-uniform vec3 ambientLightColourAndIntensity;
-uniform float fogExtinctionOffset;
-uniform float fogExtinctionCoeff;
-uniform vec3 fogColor;
-uniform bool enableSrgb;
+// identity unless the model uses quantized (normalized integer) positions
+uniform vec3 positionDequantScale = vec3(1.0);
+uniform vec3 positionDequantOffset = vec3(0.0);
+
+#include "uniform_blocks"
 
 out VertexData {
     vec3 v2f_viewSpaceNormal;
@@ -22,9 +21,10 @@ out VertexData {
 };
 
 void main() {
-    gl_Position = modelToClipTransform * vec4(positionAttribute, 1.0);
+    vec3 position = positionAttribute * positionDequantScale + positionDequantOffset;
+    gl_Position = modelToClipTransform * vec4(position, 1.0);
     v2f_viewSpaceNormal = normalize(modelToViewNormalTransform * normalAttribute);
-    v2f_viewSpacePosition = (modelToViewTransform * vec4(positionAttribute, 1.0)).xyz;
+    v2f_viewSpacePosition = (modelToViewTransform * vec4(position, 1.0)).xyz;
     v2f_textureCoordinate = texCoordAttribute;
-    v2f_worldSpacePosition = positionAttribute;
+    v2f_worldSpacePosition = position;
 }
\ No newline at end of file
@@ -5,6 +5,8 @@ in VertexData {
     vec3 v2f_viewSpaceNormal;
 };
 
+#include "uniform_blocks"
+
 uniform vec3 sphereColour;
 
 out vec4 fragmentColor;
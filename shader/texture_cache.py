@@ -0,0 +1,158 @@
+import hashlib
+import os
+from typing import Callable, Dict, List, NamedTuple, Optional, Tuple
+
+import OpenGL.GL as gl
+
+from renderer.gl_state import gl_state
+from shader.texture_loader import TextureRequest, texture_loader
+from utils.log import get_logger
+from utils.registry import Registry
+
+logger = get_logger()
+
+
+class Sampling(NamedTuple):
+    wrap: int = gl.GL_REPEAT
+    min_filter: int = gl.GL_LINEAR_MIPMAP_LINEAR
+    mag_filter: int = gl.GL_LINEAR
+
+
+def apply_sampling(sampling: Sampling, target: int = gl.GL_TEXTURE_2D):
+    gl.glTexParameteri(target, gl.GL_TEXTURE_MAG_FILTER, sampling.mag_filter)
+    gl.glTexParameteri(target, gl.GL_TEXTURE_MIN_FILTER, sampling.min_filter)
+    gl.glTexParameteri(target, gl.GL_TEXTURE_WRAP_S, sampling.wrap)
+    gl.glTexParameteri(target, gl.GL_TEXTURE_WRAP_T, sampling.wrap)
+
+
+# (resolved path, content hash, srgb, raw mode, sampling)
+TextureKey = Tuple[str, str, bool, Optional[str], Sampling]
+
+
+class SharedTexture:
+    """One GL texture handed to every user of the same key."""
+
+    request: TextureRequest
+    texture_id: int = -1
+    # callbacks of users that acquired it before it was ready
+    waiting: List[Callable[[int], None]]
+    # users holding it
+    acquired: int = 0
+
+    def __init__(self):
+        self.waiting = []
+
+    def ready(self, texture_id: int):
+        self.texture_id = texture_id
+        for on_ready in self.waiting:
+            on_ready(texture_id)
+        self.waiting = []
+
+    @property
+    def nbytes(self) -> int:
+        # as uncompressed rgba8, plus a third for the mipmap chain
+        width, height = self.request.size
+        return width * height * 4 * 4 // 3
+
+
+class TextureCache:
+    """
+    Process wide, reference counted textures keyed on the resolved path,
+    a hash of the file contents and the sampling state, so materials,
+    models and Texture objects naming the same image share one texture.
+    """
+
+    textures: Registry
+    # (resolved path, mtime, size) -> content hash
+    digests: Dict[Tuple[str, int, int], str]
+
+    def __init__(self):
+        self.textures = Registry("texture")
+        self.digests = {}
+
+    def file_digest(self, path: str) -> str:
+        try:
+            status = os.stat(path)
+        except OSError:
+            return "missing"
+
+        stamp = (path, status.st_mtime_ns, status.st_size)
+        if stamp not in self.digests:
+            digest = hashlib.sha1()
+            with open(path, "rb") as in_file:
+                for block in iter(lambda: in_file.read(1 << 20), b""):
+                    digest.update(block)
+            self.digests[stamp] = digest.hexdigest()
+        return self.digests[stamp]
+
+    def acquire(
+        self,
+        path: str,
+        srgb: bool = False,
+        sampling: Sampling = Sampling(),
+        mode: Optional[str] = None,
+        on_ready: Callable[[int], None] = lambda _: None,
+    ) -> TextureKey:
+        """
+        Start using a texture, on_ready receives its id as soon as it is
+        loaded, right away if it already is. Pair with release using the
+        returned key.
+        """
+        path = os.path.realpath(path)
+        key = (path, self.file_digest(path), srgb, mode, sampling)
+
+        def create():
+            shared = SharedTexture()
+            shared.request = texture_loader.load(
+                path,
+                srgb=srgb,
+                mode=mode,
+                parameters=lambda: apply_sampling(sampling),
+                on_ready=lambda texture_id: self._loaded(shared, texture_id),
+            )
+            return shared
+
+        shared = self.textures.acquire(key, create, self._destroy)
+        shared.acquired += 1
+        if shared.texture_id != -1:
+            on_ready(shared.texture_id)
+        else:
+            shared.waiting.append(on_ready)
+        return key
+
+    def release(
+        self, key: TextureKey, on_ready: Callable[[int], None] = None
+    ) -> None:
+        """Stop using a texture, on_ready is the callback given to acquire
+        and is dropped if the texture is still loading."""
+        shared = self.textures.entries[key][0]
+        shared.acquired -= 1
+        if on_ready in shared.waiting:
+            shared.waiting.remove(on_ready)
+        self.textures.release(key)
+
+    def size(self, key: TextureKey) -> Tuple[int, int]:
+        return self.textures.entries[key][0].request.size
+
+    def _loaded(self, shared: SharedTexture, texture_id: int) -> None:
+        shared.ready(texture_id)
+        if texture_loader.pending == 0:
+            logger.info(self.report())
+
+    def _destroy(self, shared: SharedTexture) -> None:
+        texture_loader.cancel(shared.request)
+        if shared.texture_id != -1:
+            gl_state.delete_textures([shared.texture_id])
+
+    def report(self) -> str:
+        shared = [entry[0] for entry in self.textures.entries.values()]
+        saved = sum(s.nbytes * (s.acquired - 1) for s in shared)
+        return (
+            f"textures: {len(shared)} unique, "
+            f"{self.textures.hits} hits, {self.textures.misses} misses, "
+            f"{saved / 2**20:.1f}MiB saved"
+        )
+
+
+# shared by ObjModel materials and Texture objects
+texture_cache = TextureCache()
@@ -0,0 +1,386 @@
+import ctypes
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, List, NamedTuple, Optional, Tuple
+
+import OpenGL.GL as gl
+from OpenGL.GL.EXT.texture_compression_s3tc import (
+    GL_COMPRESSED_RGB_S3TC_DXT1_EXT,
+    GL_COMPRESSED_RGBA_S3TC_DXT5_EXT,
+    glInitTextureCompressionS3TcEXT,
+)
+from OpenGL.GL.EXT.texture_sRGB import (
+    GL_COMPRESSED_SRGB_ALPHA_S3TC_DXT5_EXT,
+    GL_COMPRESSED_SRGB_S3TC_DXT1_EXT,
+)
+from OpenGL.raw.GL.VERSION.GL_1_3 import glCompressedTexImage2D
+from PIL import Image
+
+import constants
+from renderer.gl_state import gl_state
+from utils.log import get_logger
+from utils.stats import stats
+from utils.texture_cook import Levels, is_fresh, read_cooked
+
+logger = get_logger()
+
+# (compression, srgb) -> internal format of cooked images
+COMPRESSED_FORMATS = {
+    ("bc1", False): GL_COMPRESSED_RGB_S3TC_DXT1_EXT,
+    ("bc1", True): GL_COMPRESSED_SRGB_S3TC_DXT1_EXT,
+    ("bc3", False): GL_COMPRESSED_RGBA_S3TC_DXT5_EXT,
+    ("bc3", True): GL_COMPRESSED_SRGB_ALPHA_S3TC_DXT5_EXT,
+}
+
+
+class ImageData(NamedTuple):
+    target: int
+    width: int
+    height: int
+    pixels: bytes
+    # mip levels and compression of a cooked image, None for raw pixels
+    levels: Optional[Levels] = None
+    compression: Optional[str] = None
+
+
+def decode_image(
+    path: str,
+    mode: Optional[str] = None,
+    flip: bool = False,
+    target: int = gl.GL_TEXTURE_2D,
+    cooked: bool = False,
+) -> ImageData:
+    """
+    Decode an image into rows ready for glTexImage2D, bottom row first.
+    Needs no GL context, so it runs on the loader threads.
+
+    args:
+        mode: raw mode of the pixels, RGBX for RGB images and RGBA for
+            anything else if None
+        flip: flip vertically before the usual bottom up conversion
+        cooked: read the block compressed levels written by cook.py
+            instead, if they are up to date
+    """
+    if cooked:
+        result = read_cooked(path, flip)
+        # cooked alpha can not be dropped for RGBX
+        if result is not None and (mode in (None, "RGBA") or not result[1]):
+            compression, _, levels, data = result
+            width, height = levels[0][:2]
+            return ImageData(target, width, height, data, levels, compression)
+
+    with Image.open(path) as image:
+        if flip:
+            image = image.transpose(Image.FLIP_TOP_BOTTOM)
+        if mode is None:
+            mode = "RGBX" if image.mode == "RGB" else "RGBA"
+        data = image.tobytes("raw", mode, 0, -1)
+        return ImageData(target, image.size[0], image.size[1], data)
+
+
+class TextureRequest:
+    """A texture whose images are decoded in the background and uploaded
+    over the following frames."""
+
+    name: str
+    target: int
+    internal_format: int
+    parameters: Callable[[], None]
+    on_ready: Callable[[int], None]
+
+    texture_id: int = -1
+    size: Tuple[int, int] = (0, 0)
+    num_images: int
+    uploaded: int = 0
+    # images uploaded with their cooked mip levels
+    cooked: int = 0
+    cancelled: bool = False
+    ready: bool = False
+
+    def __init__(
+        self, name, target, internal_format, parameters, on_ready, num_images
+    ):
+        self.name = name
+        self.target = target
+        self.internal_format = internal_format
+        self.parameters = parameters
+        self.on_ready = on_ready
+        self.num_images = num_images
+
+
+class TextureLoader:
+    """
+    Loads textures without stalling the render thread: images are decoded
+    by a thread pool, then copied into pixel buffer objects and uploaded
+    from them on later frames, at most upload_budget bytes per frame.
+
+    Until a request is ready its owner keeps binding a placeholder, e.g.
+    ObjModel.defaultTextureOne or placeholder().
+    """
+
+    executor: Optional[ThreadPoolExecutor] = None
+    upload_budget: int
+    # images whose decode finished, filled in by the loader threads
+    decoded: deque
+    # (request, image, pixel buffer) copied this frame, uploaded next frame
+    filled: List[Tuple[TextureRequest, ImageData, int]]
+    placeholders: Dict[int, int]
+
+    pending: int = 0
+    started: float = None
+    # None until checked on the render thread
+    compressed: Optional[bool] = None
+
+    def __init__(
+        self,
+        threads: int = constants.TEXTURE_LOAD_THREADS,
+        upload_budget: int = constants.TEXTURE_UPLOAD_BUDGET,
+    ):
+        self.threads = threads
+        self.upload_budget = upload_budget
+        self.decoded = deque()
+        self.filled = []
+        self.placeholders = {}
+
+    def load(
+        self,
+        path: str,
+        srgb: bool = False,
+        mode: Optional[str] = None,
+        parameters: Callable[[], None] = lambda: None,
+        on_ready: Callable[[int], None] = lambda _: None,
+    ) -> TextureRequest:
+        """Load a mipmapped 2d texture, on_ready receives the texture id
+        once it can be used. parameters is called with it bound."""
+        return self._submit(
+            path,
+            gl.GL_TEXTURE_2D,
+            gl.GL_SRGB_ALPHA if srgb else gl.GL_RGBA,
+            [(path, mode, False, gl.GL_TEXTURE_2D, self.use_cooked())],
+            parameters,
+            on_ready,
+        )
+
+    def load_cube(
+        self,
+        faces: Dict[int, str],
+        flip: bool = False,
+        parameters: Callable[[], None] = lambda: None,
+        on_ready: Callable[[int], None] = lambda _: None,
+    ) -> TextureRequest:
+        """Load a mipmapped cube map from one image per face target."""
+        # faces can not mix compressed and raw images
+        cooked = self.use_cooked() and all(
+            is_fresh(path, flip) for path in faces.values()
+        )
+        return self._submit(
+            ", ".join(faces.values()),
+            gl.GL_TEXTURE_CUBE_MAP,
+            gl.GL_RGBA,
+            [
+                (path, "RGBA", flip, face, cooked)
+                for face, path in faces.items()
+            ],
+            parameters,
+            on_ready,
+        )
+
+    def use_cooked(self) -> bool:
+        if self.compressed is None:
+            self.compressed = not constants.DISABLE_COOKED_TEXTURES and bool(
+                glInitTextureCompressionS3TcEXT()
+            )
+            if not self.compressed:
+                logger.debug("not using cooked textures")
+        return self.compressed
+
+    def _submit(
+        self, name, target, internal_format, images, parameters, on_ready
+    ) -> TextureRequest:
+        if self.executor is None:
+            self.executor = ThreadPoolExecutor(
+                self.threads, thread_name_prefix="texture"
+            )
+        if self.pending == 0:
+            self.started = time.perf_counter()
+
+        request = TextureRequest(
+            name, target, internal_format, parameters, on_ready, len(images)
+        )
+        self.pending += 1
+        for image in images:
+            future = self.executor.submit(decode_image, *image)
+            future.add_done_callback(
+                lambda future: self.decoded.append((request, future))
+            )
+        return request
+
+    def cancel(self, request: TextureRequest) -> None:
+        """Stop loading a request that is no longer needed, deleting its
+        texture unless it was handed out already."""
+        if request.ready or request.cancelled:
+            return
+        request.cancelled = True
+        self.pending -= 1
+        if request.texture_id != -1:
+            gl_state.delete_textures([request.texture_id])
+            request.texture_id = -1
+
+    def update(self) -> None:
+        """Advance uploads, called once per frame on the render thread."""
+        for request, image, buffer in self.filled:
+            self._upload(request, image, buffer)
+        self.filled = []
+
+        budget = self.upload_budget
+        while self.decoded and budget > 0:
+            request, future = self.decoded.popleft()
+            if request.cancelled:
+                continue
+
+            try:
+                image = future.result()
+            except Exception as e:
+                logger.warning(f"failed to load texture '{request.name}': {e}")
+                self.cancel(request)
+                continue
+
+            # copying into the pixel buffer now and uploading from it next
+            # frame lets the driver transfer asynchronously
+            pixels = image.pixels
+            buffer = gl.glGenBuffers(1)
+            gl.glBindBuffer(gl.GL_PIXEL_UNPACK_BUFFER, buffer)
+            gl.glBufferData(
+                gl.GL_PIXEL_UNPACK_BUFFER, len(pixels), None, gl.GL_STREAM_DRAW
+            )
+            pointer = gl.glMapBufferRange(
+                gl.GL_PIXEL_UNPACK_BUFFER,
+                0,
+                len(pixels),
+                gl.GL_MAP_WRITE_BIT | gl.GL_MAP_INVALIDATE_BUFFER_BIT,
+            )
+            ctypes.memmove(pointer, pixels, len(pixels))
+            gl.glUnmapBuffer(gl.GL_PIXEL_UNPACK_BUFFER)
+            gl.glBindBuffer(gl.GL_PIXEL_UNPACK_BUFFER, 0)
+
+            self.filled.append((request, image._replace(pixels=None), buffer))
+            budget -= len(pixels)
+            stats.add("texture upload bytes", len(pixels))
+
+    def _upload(
+        self, request: TextureRequest, image: ImageData, buffer: int
+    ) -> None:
+        if not request.cancelled:
+            if request.texture_id == -1:
+                request.texture_id = gl.glGenTextures(1)
+            gl_state.bind_texture(request.target, request.texture_id)
+            gl.glBindBuffer(gl.GL_PIXEL_UNPACK_BUFFER, buffer)
+            if image.levels is None:
+                gl.glTexImage2D(
+                    image.target,
+                    0,
+                    request.internal_format,
+                    image.width,
+                    image.height,
+                    0,
+                    gl.GL_RGBA,
+                    gl.GL_UNSIGNED_BYTE,
+                    None,
+                )
+            else:
+                srgb = request.internal_format == gl.GL_SRGB_ALPHA
+                internal_format = COMPRESSED_FORMATS[image.compression, srgb]
+                for level, (width, height, offset, size) in enumerate(
+                    image.levels
+                ):
+                    # the wrapped version sizes the data itself and can
+                    # not take an offset into the pixel buffer
+                    glCompressedTexImage2D(
+                        image.target,
+                        level,
+                        internal_format,
+                        width,
+                        height,
+                        0,
+                        size,
+                        ctypes.c_void_p(offset),
+                    )
+                request.cooked += 1
+            gl.glBindBuffer(gl.GL_PIXEL_UNPACK_BUFFER, 0)
+            request.size = (image.width, image.height)
+            request.uploaded += 1
+
+            if request.uploaded == request.num_images:
+                # cooked images come with their mip levels
+                if request.cooked == 0:
+                    gl.glGenerateMipmap(request.target)
+                elif request.cooked < request.num_images:
+                    logger.warning(
+                        f"texture '{request.name}' mixes cooked and raw "
+                        "images, run cook.py again"
+                    )
+                request.parameters()
+                self._ready(request)
+
+        gl.glDeleteBuffers(1, [buffer])
+
+    def _ready(self, request: TextureRequest) -> None:
+        request.ready = True
+        self.pending -= 1
+        logger.debug(
+            f"loaded texture: (id {request.texture_id}) {request.name}"
+        )
+        request.on_ready(request.texture_id)
+
+        if self.pending == 0:
+            logger.debug(
+                "all textures loaded after "
+                f"{time.perf_counter() - self.started:.2f}s"
+            )
+
+    def placeholder(self, target: int = gl.GL_TEXTURE_2D) -> int:
+        """Plain white texture to bind while a request is not ready."""
+        if target not in self.placeholders:
+            texture = gl.glGenTextures(1)
+            gl_state.bind_texture(target, texture)
+            faces = [gl.GL_TEXTURE_2D]
+            if target == gl.GL_TEXTURE_CUBE_MAP:
+                faces = [
+                    gl.GL_TEXTURE_CUBE_MAP_POSITIVE_X + i for i in range(6)
+                ]
+            for face in faces:
+                gl.glTexImage2D(
+                    face,
+                    0,
+                    gl.GL_RGBA,
+                    1,
+                    1,
+                    0,
+                    gl.GL_RGBA,
+                    gl.GL_FLOAT,
+                    [1.0, 1.0, 1.0, 1.0],
+                )
+            # only level 0 exists, do not leave completeness to the
+            # mipmapped default minification filter
+            gl.glTexParameteri(target, gl.GL_TEXTURE_MIN_FILTER, gl.GL_LINEAR)
+            gl.glTexParameteri(target, gl.GL_TEXTURE_MAG_FILTER, gl.GL_LINEAR)
+            self.placeholders[target] = texture
+        return self.placeholders[target]
+
+    def shutdown(self) -> None:
+        if self.executor is not None:
+            self.executor.shutdown(wait=True, cancel_futures=True)
+            self.executor = None
+        for _, _, buffer in self.filled:
+            gl.glDeleteBuffers(1, [buffer])
+        self.filled = []
+        self.decoded.clear()
+        if self.placeholders:
+            textures = list(self.placeholders.values())
+            gl_state.delete_textures(textures)
+            self.placeholders = {}
+
+
+# shared by everything that loads textures
+texture_loader = TextureLoader()
@@ -0,0 +1,21 @@
+// filled once per frame, see renderer/frame_data.py
+layout(std140, row_major) uniform FrameData {
+    mat4 worldToViewTransform;
+    mat4 viewToClipTransform;
+    // view space
+    vec3 lightPositionL;
+    float attenuationLinear;
+    vec3 lightPositionR;
+    float attenuationQuadratic;
+    vec3 ambientLightColourAndIntensity;
+    bool enableSrgb;
+};
+
+// per entity, the frame defaults unless overridden
+layout(std140) uniform DrawData {
+    vec3 lightColourAndIntensityL;
+    float fogExtinctionOffset;
+    vec3 lightColourAndIntensityR;
+    float fogExtinctionCoeff;
+    vec3 fogColor;
+};
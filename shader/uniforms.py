@@ -0,0 +1,251 @@
+import re
+from typing import Any, Callable, Dict, Iterable, NamedTuple, Optional
+
+import numpy as np
+import OpenGL.GL as gl
+
+import constants
+from utils.log import get_logger
+from utils.stats import stats
+
+logger = get_logger()
+
+UNIFORM_PATTERN = re.compile(
+    r"^\s*uniform\s+(?:(?:lowp|mediump|highp)\s+)?(\w+)\s+(\w+)",
+    re.MULTILINE,
+)
+
+# glsl type name -> GL_ACTIVE_UNIFORM type
+GLSL_TYPES = {
+    "float": gl.GL_FLOAT,
+    "vec2": gl.GL_FLOAT_VEC2,
+    "vec3": gl.GL_FLOAT_VEC3,
+    "vec4": gl.GL_FLOAT_VEC4,
+    "int": gl.GL_INT,
+    "bool": gl.GL_BOOL,
+    "mat3": gl.GL_FLOAT_MAT3,
+    "mat4": gl.GL_FLOAT_MAT4,
+    "sampler2D": gl.GL_SAMPLER_2D,
+    "samplerCube": gl.GL_SAMPLER_CUBE,
+}
+
+
+def declared_uniforms(sources: Iterable[str]) -> Dict[str, str]:
+    """Name to glsl type of every uniform the sources declare, whether or
+    not the linker kept it."""
+    return {
+        name: glsl_type
+        for source in sources
+        for glsl_type, name in UNIFORM_PATTERN.findall(source)
+    }
+
+
+Setter = Callable[[Any], None]
+
+
+def shadowed(upload: Setter, convert: Callable[[Any], Any] = None) -> Setter:
+    """
+    Wrap upload so it is skipped while the value matches the last one
+    uploaded, uniforms keep their values in the program between draws.
+
+    args:
+        convert: turns a value into the float32/int32 array uploaded,
+            compared by its bytes, None for scalars compared as is
+    """
+    last = None
+
+    if convert is None:
+
+        def set(value):
+            nonlocal last
+            if value == last:
+                stats.add("uniforms skipped")
+                return
+            last = value
+            upload(value)
+            stats.add("uniforms issued")
+
+        return set
+
+    def set_array(value):
+        nonlocal last
+        data = convert(value)
+        key = data.tobytes()
+        if key == last:
+            stats.add("uniforms skipped")
+            return
+        last = key
+        upload(data)
+        stats.add("uniforms issued")
+
+    return set_array
+
+
+def float_array(value) -> np.ndarray:
+    return np.asarray(value, dtype=np.float32)
+
+
+def int_array(value) -> np.ndarray:
+    return np.asarray(value, dtype=np.int32)
+
+
+def matrix_array(value) -> np.ndarray:
+    return value.getData()
+
+
+def make_upload(type: int, location: int, size: int = 1):
+    """glUniform call for a uniform and the conversion its value needs,
+    None for scalars."""
+    if type == gl.GL_FLOAT:
+        if size == 1:
+            return lambda value: gl.glUniform1f(location, value), None
+        return (
+            lambda data: gl.glUniform1fv(location, size, data),
+            float_array,
+        )
+    if type == gl.GL_FLOAT_VEC2:
+        return (
+            lambda data: gl.glUniform2fv(location, size, data),
+            float_array,
+        )
+    if type == gl.GL_FLOAT_VEC3:
+        return (
+            lambda data: gl.glUniform3fv(location, size, data),
+            float_array,
+        )
+    if type == gl.GL_FLOAT_VEC4:
+        return (
+            lambda data: gl.glUniform4fv(location, size, data),
+            float_array,
+        )
+    if type == gl.GL_FLOAT_MAT3:
+        return (
+            lambda data: gl.glUniformMatrix3fv(
+                location, size, gl.GL_TRUE, data
+            ),
+            matrix_array,
+        )
+    if type == gl.GL_FLOAT_MAT4:
+        return (
+            lambda data: gl.glUniformMatrix4fv(
+                location, size, gl.GL_TRUE, data
+            ),
+            matrix_array,
+        )
+    if type in (
+        gl.GL_INT,
+        gl.GL_BOOL,
+        gl.GL_SAMPLER_2D,
+        gl.GL_SAMPLER_CUBE,
+    ):
+        if size == 1:
+            return lambda value: gl.glUniform1i(location, int(value)), None
+        return (
+            lambda data: gl.glUniform1iv(location, size, data),
+            int_array,
+        )
+    raise ValueError(f"unsupported uniform type: {type}")
+
+
+def make_setter(type: int, location: int, size: int = 1) -> Setter:
+    """Setter for one uniform, chosen once from its reflected type, that
+    skips values the program already has unless SHADOW_UNIFORMS is
+    off."""
+    upload, convert = make_upload(type, location, size)
+    if not constants.SHADOW_UNIFORMS:
+        if convert is None:
+            return upload
+        return lambda value: upload(convert(value))
+    return shadowed(upload, convert)
+
+
+class Uniform(NamedTuple):
+    name: str
+    location: int
+    type: int
+    size: int
+    set: Setter
+
+
+class ProgramUniforms:
+    """
+    Active uniforms of a linked program, reflected once with
+    glGetActiveUniform, each with its location and a setter for its type.
+
+    Names the sources declare but the linker dropped are skipped quietly,
+    any other name is a mistake and raises ValueError instead of writing
+    to location -1.
+
+    The setters remember the last value they uploaded, so the uniforms of
+    a program must only be set through its table.
+    """
+
+    program: int
+    uniforms: Dict[str, Uniform]
+    # every name the sources declare, None if they are not known
+    declared: Optional[Dict[str, str]]
+
+    def __init__(self, program: int, sources: Iterable[str] = None):
+        self.program = program
+        self.uniforms = {}
+        self.declared = (
+            declared_uniforms(sources) if sources is not None else None
+        )
+
+        count = gl.glGetProgramiv(program, gl.GL_ACTIVE_UNIFORMS)
+        for index in range(count):
+            name, size, type = gl.glGetActiveUniform(program, index)
+            name = name.decode() if isinstance(name, bytes) else name
+            # arrays are reported as their first element
+            name = name.removesuffix("[0]")
+            location = gl.glGetUniformLocation(program, name)
+            if location == -1:
+                # members of uniform blocks have no location
+                continue
+            try:
+                setter = make_setter(type, location, size)
+            except ValueError as e:
+                logger.warning(f"skipping uniform '{name}': {e}")
+                continue
+            self.uniforms[name] = Uniform(name, location, type, size, setter)
+
+    def is_known(self, name: str) -> bool:
+        if name in self.uniforms:
+            return True
+        return self.declared is not None and name in self.declared
+
+    def location(self, name: str) -> int:
+        """Location of name, -1 if the linker dropped it."""
+        uniform = self.uniforms.get(name)
+        if uniform is not None:
+            return uniform.location
+        if not self.is_known(name):
+            raise ValueError(f"unknown uniform '{name}' in {self.program}")
+        return -1
+
+    def setter(self, name: str) -> Optional[Setter]:
+        """Setter of name, None if the linker dropped it."""
+        uniform = self.uniforms.get(name)
+        if uniform is not None:
+            return uniform.set
+        if not self.is_known(name):
+            raise ValueError(f"unknown uniform '{name}' in {self.program}")
+        return None
+
+    def set(self, name: str, value: Any) -> None:
+        uniform = self.uniforms.get(name)
+        if uniform is not None:
+            uniform.set(value)
+        elif not self.is_known(name):
+            raise ValueError(f"unknown uniform '{name}' in {self.program}")
+
+    def update(self, values: Dict[str, Any], strict: bool = True) -> None:
+        """Set several uniforms, with strict=False names the program does
+        not know are skipped, e.g. for values shared by every program."""
+        uniforms = self.uniforms
+        for name, value in values.items():
+            uniform = uniforms.get(name)
+            if uniform is not None:
+                uniform.set(value)
+            elif strict and not self.is_known(name):
+                raise ValueError(f"unknown uniform '{name}' in {self.program}")
@@ -1,12 +1,18 @@
-from ctypes import c_float, c_uint
+import hashlib
+import re
+from ctypes import c_float, c_void_p
 from functools import cache
-from typing import Any
+from typing import Any, Dict
 
 import numpy as np
 import OpenGL.GL as gl
 
+from renderer.gl_state import gl_state
+from shader.uniforms import ProgramUniforms
 from utils.log import get_logger
-from utils.math import Mat3, Mat4, flatten
+from utils.math import flatten
+from utils.registry import Registry
+from utils.vertex_format import VertexLayout
 
 logger = get_logger()
 
@@ -33,6 +39,12 @@ def compile_and_attach_shader(program, type, sources):
 
 Program = Any
 
+# uniform buffer binding points of the blocks in uniform_blocks.glsl
+UNIFORM_BLOCK_BINDINGS = {
+    "FrameData": 0,
+    "DrawData": 1,
+}
+
 
 def build_shader(
     vertex_shader_sources,
@@ -62,9 +74,66 @@ def build_shader(
         err = gl.glGetProgramInfoLog(shader).decode()
         raise RuntimeError(err)
 
+    for name, binding in UNIFORM_BLOCK_BINDINGS.items():
+        index = gl.glGetUniformBlockIndex(shader, name)
+        if index != gl.GL_INVALID_INDEX:
+            gl.glUniformBlockBinding(shader, index, binding)
+
     return shader
 
 
+def describe_program(key) -> str:
+    """The shader files a program was built from, or a short hash of
+    sources that were not read by load_glsl."""
+    return " + ".join(
+        glsl_filenames.get(sources)
+        or hashlib.sha1(str(sources).encode()).hexdigest()[:8]
+        for sources in key[:2]
+    )
+
+
+programs = Registry("program", describe_program)
+program_keys = {}
+# reflected lazily, see program_uniforms
+program_tables: Dict[Program, ProgramUniforms] = {}
+
+
+def acquire_shader(
+    vertex_shader_sources,
+    fragment_shader_sources,
+    attrib_locs={},
+    frag_data_locs={},
+) -> Program:
+    """Like build_shader, but programs built from the same sources and
+    bindings are compiled once and shared. Pair with release_shader."""
+    key = (
+        vertex_shader_sources,
+        fragment_shader_sources,
+        tuple(sorted(attrib_locs.items())),
+        tuple(sorted(frag_data_locs.items())),
+    )
+    program = programs.acquire(
+        key,
+        lambda: build_shader(
+            vertex_shader_sources,
+            fragment_shader_sources,
+            attrib_locs,
+            frag_data_locs,
+        ),
+        gl_state.delete_program,
+    )
+    program_keys[program] = key
+    return program
+
+
+def release_shader(program: Program) -> None:
+    key = program_keys[program]
+    programs.release(key)
+    if programs.refs(key) == 0:
+        del program_keys[program]
+        program_tables.pop(program, None)
+
+
 def set_attribute_location(program, vertex={}, fragment={}):
     for name, loc in vertex.items():
         gl.glBindAttribLocation(program, loc, name)
@@ -73,32 +142,38 @@ def set_attribute_location(program, vertex={}, fragment={}):
         gl.glBindFragDataLocation(program, loc, name)
 
 
+def program_uniforms(program: Program) -> ProgramUniforms:
+    """Uniform table of a linked program, reflected on first use. Names
+    are checked against the sources of programs made by acquire_shader."""
+    table = program_tables.get(program)
+    if table is None:
+        key = program_keys.get(program)
+        table = ProgramUniforms(program, key[:2] if key is not None else None)
+        program_tables[program] = table
+    return table
+
+
 def set_uniform(program, name, value):
-    loc = gl.glGetUniformLocation(program, name)
-    if isinstance(value, float):
-        gl.glUniform1f(loc, value)
-    elif isinstance(value, int):
-        gl.glUniform1i(loc, value)
-    elif isinstance(value, (np.ndarray, list)):
-        if len(value) == 2:
-            gl.glUniform2fv(loc, 1, value)
-        if len(value) == 3:
-            gl.glUniform3fv(loc, 1, value)
-        if len(value) == 4:
-            gl.glUniform4fv(loc, 1, value)
-    elif isinstance(value, (Mat3, Mat4)):
-        value._set_open_gl_uniform(loc)
-    else:
-        raise ValueError(f"invalid uniform value: '{name}': {value}")
+    program_uniforms(program).set(name, value)
 
 
 ShaderSource = Any
+# the file each source returned by load_glsl was read from
+glsl_filenames: Dict[ShaderSource, str] = {}
+
+
+INCLUDE_PATTERN = re.compile(r'^#include "(\w+)"[ \t]*$', re.MULTILINE)
 
 
 @cache
 def load_glsl(filename) -> ShaderSource:
+    """Read shader/{filename}.glsl, replacing #include "name" lines with
+    the contents of shader/name.glsl."""
     with open(f"shader/{filename}.glsl", "r") as f:
-        return f.read()
+        source = f.read()
+    source = INCLUDE_PATTERN.sub(lambda match: load_glsl(match[1]), source)
+    glsl_filenames.setdefault(source, filename)
+    return source
 
 
 def create_vertex_obj():
@@ -106,7 +181,7 @@ def create_vertex_obj():
 
 
 def prepare_vertex_data_buffer(vertex_array_object, data, attribute_index):
-    gl.glBindVertexArray(vertex_array_object)
+    gl_state.bind_vertex_array(vertex_array_object)
     buffer = gl.glGenBuffers(1)
     flat_data = flatten(data)
     data_buffer = (c_float * len(flat_data))(*flat_data)
@@ -122,20 +197,22 @@ def prepare_vertex_data_buffer(vertex_array_object, data, attribute_index):
     )
     gl.glEnableVertexAttribArray(attribute_index)
     gl.glBindBuffer(gl.GL_ARRAY_BUFFER, 0)
-    gl.glBindVertexArray(0)
 
     return buffer
 
 
 def prepare_index_data_buffer(vertex_array_object, data):
-    gl.glBindVertexArray(vertex_array_object)
+    gl_state.bind_vertex_array(vertex_array_object)
     buffer = gl.glGenBuffers(1)
-    gl.glBindBuffer(gl.GL_ARRAY_BUFFER, buffer)
-    data_buffer = (c_uint * len(data))(*data)
-    gl.glBufferData(gl.GL_ARRAY_BUFFER, data_buffer, gl.GL_STATIC_DRAW)
+    data_buffer = np.ascontiguousarray(data, dtype=np.uint32)
+    # the element array binding is part of the vertex array object state
     gl.glBindBuffer(gl.GL_ELEMENT_ARRAY_BUFFER, buffer)
-    gl.glBindBuffer(gl.GL_ARRAY_BUFFER, 0)
-    gl.glBindVertexArray(0)
+    gl.glBufferData(
+        gl.GL_ELEMENT_ARRAY_BUFFER,
+        data_buffer.nbytes,
+        data_buffer,
+        gl.GL_STATIC_DRAW,
+    )
 
     return buffer
 
@@ -145,7 +222,7 @@ Texture = Any
 
 def create_default_texture(data) -> Texture:
     texture = gl.glGenTextures(1)
-    gl.glBindTexture(gl.GL_TEXTURE_2D, texture)
+    gl_state.bind_texture(gl.GL_TEXTURE_2D, texture)
     gl.glTexImage2D(
         gl.GL_TEXTURE_2D,
         0,
@@ -157,7 +234,6 @@ def create_default_texture(data) -> Texture:
         gl.GL_FLOAT,
         data,
     )
-    gl.glBindTexture(gl.GL_TEXTURE_2D, 0)
 
     return texture
 
@@ -165,12 +241,16 @@ def create_default_texture(data) -> Texture:
 def create_bind_vertex_attrib_array_float(data, attribLoc):
     bufId = gl.glGenBuffers(1)
     gl.glBindBuffer(gl.GL_ARRAY_BUFFER, bufId)
-    flatData = flatten(data)
-    data_buffer = (c_float * len(flatData))(*flatData)
-    gl.glBufferData(gl.GL_ARRAY_BUFFER, data_buffer, gl.GL_STATIC_DRAW)
+    data_buffer = np.ascontiguousarray(data, dtype=np.float32)
+    gl.glBufferData(
+        gl.GL_ARRAY_BUFFER,
+        data_buffer.nbytes,
+        data_buffer,
+        gl.GL_STATIC_DRAW,
+    )
     gl.glVertexAttribPointer(
         attribLoc,
-        int(len(flatData) / len(data)),
+        data_buffer.shape[-1],
         gl.GL_FLOAT,
         gl.GL_FALSE,
         0,
@@ -180,8 +260,34 @@ def create_bind_vertex_attrib_array_float(data, attribLoc):
     return bufId
 
 
+def create_bind_interleaved_vertex_buffer(data, layout: VertexLayout):
+    """Upload a structured array from utils.vertex_format.pack_vertices and
+    point every attribute of its layout into the single buffer."""
+    bufId = gl.glGenBuffers(1)
+    gl.glBindBuffer(gl.GL_ARRAY_BUFFER, bufId)
+    data_buffer = np.ascontiguousarray(data).view(np.uint8)
+    gl.glBufferData(
+        gl.GL_ARRAY_BUFFER,
+        data_buffer.nbytes,
+        data_buffer,
+        gl.GL_STATIC_DRAW,
+    )
+    for attribLoc, field, size, type, normalized in layout.attributes:
+        gl.glVertexAttribPointer(
+            attribLoc,
+            size,
+            type,
+            gl.GL_TRUE if normalized else gl.GL_FALSE,
+            layout.stride,
+            c_void_p(layout.offset(field)),
+        )
+        gl.glEnableVertexAttribArray(attribLoc)
+    return bufId
+
+
 def bind_texture(texUnit, textureId, defaultTexture):
-    gl.glActiveTexture(gl.GL_TEXTURE0 + texUnit)
-    gl.glBindTexture(
-        gl.GL_TEXTURE_2D, textureId if textureId != -1 else defaultTexture
+    gl_state.bind_texture(
+        gl.GL_TEXTURE_2D,
+        textureId if textureId != -1 else defaultTexture,
+        unit=texUnit,
     )
@@ -0,0 +1,210 @@
+from typing import List, Tuple
+
+import numpy as np
+
+# (offset, count) ranges into an index buffer
+IndexRange = Tuple[int, int]
+
+# boxes under a leaf of BVH, tested one by one once the leaf is reached
+BVH_LEAF_SIZE = 32
+# fewer boxes are faster to test all at once, a numpy pass per level of
+# the tree costs more than it saves
+BVH_MIN_BOXES = 16384
+
+
+def _median_split(points: np.ndarray, items: np.ndarray, limit: int):
+    """
+    Split items, indices into points, in half at the median of the
+    longest axis of their bounds until at most limit are left, depth
+    first, so neighbouring groups are near each other as well.
+    """
+    groups = []
+    stack = [items]
+    while stack:
+        group = stack.pop()
+        if len(group) <= limit:
+            groups.append(group)
+            continue
+        selected = points[group]
+        axis = int(np.argmax(selected.max(axis=0) - selected.min(axis=0)))
+        half = len(group) // 2
+        order = np.argpartition(selected[:, axis], half)
+        # the first half goes first
+        stack.append(group[order[half:]])
+        stack.append(group[order[:half]])
+    return groups
+
+
+def split_clusters(
+    positions: np.ndarray,
+    indices: np.ndarray,
+    ranges: List[IndexRange],
+    max_triangles: int,
+) -> Tuple[np.ndarray, List[List[IndexRange]]]:
+    """
+    Reorder the triangles inside each (offset, count) index range into
+    spatially coherent clusters of at most max_triangles, leaving the
+    ranges themselves, and so the material order, untouched. Triangles
+    keep their relative order within a cluster, so an order made for the
+    vertex cache mostly survives.
+
+    returns:
+        new indices
+        the (offset, count) of the clusters of every range
+    """
+    result = indices.copy()
+    clusters = []
+    for offset, count in ranges:
+        if max_triangles <= 0 or count <= 3 * max_triangles:
+            clusters.append([(offset, count)])
+            continue
+        triangles = indices[offset : offset + count].reshape(-1, 3)
+        centroids = positions[triangles].mean(axis=1)
+        groups = [
+            np.sort(group)
+            for group in _median_split(
+                centroids, np.arange(len(triangles)), max_triangles
+            )
+        ]
+        result[offset : offset + count] = triangles[
+            np.concatenate(groups)
+        ].reshape(-1)
+
+        sub_ranges = []
+        start = offset
+        for group in groups:
+            sub_ranges.append((start, 3 * len(group)))
+            start += 3 * len(group)
+        clusters.append(sub_ranges)
+    return result, clusters
+
+
+def _classify(
+    planes: np.ndarray, centers: np.ndarray, extents: np.ndarray
+) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Boxes outside of every one of the (F, 6, 4) frustums, and boxes inside
+    of at least one of them, as two masks.
+    """
+    frustums = len(planes)
+    normals = planes[:, :, :3].reshape(-1, 3).T
+    distances = (centers @ normals + planes[:, :, 3].reshape(-1)).reshape(
+        -1, frustums, 6
+    )
+    radii = (extents @ np.abs(normals)).reshape(-1, frustums, 6)
+    outside = (distances < -radii).any(axis=2).all(axis=1)
+    inside = (distances >= radii).all(axis=2).any(axis=1)
+    return outside, inside
+
+
+def _add_runs(
+    runs: np.ndarray, first: np.ndarray, count: np.ndarray, nodes
+) -> None:
+    np.add.at(runs, first[nodes], 1)
+    np.add.at(runs, first[nodes] + count[nodes], -1)
+
+
+class BVH:
+    """
+    Bounding volume hierarchy over axis aligned boxes, e.g. the clusters
+    of a model, built by median splits. Nodes are kept in flat arrays and
+    cull walks them a level at a time, testing a whole level against the
+    frustum at once.
+    """
+
+    box_centers: np.ndarray
+    box_extents: np.ndarray
+    # boxes in leaf order, every node covers a contiguous run of these
+    order: np.ndarray
+    # bounds of every node, the root first
+    centers: np.ndarray
+    extents: np.ndarray
+    # per node, the run of order below it and its two children, -1 for a
+    # leaf
+    first: np.ndarray
+    count: np.ndarray
+    children: np.ndarray
+
+    def __init__(
+        self,
+        centers: np.ndarray,
+        extents: np.ndarray,
+        leaf_size: int = BVH_LEAF_SIZE,
+    ):
+        self.box_centers = np.asarray(centers, dtype=np.float32)
+        self.box_extents = np.asarray(extents, dtype=np.float32)
+        low = self.box_centers - self.box_extents
+        high = self.box_centers + self.box_extents
+
+        order = []
+        nodes = []  # (first, count, left, right)
+        bounds = []
+
+        def build(items: np.ndarray) -> int:
+            node = len(nodes)
+            nodes.append(None)
+            bounds.append((low[items].min(axis=0), high[items].max(axis=0)))
+            if len(items) <= leaf_size:
+                nodes[node] = (len(order), len(items), -1, -1)
+                order.extend(items.tolist())
+                return node
+            first = len(order)
+            selected = self.box_centers[items]
+            axis = int(np.argmax(selected.max(axis=0) - selected.min(axis=0)))
+            half = len(items) // 2
+            split = np.argpartition(selected[:, axis], half)
+            left = build(items[split[:half]])
+            right = build(items[split[half:]])
+            nodes[node] = (first, len(order) - first, left, right)
+            return node
+
+        build(np.arange(len(self.box_centers)))
+
+        self.order = np.array(order, dtype=np.int64)
+        nodes = np.array(nodes, dtype=np.int64).reshape(-1, 4)
+        self.first = nodes[:, 0]
+        self.count = nodes[:, 1]
+        self.children = nodes[:, 2:]
+        node_low = np.array([b[0] for b in bounds], dtype=np.float32)
+        node_high = np.array([b[1] for b in bounds], dtype=np.float32)
+        self.centers = (node_low + node_high) * 0.5
+        self.extents = (node_high - node_low) * 0.5
+
+    def cull(self, planes: np.ndarray) -> np.ndarray:
+        """
+        Mask of the boxes not entirely outside of the frustum given by the
+        (6, 4) planes, or of any of (F, 6, 4) frustums, see
+        utils.math.boxes_in_frustum.
+        """
+        planes = planes.reshape(-1, 6, 4)
+        # +1 where a run of boxes in leaf order starts, -1 after it ends,
+        # for the nodes inside and the leaves crossing a plane
+        inside_runs = np.zeros(len(self.order) + 1, dtype=np.int64)
+        crossing_runs = np.zeros(len(self.order) + 1, dtype=np.int64)
+
+        frontier = np.zeros(1, dtype=np.int64)
+        while len(frontier):
+            outside, inside = _classify(
+                planes, self.centers[frontier], self.extents[frontier]
+            )
+            _add_runs(inside_runs, self.first, self.count, frontier[inside])
+
+            crossing = frontier[~outside & ~inside]
+            is_leaf = self.children[crossing, 0] < 0
+            _add_runs(crossing_runs, self.first, self.count, crossing[is_leaf])
+            frontier = self.children[crossing[~is_leaf]].reshape(-1)
+
+        visible = np.cumsum(inside_runs[:-1]) > 0
+        # the boxes of leaves crossing a plane are tested one by one
+        tested = np.flatnonzero(np.cumsum(crossing_runs[:-1]))
+        if len(tested):
+            outside, _ = _classify(
+                planes,
+                self.box_centers[self.order[tested]],
+                self.box_extents[self.order[tested]],
+            )
+            visible[tested[~outside]] = True
+
+        result = np.empty(len(self.order), dtype=bool)
+        result[self.order] = visible
+        return result
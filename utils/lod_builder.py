@@ -0,0 +1,85 @@
+import multiprocessing
+from concurrent.futures import Future, ProcessPoolExecutor
+from typing import Callable, List, Optional, Tuple
+
+import constants
+from utils.log import get_logger
+from utils.mesh_cache import build_cached_lods
+from utils.obj import Mesh
+
+logger = get_logger()
+
+
+class LodBuilder:
+    """
+    Simplifies meshes into LODs in worker processes, as the simplifier is
+    pure Python and would otherwise hold up loading for seconds, or the
+    render thread through the GIL. Finished meshes are handed back on the
+    render thread by update, until then their model draws full detail.
+    """
+
+    executor: Optional[ProcessPoolExecutor] = None
+    workers: int
+    # (filename, future, on_ready) in the order they were requested
+    pending: List[Tuple[str, Future, Callable[[Mesh], None]]]
+
+    def __init__(self, workers: int = constants.LOD_BUILD_WORKERS):
+        self.workers = workers
+        self.pending = []
+
+    def build(
+        self, filename: str, mesh: Mesh, on_ready: Callable[[Mesh], None]
+    ) -> Future:
+        """Build the LODs of a mesh load_mesh returned without them,
+        on_ready receives the mesh with them appended."""
+        if self.executor is None:
+            # by now the GL context and the texture loader threads exist, a
+            # forked worker could inherit a lock one of them holds
+            self.executor = ProcessPoolExecutor(
+                self.workers, mp_context=multiprocessing.get_context("spawn")
+            )
+        future = self.executor.submit(build_cached_lods, filename, mesh)
+        self.pending.append((filename, future, on_ready))
+        return future
+
+    def cancel(self, future: Future) -> None:
+        """Drop a build that is no longer needed, e.g. of a deleted model.
+        A build already running still updates the mesh cache."""
+        future.cancel()
+        self.pending = [
+            entry for entry in self.pending if entry[1] is not future
+        ]
+
+    def update(self) -> None:
+        """Hand out finished builds, called once per frame on the render
+        thread."""
+        done = [entry for entry in self.pending if entry[1].done()]
+        if not done:
+            return
+
+        self.pending = [entry for entry in self.pending if entry not in done]
+        for filename, future, on_ready in done:
+            try:
+                mesh = future.result()
+            except Exception as e:
+                logger.warning(f"failed to build lods of '{filename}': {e}")
+                continue
+            logger.debug(f"built {len(mesh.lods)} lods of {filename}")
+            on_ready(mesh)
+
+    def wait(self) -> None:
+        """Block until every pending build is handed out."""
+        while self.pending:
+            self.pending[0][1].exception()
+            self.update()
+
+    def shutdown(self) -> None:
+        self.pending = []
+        if self.executor is not None:
+            # a build already running finishes, so the cache gets its lods
+            self.executor.shutdown(wait=True, cancel_futures=True)
+            self.executor = None
+
+
+# shared by every model that loads a mesh
+lod_builder = LodBuilder()
@@ -1,5 +1,5 @@
 import math
-from typing import Union
+from typing import Tuple, Union
 
 import numpy as np
 import OpenGL.GL as gl
@@ -19,18 +19,53 @@ def vec3(x, y=None, z=None):
     return np.array([x, y, z], dtype=np.float32)
 
 
+IDENTITY4 = np.identity(4, dtype=np.float32)
+IDENTITY3 = np.identity(3, dtype=np.float32)
+
+# what a transform is known to be, each kind includes the ones before it
+# and a product is the kind of its most general factor
+RIGID = 0  # rotation and translation
+UNIFORM = 1  # rigid with a uniform scale
+AFFINE = 2  # any linear part and translation
+GENERAL = 3  # anything else, e.g. a projection
+
+
 class Mat4:
-    matData = None
-
-    # Construct a Mat4 from a python array
-    def __init__(
-        self, p=[[1, 0, 0, 0], [0, 1, 0, 0], [0, 0, 1, 0], [0, 0, 0, 1]]
-    ):
-        if isinstance(p, Mat3):
-            self.matData = np.matrix(np.identity(4))
+    """
+    Row major 4x4 transform backed by one contiguous float32 array, the
+    exact data uploaded to OpenGL. Constructors and multiply take an out
+    transform to write into instead of allocating a new one.
+
+    The kind of the transform is tracked so inverses of rigid, uniformly
+    scaled and affine transforms take closed forms, matrices built from
+    raw data are assumed GENERAL.
+    """
+
+    __slots__ = ("matData", "kind")
+
+    matData: np.ndarray
+    kind: int
+
+    # Construct a Mat4 from a python array, a Mat3 or another Mat4's data
+    def __init__(self, p=None, kind: int = GENERAL):
+        if p is None:
+            self.matData = IDENTITY4.copy()
+            self.kind = RIGID
+        elif isinstance(p, Mat3):
+            self.matData = IDENTITY4.copy()
             self.matData[:3, :3] = p.matData
+            self.kind = min(p.kind, AFFINE)
         else:
-            self.matData = np.matrix(p)
+            self.matData = np.array(p, dtype=np.float32).reshape(4, 4)
+            self.kind = kind
+
+    @classmethod
+    def wrap(cls, data: np.ndarray, kind: int = GENERAL) -> "Mat4":
+        """Take ownership of a contiguous float32 (4, 4) array."""
+        mat = object.__new__(cls)
+        mat.matData = data
+        mat.kind = kind
+        return mat
 
     # overload the multiplication operator to enable sane looking transformation expressions!
     def __mul__(self, other):
@@ -39,38 +74,71 @@ class Mat4:
         # for transforming a vector). Could be made more robust...
         if isinstance(other, (np.ndarray, list)):
             return list(self.matData.dot(other).flat)
-        # Otherwise we assume it is another Mat4 or something compatible, and just multiply the matrices
-        # and return the result as a new Mat4
-        return Mat4(self.matData.dot(other.matData))
-
-    # Helper to get data as a contiguous array for upload to OpenGL
+        # Otherwise we assume it is another Mat4 and return the product as a
+        # new Mat4
+        return Mat4.wrap(
+            np.matmul(self.matData, other.matData), max(self.kind, other.kind)
+        )
+
+    def __imul__(self, other):
+        np.matmul(self.matData, other.matData, out=self.matData)
+        self.kind = max(self.kind, other.kind)
+        return self
+
+    # The data uploaded to OpenGL, not a copy
     def getData(self):
-        return np.ascontiguousarray(self.matData, dtype=np.float32)
+        return self.matData
 
     # note: returns an inverted copy, does not change the object (for clarity use the global function instead)
     #       only implemented as a member to make it easy to overload based on matrix class (i.e. 3x3 or 4x4)
     def _inverse(self):
-        return Mat4(np.linalg.inv(self.matData))
+        if self.kind == GENERAL:
+            return Mat4.wrap(np.linalg.inv(self.matData))
+        # [A t]^-1 = [A^-1 -A^-1 t]
+        linear = Mat3(self)._inverse().matData
+        data = IDENTITY4.copy()
+        data[:3, :3] = linear
+        data[:3, 3] = -(linear @ self.matData[:3, 3])
+        return Mat4.wrap(data, self.kind)
 
     def _transpose(self):
-        return Mat4(self.matData.T)
+        # moves the translation into the bottom row
+        return Mat4.wrap(np.ascontiguousarray(self.matData.T))
 
     def _set_open_gl_uniform(self, loc):
-        gl.glUniformMatrix4fv(loc, 1, gl.GL_TRUE, self.getData())
+        gl.glUniformMatrix4fv(loc, 1, gl.GL_TRUE, self.matData)
 
     def __str__(self):
-        return str(self.matData.A)
+        return str(self.matData)
 
 
 class Mat3:
-    matData = None
+    """3x3 counterpart of Mat4, e.g. for normal transforms."""
 
-    # Construct a Mat4 from a python array
-    def __init__(self, p=[[1, 0, 0], [0, 1, 0], [0, 0, 1]]):
-        if isinstance(p, Mat4):
-            self.matData = p.matData[:3, :3]
+    __slots__ = ("matData", "kind")
+
+    matData: np.ndarray
+    kind: int
+
+    # Construct a Mat3 from a python array or the upper left of a Mat4
+    def __init__(self, p=None, kind: int = GENERAL):
+        if p is None:
+            self.matData = IDENTITY3.copy()
+            self.kind = RIGID
+        elif isinstance(p, Mat4):
+            self.matData = p.matData[:3, :3].copy()
+            self.kind = p.kind
         else:
-            self.matData = np.matrix(p)
+            self.matData = np.array(p, dtype=np.float32).reshape(3, 3)
+            self.kind = kind
+
+    @classmethod
+    def wrap(cls, data: np.ndarray, kind: int = GENERAL) -> "Mat3":
+        """Take ownership of a contiguous float32 (3, 3) array."""
+        mat = object.__new__(cls)
+        mat.matData = data
+        mat.kind = kind
+        return mat
 
     # overload the multiplication operator to enable sane looking
     # transformation expressions!
@@ -80,33 +148,90 @@ class Mat3:
         # for transforming a vector). Could be made more robust...
         if isinstance(other, (np.ndarray, list)):
             return list(self.matData.dot(other).flat)
-        # Otherwise we assume it is another Mat3 or something compatible, and
-        # just multiply the matrices
-        # and return the result as a new Mat3
-        return Mat3(self.matData.dot(other.matData))
-
-    # Helper to get data as a contiguous array for upload to OpenGL
+        # Otherwise we assume it is another Mat3 and return the product as a
+        # new Mat3
+        return Mat3.wrap(
+            np.matmul(self.matData, other.matData), max(self.kind, other.kind)
+        )
+
+    def __imul__(self, other):
+        np.matmul(self.matData, other.matData, out=self.matData)
+        self.kind = max(self.kind, other.kind)
+        return self
+
+    # The data uploaded to OpenGL, not a copy
     def getData(self):
-        return np.ascontiguousarray(self.matData, dtype=np.float32)
+        return self.matData
 
     # note: returns an inverted copy, does not change the object (for clarity
     #       use the global function instead)
     #       only implemented as a member to make it easy to overload based on
     #       matrix class (i.e. 3x3 or 4x4)
     def _inverse(self):
-        return Mat3(np.linalg.inv(self.matData))
+        if self.kind > UNIFORM:
+            return Mat3.wrap(np.linalg.inv(self.matData), self.kind)
+        # (s R)^-1 = R^T / s, s is 1 for rigid transforms
+        data = np.ascontiguousarray(self.matData.T)
+        if self.kind == UNIFORM:
+            data /= squared_scale(self.matData)
+        return Mat3.wrap(data, self.kind)
 
     def _transpose(self):
-        return Mat3(self.matData.T)
+        return Mat3.wrap(np.ascontiguousarray(self.matData.T), self.kind)
 
     def _set_open_gl_uniform(self, loc):
-        gl.glUniformMatrix3fv(loc, 1, gl.GL_TRUE, self.getData())
+        gl.glUniformMatrix3fv(loc, 1, gl.GL_TRUE, self.matData)
 
     def __str__(self):
-        return str(self.matData.A)
+        return str(self.matData)
+
+
+Mat = Union[Mat4, Mat3]
+
+
+def squared_scale(linear: np.ndarray) -> float:
+    """Square of the scale of a uniformly scaled rotation, the squared
+    length of any of its columns."""
+    return linear[0, 0] ** 2 + linear[1, 0] ** 2 + linear[2, 0] ** 2
+
+
+def multiply(a: Mat, b: Mat, out: Mat = None) -> Mat:
+    """a * b, written into out when given, which may be a or b."""
+    if out is None:
+        return a * b
+    np.matmul(a.matData, b.matData, out=out.matData)
+    out.kind = max(a.kind, b.kind)
+    return out
+
+
+def identity(out: Mat4 = None) -> Mat4:
+    if out is None:
+        return Mat4()
+    np.copyto(out.matData, IDENTITY4)
+    out.kind = RIGID
+    return out
 
 
-def mat_to_vec(m: Union[Mat4, Mat3]):
+def normal_matrix(m: Mat4, out: Mat3 = None) -> Mat3:
+    """
+    inverse(transpose(Mat3(m))), the transform of normals under m. It is
+    the upper left of m itself when m is rigid and that scaled by the
+    inverse squared scale when m is uniformly scaled.
+    """
+    if out is None:
+        out = Mat3.wrap(np.empty((3, 3), dtype=np.float32))
+    linear = m.matData[:3, :3]
+    if m.kind == RIGID:
+        out.matData[:] = linear
+    elif m.kind == UNIFORM:
+        np.divide(linear, squared_scale(linear), out=out.matData)
+    else:
+        out.matData[:] = np.linalg.inv(linear).T
+    out.kind = m.kind
+    return out
+
+
+def mat_to_vec(m: Mat):
     if isinstance(m, (Mat3, Mat4)):
         data = m.getData()
         return [data[0][-1], data[1][-1], data[2][-1]]
@@ -149,45 +274,58 @@ def dot(a, b):
     return np.dot(a, b)
 
 
-def make_translation(x, y, z):
-    return Mat4([[1, 0, 0, x], [0, 1, 0, y], [0, 0, 1, z], [0, 0, 0, 1]])
-
-
-def make_scale(x, y, z):
-    return Mat4([[x, 0, 0, 0], [0, y, 0, 0], [0, 0, z, 0], [0, 0, 0, 1]])
-
-
-def make_rotation_y(angle):
-    return Mat4(
-        [
-            [math.cos(angle), 0, -math.sin(angle), 0],
-            [0, 1, 0, 0],
-            [math.sin(angle), 0, math.cos(angle), 0],
-            [0, 0, 0, 1],
-        ]
-    )
-
-
-def make_rotation_x(angle):
-    return Mat4(
-        [
-            [1, 0, 0, 0],
-            [0, math.cos(angle), -math.sin(angle), 0],
-            [0, math.sin(angle), math.cos(angle), 0],
-            [0, 0, 0, 1],
-        ]
-    )
-
-
-def make_rotation_z(angle):
-    return Mat4(
-        [
-            [math.cos(angle), -math.sin(angle), 0, 0],
-            [math.sin(angle), math.cos(angle), 0, 0],
-            [0, 0, 1, 0],
-            [0, 0, 0, 1],
-        ]
-    )
+def make_translation(x, y, z, out: Mat4 = None) -> Mat4:
+    m = identity(out)
+    m.matData[:3, 3] = (x, y, z)
+    return m
+
+
+def make_scale(x, y, z, out: Mat4 = None) -> Mat4:
+    m = identity(out)
+    data = m.matData
+    data[0, 0] = x
+    data[1, 1] = y
+    data[2, 2] = z
+    # a zero scale can not be inverted in closed form, np.linalg.inv of
+    # the affine path raises for it instead
+    m.kind = UNIFORM if x == y == z != 0 else AFFINE
+    return m
+
+
+def make_rotation_y(angle, out: Mat4 = None) -> Mat4:
+    m = identity(out)
+    data = m.matData
+    c = math.cos(angle)
+    s = math.sin(angle)
+    data[0, 0] = c
+    data[0, 2] = -s
+    data[2, 0] = s
+    data[2, 2] = c
+    return m
+
+
+def make_rotation_x(angle, out: Mat4 = None) -> Mat4:
+    m = identity(out)
+    data = m.matData
+    c = math.cos(angle)
+    s = math.sin(angle)
+    data[1, 1] = c
+    data[1, 2] = -s
+    data[2, 1] = s
+    data[2, 2] = c
+    return m
+
+
+def make_rotation_z(angle, out: Mat4 = None) -> Mat4:
+    m = identity(out)
+    data = m.matData
+    c = math.cos(angle)
+    s = math.sin(angle)
+    data[0, 0] = c
+    data[0, 1] = -s
+    data[1, 0] = s
+    data[1, 1] = c
+    return m
 
 
 def make_look_from(eye, direction, up):
@@ -195,10 +333,11 @@ def make_look_from(eye, direction, up):
     U = np.array(up[:3])
     s = normalize(np.cross(f, U))
     u = np.cross(s, f)
-    M = np.matrix(np.identity(4))
-    M[:3, :3] = np.vstack([s, u, -f])
+    # s, u and f are orthonormal, M stays rigid
+    M = Mat4()
+    M.matData[:3, :3] = np.vstack([s, u, -f])
     T = make_translation(-eye[0], -eye[1], -eye[2])
-    return Mat4(M) * T
+    return M * T
 
 
 # make_lookAt defines a view transform, i.e., from world to view space, using intuitive parameters. location of camera, point to aim, and rough up direction.
@@ -222,6 +361,47 @@ def make_perspective(yFovDeg, aspect, n, f):
     return Mat4([[sx, 0, 0, 0], [0, sy, 0, 0], [0, 0, zz, zw], [0, 0, -1, 0]])
 
 
+def frustum_planes(world_to_clip: Mat4) -> np.ndarray:
+    """
+    Left, right, bottom, top, near and far plane of the frustum of
+    world_to_clip, as (6, 4) rows (a, b, c, d) with unit normals pointing
+    inwards, so (a, b, c) . p + d is the distance of p inside each.
+    """
+    m = world_to_clip.matData
+    planes = np.empty((6, 4), dtype=np.float32)
+    planes[0::2] = m[3] + m[:3]
+    planes[1::2] = m[3] - m[:3]
+    planes /= np.linalg.norm(planes[:, :3], axis=1)[:, None]
+    return planes
+
+
+def classify_spheres(
+    planes: np.ndarray, centers: np.ndarray, radii: np.ndarray
+) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Masks of the spheres, (N, 3) centers and (N,) radii, not entirely
+    outside of one of the frustum_planes, and of those crossing a plane.
+    """
+    distances = centers @ planes[:, :3].T + planes[:, 3]
+    visible = (distances >= -radii[:, None]).all(axis=1)
+    crossing = visible & (distances < radii[:, None]).any(axis=1)
+    return visible, crossing
+
+
+def boxes_in_frustum(
+    planes: np.ndarray, centers: np.ndarray, extents: np.ndarray
+) -> np.ndarray:
+    """
+    Mask of the axis aligned boxes, (N, 3) centers and half extents, not
+    entirely outside of one of the planes. These need not be normalized,
+    e.g. frustum_planes moved to model space by multiplying them with the
+    model to world transform.
+    """
+    distances = centers @ planes[:, :3].T + planes[:, 3]
+    radii = extents @ np.abs(planes[:, :3]).T
+    return (distances >= -radii).all(axis=1)
+
+
 def clamp(
     value: float,
     limit_max: float = 0.0,
@@ -0,0 +1,250 @@
+from collections import deque
+from typing import List, Tuple
+
+import numpy as np
+
+# post-transform cache size assumed when ordering triangles, close to what
+# current GPUs effectively provide for small vertex outputs
+VERTEX_CACHE_SIZE = 24
+
+
+def weld(
+    *streams: np.ndarray,
+) -> Tuple[List[np.ndarray], np.ndarray]:
+    """
+    Merge bitwise identical vertices of de-indexed float32 streams.
+
+    returns:
+        unique streams, in order of first use
+        uint32 indices into the unique streams, one per input vertex
+    """
+    packed = np.ascontiguousarray(
+        np.concatenate(
+            [np.asarray(s, dtype=np.float32) for s in streams], axis=1
+        )
+    )
+    rows = packed.view(
+        np.dtype((np.void, packed.dtype.itemsize * packed.shape[1]))
+    )
+    _, first, inverse = np.unique(
+        rows.reshape(-1), return_index=True, return_inverse=True
+    )
+    # np.unique sorts by value, renumber by first occurrence instead
+    order = np.argsort(first, kind="stable")
+    rank = np.empty_like(order)
+    rank[order] = np.arange(len(order))
+
+    indices = rank[inverse.reshape(-1)].astype(np.uint32)
+    unique = [np.asarray(s, dtype=np.float32)[first[order]] for s in streams]
+    return unique, indices
+
+
+def _adjacency(triangles: np.ndarray, num_verts: int):
+    """Triangles using each vertex in CSR form (offsets, triangle ids)."""
+    corners = triangles.reshape(-1)
+    order = np.argsort(corners, kind="stable")
+    counts = np.bincount(corners, minlength=num_verts)
+    offsets = np.zeros(num_verts + 1, dtype=np.int64)
+    np.cumsum(counts, out=offsets[1:])
+    return offsets, order // 3, counts
+
+
+def tipsify(triangles: np.ndarray, cache_size: int = VERTEX_CACHE_SIZE):
+    """
+    Reorder triangles for post-transform vertex cache locality.
+
+    Implements Tipsify (Sander, Nehab, Barczak 2007): fan out around a
+    vertex, then continue with the recently used vertex that still has
+    triangles left and will not have been evicted from the cache.
+
+    args:
+        triangles: (n, 3) vertex indices, 0 based and dense
+    returns:
+        (n, 3) reordered triangles
+    """
+    num_tris = len(triangles)
+    if num_tris == 0:
+        return triangles
+
+    num_verts = int(triangles.max()) + 1
+    offsets, adjacent, live = _adjacency(triangles, num_verts)
+    offsets = offsets.tolist()
+    adjacent = adjacent.tolist()
+    live = live.tolist()
+    tris = triangles.tolist()
+
+    emitted = [False] * num_tris
+    cache_time = [0] * num_verts
+    dead_end = []
+    output = []
+
+    time = cache_size + 1
+    cursor = 0
+    fanning = tris[0][0]
+
+    while fanning >= 0:
+        candidates = []
+        for t in adjacent[offsets[fanning] : offsets[fanning + 1]]:
+            if emitted[t]:
+                continue
+            emitted[t] = True
+            tri = tris[t]
+            output.append(tri)
+            for v in tri:
+                dead_end.append(v)
+                candidates.append(v)
+                live[v] -= 1
+                if time - cache_time[v] > cache_size:
+                    cache_time[v] = time
+                    time += 1
+
+        # best candidate: the oldest vertex that stays in the cache while
+        # its remaining triangles are emitted
+        fanning = -1
+        best = -1
+        for v in candidates:
+            if live[v] > 0:
+                priority = 0
+                if time - cache_time[v] + 2 * live[v] <= cache_size:
+                    priority = time - cache_time[v]
+                if priority > best:
+                    best = priority
+                    fanning = v
+
+        if fanning == -1:
+            # dead end, backtrack through recently used vertices first
+            while dead_end:
+                v = dead_end.pop()
+                if live[v] > 0:
+                    fanning = v
+                    break
+            else:
+                while cursor < num_verts:
+                    if live[cursor] > 0:
+                        fanning = cursor
+                        break
+                    cursor += 1
+
+    return np.array(output, dtype=triangles.dtype).reshape(-1, 3)
+
+
+def optimize_vertex_cache(
+    indices: np.ndarray,
+    ranges: List[Tuple[int, int]],
+    cache_size: int = VERTEX_CACHE_SIZE,
+) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Reorder triangles inside each (offset, count) index range, leaving the
+    ranges themselves untouched, then renumber vertices by first use so
+    vertex fetches are mostly sequential as well.
+
+    returns:
+        new indices
+        remap, such that new_vertices = old_vertices[remap]
+    """
+    result = indices.copy()
+    for offset, count in ranges:
+        if count == 0:
+            continue
+        chunk = indices[offset : offset + count]
+        local_verts, local = np.unique(chunk, return_inverse=True)
+        ordered = tipsify(local.reshape(-1, 3), cache_size)
+        result[offset : offset + count] = local_verts[ordered.reshape(-1)]
+
+    # renumber by first occurrence
+    used, first = np.unique(result, return_index=True)
+    remap = used[np.argsort(first, kind="stable")]
+    lookup = np.empty(len(indices) and int(indices.max()) + 1, np.uint32)
+    lookup[remap] = np.arange(len(remap), dtype=np.uint32)
+    return lookup[result], remap
+
+
+def simulate_vertex_cache(
+    indices: np.ndarray, cache_size: int = VERTEX_CACHE_SIZE
+) -> int:
+    """Number of vertex shader invocations with a FIFO post-transform
+    cache, as used by most GPUs."""
+    cache = deque()
+    cached = set()
+    misses = 0
+    for v in indices.tolist():
+        if v in cached:
+            continue
+        misses += 1
+        cache.append(v)
+        cached.add(v)
+        if len(cache) > cache_size:
+            cached.discard(cache.popleft())
+    return misses
+
+
+def _scatter_add(indices: np.ndarray, values: np.ndarray, count: int):
+    """Sum (n, 3) values per index, np.add.at equivalent but faster."""
+    return np.stack(
+        [
+            np.bincount(indices, weights=values[:, k], minlength=count)
+            for k in range(values.shape[1])
+        ],
+        axis=1,
+    )
+
+
+def compute_tangents(
+    positions: np.ndarray,
+    normals: np.ndarray,
+    uvs: np.ndarray,
+    triangles: np.ndarray,
+) -> np.ndarray:
+    """
+    Per-vertex tangent frames (Lengyel's method) accumulated over the given
+    (n, 3) triangles, orthonormalized against the vertex normals.
+
+    returns:
+        (num_verts, 4) float32 tangents, w is the bitangent sign such that
+        bitangent = cross(normal, tangent.xyz) * w. Vertices not used by
+        any triangle keep the old placeholder frame.
+    """
+    num_verts = len(positions)
+    tangents = np.zeros((num_verts, 4), dtype=np.float32)
+    tangents[:] = [0.0, 1.0, 0.0, 1.0]
+    if len(triangles) == 0:
+        return tangents
+
+    p0, p1, p2 = (
+        positions[triangles[:, k]].astype(np.float64) for k in range(3)
+    )
+    t0, t1, t2 = (uvs[triangles[:, k]].astype(np.float64) for k in range(3))
+    e1, e2 = p1 - p0, p2 - p0
+    d1, d2 = t1 - t0, t2 - t0
+
+    det = d1[:, 0] * d2[:, 1] - d2[:, 0] * d1[:, 1]
+    r = np.divide(1.0, det, out=np.zeros_like(det), where=np.abs(det) > 1e-12)
+    sdir = (e1 * d2[:, 1:2] - e2 * d1[:, 1:2]) * r[:, None]
+    tdir = (e2 * d1[:, 0:1] - e1 * d2[:, 0:1]) * r[:, None]
+
+    corners = triangles.reshape(-1)
+    tan = _scatter_add(corners, np.repeat(sdir, 3, axis=0), num_verts)
+    bitan = _scatter_add(corners, np.repeat(tdir, 3, axis=0), num_verts)
+
+    n = normals.astype(np.float64)
+    t = tan - n * np.einsum("ij,ij->i", n, tan)[:, None]
+    length = np.linalg.norm(t, axis=1)
+
+    # degenerate uv mapping, pick any direction perpendicular to the normal
+    degenerate = length < 1e-12
+    if np.any(degenerate):
+        nd = n[degenerate]
+        axis = np.where(
+            (np.abs(nd[:, 0]) < 0.9)[:, None], [1.0, 0.0, 0.0], [0.0, 1.0, 0.0]
+        )
+        t[degenerate] = np.cross(nd, axis)
+        length[degenerate] = np.linalg.norm(t[degenerate], axis=1)
+
+    t /= np.maximum(length, 1e-12)[:, None]
+    w = np.where(np.einsum("ij,ij->i", np.cross(n, t), bitan) < 0.0, -1.0, 1.0)
+
+    used = np.zeros(num_verts, dtype=bool)
+    used[corners] = True
+    tangents[used, :3] = t[used]
+    tangents[used, 3] = w[used]
+    return tangents
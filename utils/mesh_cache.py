@@ -0,0 +1,203 @@
+import glob
+import hashlib
+import json
+import os
+import re
+import struct
+
+import numpy as np
+
+import constants
+from utils.log import get_logger
+from utils.obj import Mesh, build_lods, load_obj, read_blocks
+
+logger = get_logger()
+
+# bump whenever the layout of a cache file or the parser output changes
+CACHE_VERSION = 6
+
+MAGIC = b"NDMESH\0\0"
+HEADER = struct.Struct("<8sQ")
+ALIGNMENT = 16
+
+# tangents are optional and only stored when present
+MESH_ARRAYS = ["positions", "normals", "uvs", "indices", "tangents"]
+
+MTLLIB_PATTERN = re.compile(rb"^mtllib[ \t]+(.+?)[ \t]*\r?$", re.MULTILINE)
+
+
+def content_key(in_file, base_path: str) -> str:
+    """Hash of the .obj contents, read block by block from a binary file,
+    and every material library it names."""
+    digest = hashlib.sha1()
+    digest.update(b"%d\0" % CACHE_VERSION)
+
+    mtl_names = []
+    for block in read_blocks(in_file):
+        digest.update(block)
+        for match in MTLLIB_PATTERN.finditer(block):
+            mtl_names.append(b" ".join(match.group(1).split()).decode("utf8"))
+
+    for mtl_name in mtl_names:
+        digest.update(b"\0" + mtl_name.encode("utf8") + b"\0")
+        try:
+            with open(os.path.join(base_path, mtl_name), "rb") as mtl_file:
+                digest.update(mtl_file.read())
+        except OSError:
+            digest.update(b"missing")
+
+    return digest.hexdigest()
+
+
+def cache_prefix(filename: str) -> str:
+    # models with the same name in different directories must not evict
+    # each other's entries
+    path_digest = hashlib.sha1(os.path.abspath(filename).encode("utf8"))
+    return f"{os.path.basename(filename)}-{path_digest.hexdigest()[:8]}"
+
+
+def cache_filename(filename: str, key: str) -> str:
+    return os.path.join(
+        constants.MESH_CACHE_DIR, f"{cache_prefix(filename)}-{key}.mesh"
+    )
+
+
+def _align(offset: int) -> int:
+    return (offset + ALIGNMENT - 1) // ALIGNMENT * ALIGNMENT
+
+
+def write_mesh(path: str, mesh: Mesh):
+    """
+    layout:
+        magic, header length
+        json header (chunks, materials, lods, whether lods were built,
+            array dtype/shape/offset)
+        raw array data, each array aligned to 16 bytes
+    """
+    arrays = {
+        name: getattr(mesh, name)
+        for name in MESH_ARRAYS
+        if getattr(mesh, name) is not None
+    }
+
+    descriptors = {}
+    offset = 0
+    for name, array in arrays.items():
+        descriptors[name] = {
+            "dtype": array.dtype.str,
+            "shape": list(array.shape),
+            "offset": offset,
+        }
+        offset = _align(offset + array.nbytes)
+
+    header = json.dumps(
+        {
+            "arrays": descriptors,
+            "chunks": mesh.chunks,
+            "materials": mesh.materials,
+            "lods": mesh.lods,
+            "simplified": mesh.simplified,
+        }
+    ).encode("utf8")
+    data_start = _align(HEADER.size + len(header))
+
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    temp_path = f"{path}.{os.getpid()}.tmp"
+    with open(temp_path, "wb") as out_file:
+        out_file.write(HEADER.pack(MAGIC, len(header)))
+        out_file.write(header)
+        for name, array in arrays.items():
+            out_file.seek(data_start + descriptors[name]["offset"])
+            out_file.write(np.ascontiguousarray(array).tobytes())
+    os.replace(temp_path, path)
+
+
+def read_mesh(path: str) -> Mesh:
+    """Memory map a cache file written by write_mesh."""
+    with open(path, "rb") as in_file:
+        magic, header_length = HEADER.unpack(in_file.read(HEADER.size))
+        if magic != MAGIC:
+            raise ValueError(f"not a mesh cache file: '{path}'")
+        header = json.loads(in_file.read(header_length).decode("utf8"))
+    data_start = _align(HEADER.size + header_length)
+
+    data = np.memmap(path, dtype=np.uint8, mode="r")
+    arrays = {}
+    for name, descriptor in header["arrays"].items():
+        dtype = np.dtype(descriptor["dtype"])
+        shape = tuple(descriptor["shape"])
+        start = data_start + descriptor["offset"]
+        end = start + dtype.itemsize * int(np.prod(shape))
+        arrays[name] = data[start:end].view(dtype).reshape(shape)
+
+    return Mesh(
+        positions=arrays["positions"],
+        normals=arrays["normals"],
+        uvs=arrays["uvs"],
+        indices=arrays["indices"],
+        chunks=[tuple(chunk) for chunk in header["chunks"]],
+        materials=header["materials"],
+        tangents=arrays.get("tangents"),
+        lods=[
+            (error, [tuple(chunk) for chunk in chunks])
+            for error, chunks in header["lods"]
+        ],
+        simplified=header["simplified"],
+    )
+
+
+def remove_stale(filename: str, keep: str):
+    pattern = os.path.join(
+        constants.MESH_CACHE_DIR,
+        f"{glob.escape(cache_prefix(filename))}-*.mesh",
+    )
+    for path in glob.glob(pattern):
+        if path != keep:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+
+def cache_path(filename: str) -> str:
+    base_path, _ = os.path.split(filename)
+    with open(filename, "rb") as in_file:
+        return cache_filename(filename, content_key(in_file, base_path))
+
+
+def store_mesh(filename: str, path: str, mesh: Mesh):
+    try:
+        write_mesh(path, mesh)
+        remove_stale(filename, keep=path)
+    except OSError as e:
+        logger.warning(f"failed to write mesh cache '{path}': {e}")
+
+
+def load_mesh(filename: str) -> Mesh:
+    """Load an .obj file through the on-disk mesh cache, parsing it only
+    if the .obj or one of its material libraries changed."""
+    if constants.DISABLE_MESH_CACHE:
+        return load_obj(filename, constants.OBJ_PARSE_WORKERS)
+
+    path = cache_path(filename)
+    if os.path.exists(path):
+        try:
+            mesh = read_mesh(path)
+            logger.debug(f"loaded cached mesh: {filename}")
+            return mesh
+        except (OSError, ValueError, KeyError) as e:
+            logger.warning(f"ignoring unreadable mesh cache '{path}': {e}")
+
+    mesh = load_obj(filename, constants.OBJ_PARSE_WORKERS)
+    store_mesh(filename, path, mesh)
+    return mesh
+
+
+def build_cached_lods(filename: str, mesh: Mesh) -> Mesh:
+    """Add LODs to a mesh load_mesh returned without them, and update its
+    cache entry so later loads come with them. Runs in the lod_builder
+    worker."""
+    mesh = build_lods(mesh)
+    if not constants.DISABLE_MESH_CACHE:
+        store_mesh(filename, cache_path(filename), mesh)
+    return mesh
@@ -0,0 +1,734 @@
+import os
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import resource_tracker, shared_memory
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from utils.mesh import compute_tangents, optimize_vertex_cache, weld
+from utils.simplify import generate_lods
+
+# (material name, first vertex, vertex count)
+ChunkRange = Tuple[str, int, int]
+
+
+class ObjData:
+    """Raw, still indexed contents of an .obj file."""
+
+    positions: np.ndarray
+    normals: np.ndarray
+    uvs: np.ndarray
+    # (num_corners, 3) position/uv/normal indices, -1 where missing
+    corners: np.ndarray
+    # number of polygon corners for every "f" record
+    face_sizes: np.ndarray
+    # (material name, number of "f" records) in file order
+    material_chunks: List[Tuple[str, int]]
+    material_libs: List[str]
+
+    def __init__(
+        self,
+        positions,
+        normals,
+        uvs,
+        corners,
+        face_sizes,
+        material_chunks,
+        material_libs,
+    ):
+        self.positions = positions
+        self.normals = normals
+        self.uvs = uvs
+        self.corners = corners
+        self.face_sizes = face_sizes
+        self.material_chunks = material_chunks
+        self.material_libs = material_libs
+
+
+def parse_floats(rows: List[str], width: int) -> np.ndarray:
+    """Convert a list of whitespace separated records into a (n, width)
+    float64 array in one go, ignoring any trailing components."""
+    if len(rows) == 0:
+        return np.zeros((0, width), dtype=np.float64)
+
+    values = " ".join(rows).split()
+    columns = len(rows[0].split())
+    if columns >= width and len(values) == len(rows) * columns:
+        data = np.array(values, dtype=np.float64).reshape(-1, columns)
+        return data[:, :width]
+
+    # ragged records (e.g. optional w components on some lines only)
+    data = []
+    for row in rows:
+        tokens = row.split()
+        assert len(tokens) >= width
+        data.append(tokens[:width])
+    return np.array(data, dtype=np.float64)
+
+
+def parse_faces(rows: List[str]) -> Tuple[np.ndarray, np.ndarray]:
+    """Convert "p/t/n p/t/n ..." records into a (n, 3) array of zero based
+    corner indices (-1 where a field is empty) and the size of each face."""
+    if len(rows) == 0:
+        return np.zeros((0, 3), dtype=np.int64), np.zeros(0, dtype=np.int64)
+
+    # every corner carries exactly two separators
+    face_sizes = np.array([row.count("/") for row in rows]) // 2
+    assert np.all(face_sizes >= 3)
+
+    text = " ".join(rows).replace("//", "/0/").replace("/", " ")
+    # integer parsing is considerably faster through fromstring than
+    # through a list of python strings
+    fields = np.fromstring(text, dtype=np.int64, sep=" ")
+    assert len(fields) == 3 * face_sizes.sum()
+
+    return fields.reshape(-1, 3) - 1, face_sizes
+
+
+def _records(lines, keyword: str) -> List[str]:
+    prefixes = (keyword + " ", keyword + "\t")
+    skip = len(keyword) + 1
+    return [line[skip:] for line in lines if line.startswith(prefixes)]
+
+
+# bytes read at a time when streaming an .obj file, large enough for the
+# bulk conversions to dominate and small enough to keep peak memory low
+BLOCK_SIZE = 1 << 18
+
+
+class GrowableArray:
+    """(n, width) array with amortized O(1) appends of whole row blocks."""
+
+    data: np.ndarray
+    size: int = 0
+
+    def __init__(self, dtype, width: int, capacity: int = 0):
+        self.data = np.empty((capacity, width), dtype=dtype)
+
+    def extend(self, rows: np.ndarray) -> None:
+        end = self.size + len(rows)
+        if end > len(self.data):
+            # grow by 1.5x rather than 2x, the old and new buffers are both
+            # alive while copying
+            grown = np.empty(
+                (max(end, len(self.data) * 3 // 2), self.data.shape[1]),
+                dtype=self.data.dtype,
+            )
+            grown[: self.size] = self.data[: self.size]
+            self.data = grown
+        self.data[self.size : end] = rows
+        self.size = end
+
+    def finish(self) -> np.ndarray:
+        """Trim the unused capacity and return the rows."""
+        if self.size != len(self.data):
+            self.data = self.data[: self.size].copy()
+        return self.data
+
+
+class ObjBuilder:
+    """Accumulates ObjData from consecutive blocks of whole lines, so an
+    .obj file never has to be held in memory as a list of strings."""
+
+    def __init__(self):
+        # vertex data is stored as float32 straight away, that is all
+        # deindex ever outputs
+        self.positions = GrowableArray(np.float32, 3)
+        self.normals = GrowableArray(np.float32, 3)
+        self.uvs = GrowableArray(np.float32, 2)
+        self.corners = GrowableArray(np.int32, 3)
+        self.face_sizes = GrowableArray(np.int32, 1)
+        self.material_chunks = []
+        self.material_libs = []
+
+    def add_lines(self, lines) -> None:
+        """Split the lines into their record types with one list
+        comprehension each and convert every record type in bulk."""
+        face_lines = [
+            i for i, line in enumerate(lines) if line.startswith(("f ", "f\t"))
+        ]
+        face_rows = [lines[i][2:] for i in face_lines]
+
+        # usemtl/mtllib are rare, so these can be handled one by one
+        chunk_lines = []
+        chunk_names = []
+        last_name = (
+            self.material_chunks[-1][0] if self.material_chunks else None
+        )
+        for i, line in enumerate(lines):
+            if line.startswith(("usemtl", "mtllib")):
+                tokens = line.split()
+                assert len(tokens) >= 2
+                name = " ".join(tokens[1:])
+                if tokens[0] == "mtllib":
+                    self.material_libs.append(name)
+                elif tokens[0] == "usemtl" and name != last_name:
+                    chunk_lines.append(i)
+                    chunk_names.append(name)
+                    last_name = name
+
+        # every face belongs to the last usemtl before it, which may have
+        # been in an earlier block
+        chunk_starts = np.searchsorted(face_lines, chunk_lines)
+        chunk_ends = np.append(chunk_starts[1:], len(face_lines))
+        leading = int(chunk_starts[0]) if chunk_lines else len(face_lines)
+        if leading:
+            assert self.material_chunks, "face defined before any usemtl"
+            self.material_chunks[-1][1] += leading
+        for name, start, end in zip(chunk_names, chunk_starts, chunk_ends):
+            self.material_chunks.append([name, int(end - start)])
+
+        corners, face_sizes = parse_faces(face_rows)
+        self.corners.extend(corners)
+        self.face_sizes.extend(face_sizes[:, None])
+        self.positions.extend(parse_floats(_records(lines, "v"), 3))
+        self.normals.extend(parse_floats(_records(lines, "vn"), 3))
+        self.uvs.extend(parse_floats(_records(lines, "vt"), 2))
+
+    def finish(self) -> ObjData:
+        return ObjData(
+            positions=self.positions.finish(),
+            normals=self.normals.finish(),
+            uvs=self.uvs.finish(),
+            corners=self.corners.finish(),
+            face_sizes=self.face_sizes.finish().reshape(-1),
+            material_chunks=[tuple(chunk) for chunk in self.material_chunks],
+            material_libs=self.material_libs,
+        )
+
+
+def parse_obj(lines) -> ObjData:
+    builder = ObjBuilder()
+    builder.add_lines(lines)
+    return builder.finish()
+
+
+def read_blocks(
+    in_file, block_size: int = BLOCK_SIZE, length: Optional[int] = None
+):
+    """Yield roughly block_size bytes at a time from a binary file, always
+    ending on a line break so no record is split between blocks. Stops
+    after length bytes if given."""
+    tail = b""
+    while True:
+        if length is not None:
+            data = in_file.read(min(block_size, length))
+            length -= len(data)
+        else:
+            data = in_file.read(block_size)
+        if not data:
+            if tail:
+                yield tail
+            return
+
+        data = tail + data
+        end = data.rfind(b"\n") + 1
+        tail = data[end:]
+        if end:
+            yield data[:end]
+
+
+def parse_obj_stream(in_file, block_size: int = BLOCK_SIZE) -> ObjData:
+    """Like parse_obj, but reads a binary file block by block, peak memory
+    stays close to the size of the parsed arrays."""
+    builder = ObjBuilder()
+    for block in read_blocks(in_file, block_size):
+        builder.add_lines(block.decode("utf8").splitlines())
+    return builder.finish()
+
+
+# files below this size are always parsed serially, starting the worker
+# processes costs more than they save
+PARALLEL_MIN_SIZE = 16 << 20
+
+
+def split_lines(filename: str, parts: int) -> List[Tuple[int, int]]:
+    """Split a file into about equally sized (start, end) byte ranges that
+    all begin at the start of a line."""
+    size = os.path.getsize(filename)
+    starts = [0]
+    with open(filename, "rb") as in_file:
+        for i in range(1, parts):
+            in_file.seek(max(size * i // parts - 1, starts[-1]))
+            in_file.readline()
+            if in_file.tell() < size:
+                starts.append(in_file.tell())
+    starts = sorted(set(starts))
+    return list(zip(starts, starts[1:] + [size]))
+
+
+OBJ_ARRAYS = ["positions", "normals", "uvs", "corners", "face_sizes"]
+
+
+def _parse_range(filename: str, start: int, end: int):
+    """
+    Worker side of parse_obj_parallel: parse one byte range and return its
+    arrays through a shared memory block instead of pickling them.
+
+    returns:
+        shared memory name
+        (field, dtype, shape, offset) of every array
+        material chunks, the first one named None if the range starts with
+        faces belonging to a usemtl from an earlier range
+        material libraries
+    """
+    builder = ObjBuilder()
+    if start > 0:
+        builder.material_chunks.append([None, 0])
+    with open(filename, "rb") as in_file:
+        in_file.seek(start)
+        for block in read_blocks(in_file, length=end - start):
+            builder.add_lines(block.decode("utf8").splitlines())
+    obj_data = builder.finish()
+
+    layout = []
+    offset = 0
+    for field in OBJ_ARRAYS:
+        array = getattr(obj_data, field)
+        layout.append((field, array.dtype.str, array.shape, offset))
+        offset += array.nbytes
+
+    block = shared_memory.SharedMemory(create=True, size=max(offset, 1))
+    for field, dtype, shape, offset in layout:
+        array = getattr(obj_data, field)
+        np.ndarray(shape, dtype, block.buf, offset)[...] = array
+    block.close()
+
+    return (
+        block.name,
+        layout,
+        obj_data.material_chunks,
+        obj_data.material_libs,
+    )
+
+
+def parse_obj_parallel(filename: str, workers: int) -> ObjData:
+    """
+    Parse line aligned ranges of an .obj file in worker processes and
+    stitch the results back together, giving exactly what parse_obj_stream
+    gives.
+
+    .obj face indices are absolute, so corners are kept as they are; only
+    the rows of every range are placed after those of the previous ones,
+    and material chunks cut by a range boundary are merged again.
+    """
+    ranges = split_lines(filename, workers)
+    # workers must share the tracker of this process, otherwise each of them
+    # would clean up the blocks it created as leaked when exiting
+    resource_tracker.ensure_running()
+    with ProcessPoolExecutor(workers) as pool:
+        futures = [
+            pool.submit(_parse_range, filename, start, end)
+            for start, end in ranges
+        ]
+
+    # every future is done once the pool shut down, collect the blocks of
+    # all successful ranges first so none is leaked if another one failed
+    blocks = [
+        shared_memory.SharedMemory(future.result()[0])
+        for future in futures
+        if future.exception() is None
+    ]
+    try:
+        results = [future.result() for future in futures]
+        arrays = {
+            field: np.concatenate(
+                [
+                    np.ndarray(shape, dtype, block.buf, offset)
+                    for block, (_, layout, _, _) in zip(blocks, results)
+                    for name, dtype, shape, offset in layout
+                    if name == field
+                ]
+            )
+            for field in OBJ_ARRAYS
+        }
+    finally:
+        for block in blocks:
+            block.close()
+            block.unlink()
+
+    material_chunks = []
+    material_libs = []
+    for _, _, chunks, libs in results:
+        for name, num_faces in chunks:
+            if material_chunks and name in (None, material_chunks[-1][0]):
+                # continues the last chunk of the previous range, matching
+                # how a repeated usemtl is ignored by the serial parser
+                material_chunks[-1][1] += num_faces
+            elif name is not None:
+                material_chunks.append([name, num_faces])
+            else:
+                assert num_faces == 0, "face defined before any usemtl"
+        material_libs += libs
+
+    return ObjData(
+        material_chunks=[tuple(chunk) for chunk in material_chunks],
+        material_libs=material_libs,
+        **arrays,
+    )
+
+
+def triangulate(face_sizes: np.ndarray) -> np.ndarray:
+    """Fan triangulate polygons, returning corner indices for every
+    triangle vertex in the same order as (v0, v1, v2), (v0, v2, v3), ..."""
+    tri_counts = face_sizes - 2
+    num_tris = int(tri_counts.sum())
+
+    face_starts = np.cumsum(face_sizes) - face_sizes
+    tri_face = np.repeat(np.arange(len(face_sizes)), tri_counts)
+    tri_starts = np.cumsum(tri_counts) - tri_counts
+    fan = np.arange(num_tris) - tri_starts[tri_face] + 1
+
+    base = face_starts[tri_face]
+    return np.stack([base, base + fan, base + fan + 1], axis=1).reshape(-1)
+
+
+def deindex(
+    data: ObjData,
+) -> Tuple[np.ndarray, np.ndarray, np.ndarray, List[ChunkRange]]:
+    """Expand the indexed mesh into flat float32 vertex streams, three
+    vertices per triangle, grouped by material chunk."""
+    corners = data.corners[triangulate(data.face_sizes)]
+
+    # gathers from float32 data already are fresh arrays, avoid a copy
+    positions = data.positions[corners[:, 0]].astype(np.float32, copy=False)
+    normals = data.normals[corners[:, 2]].astype(np.float32, copy=False)
+
+    if len(data.uvs):
+        # -1 picks the last uv, those are cleared afterwards rather than
+        # gathering through a masked copy of the indices
+        uvs = data.uvs[corners[:, 1]].astype(np.float32, copy=False)
+        uvs[corners[:, 1] == -1] = 0.0
+    else:
+        uvs = np.zeros((len(corners), 2), dtype=np.float32)
+
+    # vertex offset of every face, plus the total at the end
+    face_offsets = np.zeros(len(data.face_sizes) + 1, dtype=np.int64)
+    np.cumsum(3 * (data.face_sizes - 2), out=face_offsets[1:])
+
+    chunks = []
+    first_face = 0
+    for name, num_faces in data.material_chunks:
+        start = int(face_offsets[first_face])
+        first_face += num_faces
+        chunks.append((name, start, int(face_offsets[first_face]) - start))
+
+    return positions, normals, uvs, chunks
+
+
+MaterialDescriptor = Dict[str, Any]
+
+
+def default_material() -> MaterialDescriptor:
+    return {
+        "color": {
+            "diffuse": [0.5, 0.5, 0.5],
+            "ambient": [0.5, 0.5, 0.5],
+            "specular": [0.5, 0.5, 0.5],
+            "emissive": [0.0, 0.0, 0.0],
+        },
+        # texture file names relative to the .mtl file, None if unused
+        "texture": {
+            "diffuse": None,
+            "opacity": None,
+            "specular": None,
+            "normal": None,
+        },
+        "alpha": 1.0,
+        "specularExponent": 22.0,
+        "offset": 0,
+    }
+
+
+# keywords are matched lower case, exporters differ in case, e.g. map_Bump
+MTL_COLORS = {
+    "ka": "ambient",
+    "kd": "diffuse",
+    "ks": "specular",
+    "ke": "emissive",
+}
+MTL_TEXTURES = {
+    "map_kd": "diffuse",
+    "map_ks": "specular",
+    "map_bump": "normal",
+    "bump": "normal",
+    "map_d": "opacity",
+}
+# arguments taken by each texture option, -o, -s and -t take up to three
+MTL_TEXTURE_OPTIONS = {
+    "-blendu": 1,
+    "-blendv": 1,
+    "-bm": 1,
+    "-boost": 1,
+    "-cc": 1,
+    "-clamp": 1,
+    "-imfchan": 1,
+    "-mm": 2,
+    "-o": 3,
+    "-s": 3,
+    "-t": 3,
+    "-texres": 1,
+    "-type": 1,
+}
+
+
+def _is_number(token: str) -> bool:
+    try:
+        float(token)
+    except ValueError:
+        return False
+    return True
+
+
+def texture_filename(arguments: List[str]) -> str:
+    """File name of a texture statement, skipping options such as
+    -bm 0.5 in front of it. The last argument is always kept."""
+    index = 0
+    last = len(arguments) - 1
+    while index < last and arguments[index] in MTL_TEXTURE_OPTIONS:
+        count = MTL_TEXTURE_OPTIONS[arguments[index]]
+        index += 1
+        for _ in range(count):
+            # the v and w of -o, -s and -t are optional
+            if index == last or (
+                count == 3 and not _is_number(arguments[index])
+            ):
+                break
+            index += 1
+    return " ".join(arguments[index:])
+
+
+def parse_mtl(lines) -> Dict[str, MaterialDescriptor]:
+    """Parse an .mtl file into plain material descriptors. Textures are
+    only referenced by name so the result can be cached without a GL
+    context."""
+    materials = {}
+    current = None
+    for line in lines:
+        tokens = line.split()
+        if len(tokens) == 0:
+            continue
+
+        keyword = tokens[0].lower()
+        if keyword == "newmtl":
+            assert len(tokens) >= 2
+            current = default_material()
+            materials[" ".join(tokens[1:])] = current
+        elif keyword in MTL_COLORS:
+            assert len(tokens) >= 4
+            current["color"][MTL_COLORS[keyword]] = [
+                float(v) for v in tokens[1:4]
+            ]
+        elif keyword == "ns":
+            current["specularExponent"] = float(tokens[1])
+        elif keyword in MTL_TEXTURES:
+            current["texture"][MTL_TEXTURES[keyword]] = texture_filename(
+                tokens[1:]
+            )
+        elif keyword == "d":
+            current["alpha"] = float(tokens[1])
+
+    return materials
+
+
+class Mesh:
+    """Indexed vertex streams of an .obj file plus everything needed to
+    build its materials, independent of any GL state."""
+
+    positions: np.ndarray
+    normals: np.ndarray
+    uvs: np.ndarray
+    # uint32 triangle list, chunk offsets and counts index into this
+    indices: np.ndarray
+    chunks: List[ChunkRange]
+    materials: Dict[str, MaterialDescriptor]
+    # (n, 4) tangent frames, only present if a material has a normal map
+    tangents: Optional[np.ndarray]
+    # simplified versions, coarsest last, as (error in model units, chunks)
+    # whose ranges follow the full detail ones in indices
+    lods: List[Tuple[float, List[ChunkRange]]]
+    # whether build_lods ran, lods stays empty for meshes too small to
+    # simplify
+    simplified: bool
+
+    def __init__(
+        self,
+        positions,
+        normals,
+        uvs,
+        indices,
+        chunks,
+        materials,
+        tangents,
+        lods=None,
+        simplified=False,
+    ):
+        self.positions = positions
+        self.normals = normals
+        self.uvs = uvs
+        self.indices = indices
+        self.chunks = chunks
+        self.materials = materials
+        self.tangents = tangents
+        self.lods = [] if lods is None else lods
+        self.simplified = simplified
+
+
+def build_mesh(obj_lines, base_path: str) -> Mesh:
+    return mesh_from_obj_data(parse_obj(obj_lines), base_path)
+
+
+def load_obj(filename: str, workers: int = 1) -> Mesh:
+    """Build a mesh from an .obj file without reading all of it at once,
+    large files are parsed by several processes if workers > 1."""
+    base_path = os.path.dirname(filename)
+    if workers > 1 and os.path.getsize(filename) >= PARALLEL_MIN_SIZE:
+        return mesh_from_obj_data(
+            parse_obj_parallel(filename, workers), base_path
+        )
+
+    with open(filename, "rb") as in_file:
+        return mesh_from_obj_data(parse_obj_stream(in_file), base_path)
+
+
+def mesh_from_obj_data(obj_data: ObjData, base_path: str) -> Mesh:
+    materials = {}
+    if obj_data.material_libs:
+        # like most loaders only the last material library is used
+        mtl_filename = os.path.join(base_path, obj_data.material_libs[-1])
+        with open(mtl_filename, "r", encoding="utf8") as in_file:
+            materials = parse_mtl(in_file.readlines())
+
+    positions, normals, uvs, chunks = deindex(obj_data)
+    # the indexed data is not needed anymore, free it before welding
+    del obj_data
+
+    # weld identical vertices, then order triangles (within each chunk, so
+    # material order is kept) for the post-transform cache
+    (positions, normals, uvs), indices = weld(positions, normals, uvs)
+    indices, remap = optimize_vertex_cache(
+        indices, [(offset, count) for _, offset, count in chunks]
+    )
+
+    positions, normals, uvs = positions[remap], normals[remap], uvs[remap]
+
+    # tangent frames are only needed where a normal map is sampled
+    normal_mapped = [
+        indices[offset : offset + count]
+        for name, offset, count in chunks
+        if materials[name]["texture"]["normal"] is not None
+    ]
+    tangents = None
+    if normal_mapped:
+        tangents = compute_tangents(
+            positions,
+            normals,
+            uvs,
+            np.concatenate(normal_mapped).reshape(-1, 3),
+        )
+
+    return Mesh(
+        positions,
+        normals,
+        uvs,
+        indices,
+        chunks,
+        materials,
+        tangents,
+    )
+
+
+def build_lods(mesh: Mesh) -> Mesh:
+    """
+    The mesh with simplified LODs appended, see generate_lods. Takes
+    seconds for a model of a few ten thousand triangles, so models have
+    it done in the background by utils.lod_builder.
+    """
+    assert not mesh.simplified
+
+    # simplified versions share the vertices, so only their indices are
+    # appended
+    lods = []
+    lod_indices = [mesh.indices]
+    offset = len(mesh.indices)
+    for error, simplified, ranges in generate_lods(
+        mesh.positions,
+        mesh.normals,
+        mesh.uvs,
+        mesh.indices,
+        [(start, count) for _, start, count in mesh.chunks],
+    ):
+        lods.append(
+            (
+                float(error),
+                [
+                    (name, offset + start, count)
+                    for (name, _, _), (start, count) in zip(
+                        mesh.chunks, ranges
+                    )
+                ],
+            )
+        )
+        lod_indices.append(simplified)
+        offset += len(simplified)
+
+    result = Mesh(
+        mesh.positions,
+        mesh.normals,
+        mesh.uvs,
+        np.concatenate(lod_indices),
+        mesh.chunks,
+        mesh.materials,
+        mesh.tangents,
+        lods,
+        simplified=True,
+    )
+    # LODs end up in the mesh cache, rather none than broken ones
+    check_lods(result)
+    return result
+
+
+def check_lods(mesh: Mesh) -> None:
+    """
+    Raise ValueError unless every LOD keeps the chunks of the full detail
+    mesh in their order, its ranges follow each other in indices, each
+    chunk has at most the triangles it had in the LOD before and indices
+    stay in range with no corner repeated within a triangle. A chunk may
+    be simplified away entirely, e.g. a small closed part.
+    """
+    names = [name for name, _, _ in mesh.chunks]
+    previous = [count for _, _, count in mesh.chunks]
+    offset = first = sum(previous)
+    last_error = 0.0
+    for lod, (error, chunks) in enumerate(mesh.lods, start=1):
+        if [name for name, _, _ in chunks] != names:
+            raise ValueError(f"lod {lod} changes the material chunks")
+        if not error >= last_error:
+            raise ValueError(
+                f"lod {lod} has a smaller error than lod {lod - 1}"
+            )
+        last_error = error
+
+        counts = [count for _, _, count in chunks]
+        starts = [start for _, start, _ in chunks]
+        if starts != [offset + sum(counts[:i]) for i in range(len(counts))]:
+            raise ValueError(f"lod {lod} ranges do not follow each other")
+        if any(count % 3 for count in counts):
+            raise ValueError(f"lod {lod} has a partial triangle")
+        if any(count > before for count, before in zip(counts, previous)):
+            raise ValueError(f"lod {lod} adds triangles to a chunk")
+        previous = counts
+        offset += sum(counts)
+
+    if offset != len(mesh.indices):
+        raise ValueError("lod ranges do not cover the indices")
+    if len(mesh.indices) and int(mesh.indices.max()) >= len(mesh.positions):
+        raise ValueError("lod indices out of range")
+    # the full detail triangles are as the .obj file has them
+    triangles = mesh.indices[first:].reshape(-1, 3)
+    if np.any(
+        (triangles[:, 0] == triangles[:, 1])
+        | (triangles[:, 1] == triangles[:, 2])
+        | (triangles[:, 2] == triangles[:, 0])
+    ):
+        raise ValueError("lod has a degenerate triangle")
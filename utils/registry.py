@@ -0,0 +1,66 @@
+from typing import Any, Callable, Dict, Hashable, List
+
+from utils.log import get_logger
+
+logger = get_logger()
+
+
+class Registry:
+    """Reference counted store of shared resources, e.g. models or shader
+    programs that several entities would otherwise each create."""
+
+    name: str
+    entries: Dict[Hashable, List[Any]]
+    # short label of a key for the log, keys can be large, e.g. the full
+    # sources of a shader program
+    describe: Callable[[Hashable], str]
+
+    hits: int = 0
+    misses: int = 0
+
+    def __init__(self, name: str, describe: Callable[[Hashable], str] = str):
+        self.name = name
+        self.entries = {}
+        self.describe = describe
+
+    def acquire(
+        self,
+        key: Hashable,
+        create: Callable[[], Any],
+        destroy: Callable[[Any], None] = None,
+    ) -> Any:
+        """Return the resource stored under key, creating it on first use.
+        Every acquire must be paired with a release."""
+        entry = self.entries.get(key)
+        if entry is not None:
+            entry[1] += 1
+            self.hits += 1
+            logger.debug(
+                f"reusing {self.name}: {self.describe(key)} "
+                f"(refs {entry[1]})"
+            )
+            return entry[0]
+
+        self.misses += 1
+        resource = create()
+        self.entries[key] = [resource, 1, destroy]
+        return resource
+
+    def release(self, key: Hashable) -> None:
+        entry = self.entries[key]
+        entry[1] -= 1
+        if entry[1] > 0:
+            return
+
+        del self.entries[key]
+        resource, _, destroy = entry
+        if destroy is not None:
+            destroy(resource)
+        logger.debug(f"released {self.name}: {self.describe(key)}")
+
+    def refs(self, key: Hashable) -> int:
+        entry = self.entries.get(key)
+        return entry[1] if entry is not None else 0
+
+    def __len__(self) -> int:
+        return len(self.entries)
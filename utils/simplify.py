@@ -0,0 +1,354 @@
+import heapq
+from typing import List, Tuple
+
+import numpy as np
+
+from utils.mesh import tipsify
+
+# fraction of the full triangle count kept by every generated LOD
+LOD_RATIOS = (0.5, 0.25, 0.125)
+
+# weight of the planes that keep open borders and material boundaries in
+# place, relative to the surface planes
+BORDER_WEIGHT = 100.0
+
+# collapses may tilt a triangle by at most acos(MIN_NORMAL_DOT)
+MIN_NORMAL_DOT = 0.2
+
+# (offset, count) ranges into an index buffer
+IndexRange = Tuple[int, int]
+
+
+def _plane_quadrics(p0, p1, p2):
+    """Area weighted plane quadrics, (n, 4, 4), and triangle areas."""
+    normal = np.cross(p1 - p0, p2 - p0)
+    double_area = np.linalg.norm(normal, axis=1)
+    normal /= np.maximum(double_area, 1e-20)[:, None]
+    plane = np.concatenate(
+        [normal, -np.einsum("ij,ij->i", normal, p0)[:, None]], axis=1
+    )
+    area = 0.5 * double_area
+    return np.einsum("i,ij,ik->ijk", area, plane, plane), area
+
+
+def _edge_quadrics(a, b, face_normal, weight):
+    """Quadrics of planes through the edges a-b perpendicular to their
+    faces, penalizing movement away from a border."""
+    edge = b - a
+    normal = np.cross(edge, face_normal)
+    normal /= np.maximum(np.linalg.norm(normal, axis=1), 1e-20)[:, None]
+    plane = np.concatenate(
+        [normal, -np.einsum("ij,ij->i", normal, a)[:, None]], axis=1
+    )
+    scale = weight * np.einsum("ij,ij->i", edge, edge)
+    return np.einsum("i,ij,ik->ijk", scale, plane, plane)
+
+
+class Simplifier:
+    """
+    Quadric error metric simplification (Garland, Heckbert 1997) using half
+    edge collapses, so every LOD is a new index buffer over the original
+    vertices.
+
+    Quadrics and topology are tracked per position, vertices that only
+    differ in normal or uv (attribute seams) collapse together and only
+    along edges that keep the seam intact. Open borders and edges between
+    two material chunks only collapse along themselves, corners where
+    more than two such edges meet never move.
+    """
+
+    def __init__(
+        self,
+        positions: np.ndarray,
+        normals: np.ndarray,
+        uvs: np.ndarray,
+        indices: np.ndarray,
+        ranges,
+    ):
+        self.positions = positions
+        self.attributes = np.concatenate([normals, uvs], axis=1)
+        self.tris = indices.reshape(-1, 3).tolist()
+        self.alive = [True] * len(self.tris)
+        self.num_alive = len(self.tris)
+
+        tri_chunk = np.zeros(len(self.tris), dtype=np.int64)
+        for chunk, (offset, count) in enumerate(ranges):
+            tri_chunk[offset // 3 : (offset + count) // 3] = chunk
+
+        # vertices sharing a position form one group
+        rows = np.ascontiguousarray(positions, dtype=np.float32)
+        _, first, group = np.unique(
+            rows.view(np.dtype((np.void, rows.itemsize * 3))).reshape(-1),
+            return_index=True,
+            return_inverse=True,
+        )
+        group = group.reshape(-1)
+        self.group = group.tolist()
+        self.point = positions[first].astype(np.float64)
+        self.homogeneous = np.concatenate(
+            [self.point, np.ones((len(first), 1))], axis=1
+        )
+        num_groups = len(first)
+
+        tri_groups = group[indices.reshape(-1, 3)]
+        p0, p1, p2 = (self.point[tri_groups[:, k]] for k in range(3))
+        face_quadrics, area = _plane_quadrics(p0, p1, p2)
+        self.quadric = np.zeros((num_groups, 4, 4))
+        self.area = np.zeros(num_groups)
+        for k in range(3):
+            np.add.at(self.quadric, tri_groups[:, k], face_quadrics)
+            np.add.at(self.area, tri_groups[:, k], area)
+
+        # edges in position space, with the faces on either side
+        edges = np.concatenate(
+            [
+                tri_groups[:, [0, 1]],
+                tri_groups[:, [1, 2]],
+                tri_groups[:, [2, 0]],
+            ]
+        )
+        edge_tri = np.tile(np.arange(len(self.tris)), 3)
+        keys = np.sort(edges, axis=1)
+        _, edge_id, edge_uses = np.unique(
+            keys, axis=0, return_inverse=True, return_counts=True
+        )
+        edge_id = edge_id.reshape(-1)
+        uses = edge_uses[edge_id]
+
+        # an edge between two chunks has the same key in both of them
+        chunk_low = np.full(len(edge_uses), np.iinfo(np.int64).max)
+        chunk_high = np.full(len(edge_uses), -1)
+        np.minimum.at(chunk_low, edge_id, tri_chunk[edge_tri])
+        np.maximum.at(chunk_high, edge_id, tri_chunk[edge_tri])
+        chunk_border = chunk_low[edge_id] != chunk_high[edge_id]
+
+        constrained = (uses == 1) | chunk_border
+        normals = np.cross(p1 - p0, p2 - p0)
+        border_quadrics = _edge_quadrics(
+            self.point[edges[constrained, 0]],
+            self.point[edges[constrained, 1]],
+            normals[edge_tri[constrained]],
+            BORDER_WEIGHT,
+        )
+        for k in range(2):
+            np.add.at(self.quadric, edges[constrained, k], border_quadrics)
+
+        # groups connected to every group by a constrained edge
+        self.border = [set() for _ in range(num_groups)]
+        for a, b in set(map(tuple, keys[constrained].tolist())):
+            self.border[a].add(b)
+            self.border[b].add(a)
+        constrained_count = np.array([len(b) for b in self.border])
+
+        locked = np.zeros(num_groups, dtype=bool)
+        # non-manifold edges and border corners
+        locked[edges[uses > 2].reshape(-1)] = True
+        locked[(constrained_count != 0) & (constrained_count != 2)] = True
+        self.locked = locked.tolist()
+        self.on_border = (constrained_count != 0).tolist()
+
+        self.group_tris = [set() for _ in range(num_groups)]
+        for t, tri in enumerate(self.tris):
+            for v in tri:
+                self.group_tris[self.group[v]].add(t)
+
+        self.stamp = [0] * num_groups
+        self.error = 0.0
+        self.heap = []
+        for a, b in set(map(tuple, keys.tolist())):
+            self._push(a, b)
+            self._push(b, a)
+
+    def _cost(self, source: int, target: int) -> float:
+        q = self.quadric[source] + self.quadric[target]
+        v = self.homogeneous[target]
+        cost = max(float(v @ q @ v), 0.0)
+        # rms distance to the planes of both, in model units
+        return np.sqrt(
+            cost / max(self.area[source] + self.area[target], 1e-20)
+        )
+
+    def _push(self, source: int, target: int):
+        if self.locked[source]:
+            return
+        if self.on_border[source] and target not in self.border[source]:
+            return
+        heapq.heappush(
+            self.heap,
+            (
+                self._cost(source, target),
+                source,
+                target,
+                self.stamp[source],
+                self.stamp[target],
+            ),
+        )
+
+    def _wedge_map(self, source: int, target: int):
+        """Vertex of target replacing every vertex of source, preferring
+        the one sharing a triangle so seams stay intact, else the one with
+        the closest normal and uv."""
+        mapping = {}
+        for t in self.group_tris[source]:
+            tri = self.tris[t]
+            w = [v for v in tri if self.group[v] == source][0]
+            u = [v for v in tri if self.group[v] == target]
+            if u:
+                if mapping.setdefault(w, u[0]) != u[0]:
+                    # both sides of a seam end in this vertex
+                    return None
+
+        candidates = {
+            v
+            for t in self.group_tris[target]
+            for v in self.tris[t]
+            if self.group[v] == target
+        }
+        candidates = list(candidates)
+        for t in self.group_tris[source]:
+            for w in self.tris[t]:
+                if self.group[w] == source and w not in mapping:
+                    distance = np.sum(
+                        (self.attributes[candidates] - self.attributes[w])
+                        ** 2,
+                        axis=1,
+                    )
+                    mapping[w] = candidates[int(np.argmin(distance))]
+        return mapping
+
+    def _flips(self, source: int, target: int) -> bool:
+        """Whether moving source onto target would fold over or degenerate
+        any of the triangles that remain."""
+        corners = [
+            [self.group[v] for v in self.tris[t]]
+            for t in self.group_tris[source]
+        ]
+        corners = np.array([c for c in corners if target not in c])
+        if len(corners) == 0:
+            return False
+
+        p = self.point[corners]
+        before = np.cross(p[:, 1] - p[:, 0], p[:, 2] - p[:, 0])
+        p[corners == source] = self.point[target]
+        after = np.cross(p[:, 1] - p[:, 0], p[:, 2] - p[:, 0])
+        norm = np.linalg.norm(before, axis=1) * np.linalg.norm(after, axis=1)
+        dot = np.einsum("ij,ij->i", before, after)
+        return bool(np.any((norm <= 0.0) | (dot < MIN_NORMAL_DOT * norm)))
+
+    def _collapse(self, source: int, target: int, mapping) -> None:
+        for t in list(self.group_tris[source]):
+            tri = self.tris[t]
+            if any(self.group[v] == target for v in tri):
+                self.alive[t] = False
+                self.num_alive -= 1
+                for v in tri:
+                    self.group_tris[self.group[v]].discard(t)
+            else:
+                self.tris[t] = [mapping.get(v, v) for v in tri]
+                self.group_tris[target].add(t)
+        self.group_tris[source].clear()
+
+        # a border vertex only collapses along the border, its other border
+        # edge now ends in target
+        for other in self.border[source]:
+            self.border[other].discard(source)
+            if other != target:
+                self.border[other].add(target)
+                self.border[target].add(other)
+        self.border[source].clear()
+
+        self.quadric[target] += self.quadric[source]
+        self.area[target] += self.area[source]
+        self.stamp[source] += 1
+        self.stamp[target] += 1
+        self.locked[source] = True
+
+        neighbours = {
+            self.group[v]
+            for t in self.group_tris[target]
+            for v in self.tris[t]
+        }
+        neighbours.discard(target)
+        for other in neighbours:
+            self._push(target, other)
+            self._push(other, target)
+
+    def simplify(self, target_tris: int, max_error: float = np.inf) -> None:
+        """Collapse edges, cheapest first, until at most target_tris
+        triangles are left or the next collapse would exceed max_error."""
+        while self.num_alive > target_tris and self.heap:
+            cost, source, target, s_stamp, t_stamp = heapq.heappop(self.heap)
+            if s_stamp != self.stamp[source] or t_stamp != self.stamp[target]:
+                continue
+            if cost > max_error:
+                heapq.heappush(
+                    self.heap, (cost, source, target, s_stamp, t_stamp)
+                )
+                return
+            mapping = self._wedge_map(source, target)
+            if mapping is None or self._flips(source, target):
+                continue
+            self._collapse(source, target, mapping)
+            self.error = max(self.error, cost)
+
+    def indices(self, num_ranges: int, ranges) -> Tuple[np.ndarray, list]:
+        """Remaining triangles, still grouped by the original ranges."""
+        out = []
+        out_ranges = []
+        offset = 0
+        for start, count in ranges[:num_ranges]:
+            tris = [
+                self.tris[t]
+                for t in range(start // 3, (start + count) // 3)
+                if self.alive[t]
+            ]
+            out += tris
+            out_ranges.append((offset, 3 * len(tris)))
+            offset += 3 * len(tris)
+        return np.array(out, dtype=np.uint32).reshape(-1), out_ranges
+
+
+def generate_lods(
+    positions: np.ndarray,
+    normals: np.ndarray,
+    uvs: np.ndarray,
+    indices: np.ndarray,
+    ranges: List[IndexRange],
+    ratios=LOD_RATIOS,
+    max_error: float = None,
+) -> List[Tuple[float, np.ndarray, List[IndexRange]]]:
+    """
+    Simplify the triangles of every (offset, count) range of indices
+    progressively, each LOD continuing from the previous one. Triangles
+    are reordered for the vertex cache within each range, vertices are
+    never renumbered so all LODs can share one vertex buffer.
+
+    returns:
+        (error, indices, ranges) for every LOD that came out meaningfully
+        smaller than the one before it, error is the largest rms distance
+        in model units the surface moved
+    """
+    if max_error is None:
+        # anything coarser only ever covers a handful of pixels
+        extent = np.ptp(positions, axis=0) if len(positions) else [0.0]
+        max_error = 0.05 * float(np.max(extent))
+
+    simplifier = Simplifier(positions, normals, uvs, indices, ranges)
+    num_tris = len(indices) // 3
+    previous = num_tris
+    lods = []
+    for ratio in ratios:
+        simplifier.simplify(int(num_tris * ratio), max_error)
+        if simplifier.num_alive > 0.9 * previous:
+            break
+        previous = simplifier.num_alive
+
+        lod_indices, lod_ranges = simplifier.indices(len(ranges), ranges)
+        for offset, count in lod_ranges:
+            chunk = lod_indices[offset : offset + count]
+            if count:
+                local_verts, local = np.unique(chunk, return_inverse=True)
+                ordered = tipsify(local.reshape(-1, 3))
+                chunk[:] = local_verts[ordered.reshape(-1)]
+        lods.append((simplifier.error, lod_indices, lod_ranges))
+    return lods
@@ -0,0 +1,54 @@
+from collections import defaultdict
+from typing import Dict
+
+from utils.log import get_logger
+
+logger = get_logger()
+
+
+class FrameStats:
+    """Counters of work submitted per frame, e.g. triangles or draw calls,
+    averaged over every reporting interval."""
+
+    counters: Dict[str, int]
+    totals: Dict[str, int]
+    frames: int = 0
+
+    # seconds between reports
+    interval: float = 5.0
+    last_report: float = None
+
+    def __init__(self):
+        self.counters = defaultdict(int)
+        self.totals = defaultdict(int)
+
+    def add(self, name: str, value: int = 1) -> None:
+        self.counters[name] += value
+
+    def end_frame(self, now: float) -> None:
+        """Close the current frame, logging the averages once per
+        interval."""
+        for name, value in self.counters.items():
+            self.totals[name] += value
+        self.counters.clear()
+        self.frames += 1
+
+        if self.last_report is None:
+            self.last_report = now
+        elif now - self.last_report >= self.interval:
+            logger.debug(f"per frame: {self.report()}")
+            self.totals.clear()
+            self.frames = 0
+            self.last_report = now
+
+    def average(self, name: str) -> float:
+        return self.totals[name] / max(self.frames, 1)
+
+    def report(self) -> str:
+        return ", ".join(
+            f"{name} {self.average(name):.0f}" for name in sorted(self.totals)
+        )
+
+
+# shared by everything that renders
+stats = FrameStats()
@@ -0,0 +1,372 @@
+import argparse
+import fnmatch
+import hashlib
+import json
+import os
+import struct
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import List, Optional, Tuple
+
+import numpy as np
+from PIL import Image
+
+import constants
+from utils.log import get_logger
+
+logger = get_logger()
+
+# bump whenever the layout of a cooked file or the encoder changes
+COOK_VERSION = 1
+
+MAGIC = b"NDTEX\0\0\0"
+HEADER = struct.Struct("<8sQ")
+ALIGNMENT = 16
+
+TEXTURE_EXTENSIONS = (".png", ".jpg", ".jpeg", ".dds", ".tga", ".bmp")
+
+# images loaded with flip=True, i.e. the cube map faces, see CubeMap
+FLIPPED_PATTERNS = ("*/skybox/*",)
+
+# blocks encoded at once, bounds the temporary float arrays
+BLOCKS_PER_SLAB = 1 << 16
+
+# (width, height, offset, size) of every mip level, full size first
+Levels = List[Tuple[int, int, int, int]]
+
+
+def cooked_filename(path: str, flip: bool = False) -> str:
+    # textures with the same name in different directories must not
+    # overwrite each other
+    path = os.path.abspath(path)
+    path_digest = hashlib.sha1(path.encode("utf8")).hexdigest()[:8]
+    suffix = "-flipped" if flip else ""
+    return os.path.join(
+        constants.COOKED_TEXTURE_DIR,
+        f"{os.path.basename(path)}-{path_digest}{suffix}.tex",
+    )
+
+
+def _align(offset: int) -> int:
+    return (offset + ALIGNMENT - 1) // ALIGNMENT * ALIGNMENT
+
+
+def to_blocks(pixels: np.ndarray) -> np.ndarray:
+    """Split rows of rgba pixels into (blocks, 16, 4) 4x4 blocks, row
+    major, repeating the last row and column to fill partial blocks."""
+    height, width, _ = pixels.shape
+    padded = np.pad(
+        pixels,
+        ((0, -height % 4), (0, -width % 4), (0, 0)),
+        mode="edge",
+    )
+    rows, cols = padded.shape[0] // 4, padded.shape[1] // 4
+    blocks = padded.reshape(rows, 4, cols, 4, 4).swapaxes(1, 2)
+    return blocks.reshape(rows * cols, 16, 4)
+
+
+def _expand_565(colors: np.ndarray) -> np.ndarray:
+    red = (colors >> 11) & 31
+    green = (colors >> 5) & 63
+    blue = colors & 31
+    return np.stack(
+        [(red << 3) | (red >> 2), (green << 2) | (green >> 4)]
+        + [(blue << 3) | (blue >> 2)],
+        axis=-1,
+    ).astype(np.float32)
+
+
+def _pack_565(colors: np.ndarray) -> np.ndarray:
+    colors = np.clip(np.rint(colors), 0, 255).astype(np.uint16)
+    return (
+        ((colors[:, 0] * 31 + 127) // 255) << 11
+        | ((colors[:, 1] * 63 + 127) // 255) << 5
+        | ((colors[:, 2] * 31 + 127) // 255)
+    ).astype(np.uint16)
+
+
+def encode_color(blocks: np.ndarray) -> np.ndarray:
+    """
+    BC1 color blocks in four color mode, endpoints at the extremes of the
+    block along its principal axis.
+
+    returns:
+        (blocks, 8) uint8
+    """
+    colors = blocks[:, :, :3].astype(np.float32)
+    mean = colors.mean(axis=1, keepdims=True)
+    centered = colors - mean
+    covariance = np.einsum("nki,nkj->nij", centered, centered)
+
+    # a few power iterations find the principal axis well enough
+    axis = np.ones((len(blocks), 3), dtype=np.float32)
+    for _ in range(8):
+        axis = np.einsum("nij,nj->ni", covariance, axis)
+        length = np.linalg.norm(axis, axis=1, keepdims=True)
+        axis = np.where(length > 1e-6, axis / np.maximum(length, 1e-6), 0.0)
+
+    projected = np.einsum("nki,ni->nk", centered, axis)
+    low = mean[:, 0] + axis * projected.min(axis=1, keepdims=True)
+    high = mean[:, 0] + axis * projected.max(axis=1, keepdims=True)
+
+    color0 = _pack_565(high)
+    color1 = _pack_565(low)
+    swap = color0 < color1
+    color0, color1 = np.where(swap, color1, color0), np.where(
+        swap, color0, color1
+    )
+
+    end0 = _expand_565(color0)
+    end1 = _expand_565(color1)
+    palette = np.stack(
+        [end0, end1, (2 * end0 + end1) / 3, (end0 + 2 * end1) / 3], axis=1
+    )
+    distances = ((colors[:, :, None, :] - palette[:, None, :, :]) ** 2).sum(
+        axis=-1
+    )
+    indices = distances.argmin(axis=2).astype(np.uint32)
+    # equal endpoints select three color mode, where only index 0 is safe
+    indices[color0 == color1] = 0
+
+    packed = np.zeros(
+        len(blocks), dtype=[("c0", "<u2"), ("c1", "<u2"), ("bits", "<u4")]
+    )
+    packed["c0"] = color0
+    packed["c1"] = color1
+    packed["bits"] = (indices << (2 * np.arange(16, dtype=np.uint32))).sum(
+        axis=1, dtype=np.uint32
+    )
+    return packed.view(np.uint8).reshape(-1, 8)
+
+
+def encode_alpha(blocks: np.ndarray) -> np.ndarray:
+    """
+    BC3 alpha blocks with eight interpolated values between the block's
+    extremes.
+
+    returns:
+        (blocks, 8) uint8
+    """
+    alpha = blocks[:, :, 3].astype(np.float32)
+    alpha0 = alpha.max(axis=1)
+    alpha1 = alpha.min(axis=1)
+
+    weights = np.array([0, 7, 1, 2, 3, 4, 5, 6], dtype=np.float32) / 7
+    palette = np.rint(
+        alpha0[:, None] * (1 - weights) + alpha1[:, None] * weights
+    )
+    distances = np.abs(alpha[:, :, None] - palette[:, None, :])
+    indices = distances.argmin(axis=2).astype(np.uint64)
+
+    bits = (indices << (3 * np.arange(16, dtype=np.uint64))).sum(
+        axis=1, dtype=np.uint64
+    )
+    packed = np.zeros((len(blocks), 8), dtype=np.uint8)
+    packed[:, 0] = alpha0.astype(np.uint8)
+    packed[:, 1] = alpha1.astype(np.uint8)
+    packed[:, 2:] = bits[:, None].view(np.uint8).reshape(-1, 8)[:, :6]
+    return packed
+
+
+def encode(pixels: np.ndarray, compression: str) -> bytes:
+    """Block compress (height, width, 4) uint8 rgba pixels as bc1 or
+    bc3."""
+    blocks = to_blocks(pixels)
+    encoded = []
+    for start in range(0, len(blocks), BLOCKS_PER_SLAB):
+        slab = blocks[start : start + BLOCKS_PER_SLAB]
+        if compression == "bc3":
+            encoded.append(np.hstack([encode_alpha(slab), encode_color(slab)]))
+        else:
+            encoded.append(encode_color(slab))
+    return np.concatenate(encoded).tobytes()
+
+
+def mip_chain(image: Image.Image) -> List[Image.Image]:
+    """Box filtered mip levels down to 1x1, full size first."""
+    levels = [image]
+    while image.size != (1, 1):
+        image = image.resize(
+            (max(image.size[0] // 2, 1), max(image.size[1] // 2, 1)),
+            Image.BOX,
+        )
+        levels.append(image)
+    return levels
+
+
+def cook_texture(path: str, flip: bool = False) -> str:
+    """
+    Compress an image and all of its mip levels into a cooked file, rows
+    already in the order glCompressedTexImage2D expects.
+
+    layout:
+        magic, header length
+        json header (source mtime, compression, levels)
+        block data of every level, each aligned to 16 bytes
+    """
+    source_mtime = os.stat(path).st_mtime_ns
+    with Image.open(path) as image:
+        image = image.convert("RGBA")
+    if not flip:
+        # bottom row first, as decode_image does
+        image = image.transpose(Image.FLIP_TOP_BOTTOM)
+
+    alpha = image.getextrema()[3][0] < 255
+    compression = "bc3" if alpha else "bc1"
+
+    levels = []
+    data = []
+    offset = 0
+    for level in mip_chain(image):
+        encoded = encode(np.asarray(level), compression)
+        levels.append((level.size[0], level.size[1], offset, len(encoded)))
+        data.append(encoded)
+        offset = _align(offset + len(encoded))
+
+    header = json.dumps(
+        {
+            "version": COOK_VERSION,
+            "source_mtime": source_mtime,
+            "compression": compression,
+            "alpha": alpha,
+            "levels": levels,
+        }
+    ).encode("utf8")
+    data_start = _align(HEADER.size + len(header))
+
+    cooked_path = cooked_filename(path, flip)
+    os.makedirs(os.path.dirname(cooked_path), exist_ok=True)
+    temp_path = f"{cooked_path}.{os.getpid()}.tmp"
+    with open(temp_path, "wb") as out_file:
+        out_file.write(HEADER.pack(MAGIC, len(header)))
+        out_file.write(header)
+        for (_, _, level_offset, _), encoded in zip(levels, data):
+            out_file.seek(data_start + level_offset)
+            out_file.write(encoded)
+    os.replace(temp_path, cooked_path)
+    return cooked_path
+
+
+def read_header(in_file) -> Tuple[dict, int]:
+    magic, header_length = HEADER.unpack(in_file.read(HEADER.size))
+    if magic != MAGIC:
+        raise ValueError("not a cooked texture")
+    header = json.loads(in_file.read(header_length).decode("utf8"))
+    return header, _align(HEADER.size + header_length)
+
+
+def is_fresh(path: str, flip: bool = False) -> bool:
+    """Whether a cooked file exists for the current version of path."""
+    try:
+        source_mtime = os.stat(path).st_mtime_ns
+        with open(cooked_filename(path, flip), "rb") as in_file:
+            header, _ = read_header(in_file)
+    except (OSError, ValueError, KeyError):
+        return False
+    return (
+        header["version"] == COOK_VERSION
+        and header["source_mtime"] == source_mtime
+    )
+
+
+def read_cooked(
+    path: str, flip: bool = False
+) -> Optional[Tuple[str, bool, Levels, bytes]]:
+    """
+    Read the cooked file of path, None if there is none or it is older
+    than path.
+
+    returns:
+        compression, whether it has alpha, levels, block data of every
+        level
+    """
+    try:
+        source_mtime = os.stat(path).st_mtime_ns
+        with open(cooked_filename(path, flip), "rb") as in_file:
+            header, data_start = read_header(in_file)
+            if (
+                header["version"] != COOK_VERSION
+                or header["source_mtime"] != source_mtime
+            ):
+                return None
+            in_file.seek(data_start)
+            data = in_file.read()
+    except FileNotFoundError:
+        return None
+    except (OSError, ValueError, KeyError) as e:
+        logger.warning(f"ignoring unreadable cooked texture '{path}': {e}")
+        return None
+
+    levels = [tuple(level) for level in header["levels"]]
+    return header["compression"], header["alpha"], levels, data
+
+
+def find_textures(root: str) -> List[str]:
+    paths = []
+    for directory, _, filenames in os.walk(root):
+        for filename in sorted(filenames):
+            if filename.lower().endswith(TEXTURE_EXTENSIONS):
+                paths.append(os.path.join(directory, filename))
+    return sorted(paths)
+
+
+def _cook(path: str, flip: bool) -> Tuple[str, float]:
+    start = time.perf_counter()
+    cook_texture(path, flip)
+    return path, time.perf_counter() - start
+
+
+def cook_all(
+    root: str = "assets",
+    workers: int = None,
+    force: bool = False,
+    flipped: Tuple[str, ...] = FLIPPED_PATTERNS,
+) -> int:
+    """Cook every texture below root whose cooked file is missing or
+    older than the texture, returns how many were cooked."""
+    paths = find_textures(root)
+    jobs = []
+    for path in paths:
+        flip = any(fnmatch.fnmatch(path, pattern) for pattern in flipped)
+        if force or not is_fresh(path, flip):
+            jobs.append((path, flip))
+
+    skipped = len(paths) - len(jobs)
+    logger.info(f"cooking {len(jobs)} textures, {skipped} up to date")
+    if not jobs:
+        return 0
+
+    cooked = 0
+    with ProcessPoolExecutor(workers) as executor:
+        futures = [executor.submit(_cook, path, flip) for path, flip in jobs]
+        for (path, _), future in zip(jobs, futures):
+            try:
+                _, seconds = future.result()
+            except Exception as e:
+                logger.warning(f"failed to cook '{path}': {e}")
+                continue
+            cooked += 1
+            logger.info(f"cooked {path} in {seconds:.2f}s")
+    return cooked
+
+
+def main(argv: List[str] = None) -> None:
+    parser = argparse.ArgumentParser(
+        description="Compress textures ahead of time so they upload "
+        "directly with glCompressedTexImage2D."
+    )
+    parser.add_argument("root", nargs="?", default="assets")
+    parser.add_argument(
+        "-j", "--workers", type=int, default=None, help="worker processes"
+    )
+    parser.add_argument(
+        "-f", "--force", action="store_true", help="cook up to date files"
+    )
+    parser.add_argument(
+        "--flip",
+        action="append",
+        default=list(FLIPPED_PATTERNS),
+        help="glob of images loaded flipped, e.g. cube map faces",
+    )
+    args = parser.parse_args(argv)
+    cook_all(args.root, args.workers, args.force, tuple(args.flip))
@@ -0,0 +1,164 @@
+from typing import List, Optional, Tuple
+
+import numpy as np
+import OpenGL.GL as gl
+
+# (shader location, field name, components, gl type, normalized)
+VertexAttribute = Tuple[int, str, int, int, bool]
+
+
+class VertexLayout:
+    """Interleaved vertex buffer layout, described as a structured numpy
+    dtype plus the matching glVertexAttribPointer arguments."""
+
+    dtype: np.dtype
+    attributes: List[VertexAttribute]
+
+    # positionAttribute * scale + offset gives model space positions
+    dequant_scale: np.ndarray
+    dequant_offset: np.ndarray
+
+    def __init__(self, dtype, attributes, dequant_scale, dequant_offset):
+        self.dtype = dtype
+        self.attributes = attributes
+        self.dequant_scale = dequant_scale
+        self.dequant_offset = dequant_offset
+
+    @property
+    def stride(self) -> int:
+        return self.dtype.itemsize
+
+    def offset(self, field: str) -> int:
+        return self.dtype.fields[field][1]
+
+
+def pack_snorm_2_10_10_10(xyz: np.ndarray, w: np.ndarray = None):
+    """
+    Pack (n, 3) values in [-1, 1] into GL_INT_2_10_10_10_REV words.
+
+    Uses the GL 4.2+ signed normalized mapping (c / 511); older drivers
+    decode with (2c + 1) / 1023 which is off by at most 1/1023, well below
+    what matters for normals and tangents.
+    """
+    q = np.round(np.clip(xyz, -1.0, 1.0) * 511.0).astype(np.int32) & 0x3FF
+    packed = q[:, 0] | (q[:, 1] << 10) | (q[:, 2] << 20)
+    if w is not None:
+        packed |= (np.round(w).astype(np.int32) & 0x3) << 30
+    return packed.astype(np.int32)
+
+
+def unpack_snorm_2_10_10_10(packed: np.ndarray) -> np.ndarray:
+    """Inverse of pack_snorm_2_10_10_10, returning (n, 4) float32."""
+    packed = packed.astype(np.int32)
+    out = np.empty((len(packed), 4), dtype=np.float32)
+    for i, (shift, bits) in enumerate([(0, 10), (10, 10), (20, 10), (30, 2)]):
+        c = (packed >> shift) & ((1 << bits) - 1)
+        c = np.where(c >= 1 << (bits - 1), c - (1 << bits), c)
+        out[:, i] = np.maximum(c / float((1 << (bits - 1)) - 1), -1.0)
+    return out
+
+
+def quantize_positions(positions: np.ndarray):
+    """Map positions onto the bounding box as normalized uint16."""
+    low = positions.min(axis=0) if len(positions) else np.zeros(3)
+    high = positions.max(axis=0) if len(positions) else np.zeros(3)
+    scale = np.where(high > low, high - low, 1.0).astype(np.float32)
+    q = np.round((positions - low) / scale * 65535.0)
+    return q.astype(np.uint16), scale, low.astype(np.float32)
+
+
+def pack_vertices(
+    positions: np.ndarray,
+    normals: np.ndarray,
+    uvs: np.ndarray,
+    tangents: Optional[np.ndarray] = None,
+    compact: bool = True,
+    quantize: bool = False,
+    locations: Tuple[int, int, int, int, int] = (0, 1, 2, 3, 4),
+) -> Tuple[np.ndarray, VertexLayout]:
+    """
+    Interleave vertex streams into a single buffer. Tangents, (n, 4) with
+    the bitangent sign in w, are only stored when given; without them the
+    tangent attributes are left to constant values.
+
+    full layout (32 bytes, 56 with tangents):
+        float32 position, normal, uv, tangent, bitangent
+    compact layout (20 bytes, 24 with tangents, 4 less with quantize):
+        float32 position (or normalized uint16 xyz + padding),
+        2_10_10_10 normal, half float uv,
+        2_10_10_10 tangent with the bitangent sign in w
+    """
+    position_loc, normal_loc, uv_loc, tangent_loc, bitangent_loc = locations
+    num_verts = len(positions)
+    scale = np.ones(3, dtype=np.float32)
+    offset = np.zeros(3, dtype=np.float32)
+
+    if not compact:
+        fields = [
+            ("position", np.float32, 3),
+            ("normal", np.float32, 3),
+            ("uv", np.float32, 2),
+        ]
+        attributes = [
+            (position_loc, "position", 3, gl.GL_FLOAT, False),
+            (normal_loc, "normal", 3, gl.GL_FLOAT, False),
+            (uv_loc, "uv", 2, gl.GL_FLOAT, False),
+        ]
+        if tangents is not None:
+            fields += [
+                ("tangent", np.float32, 3),
+                ("bitangent", np.float32, 3),
+            ]
+            attributes += [
+                (tangent_loc, "tangent", 3, gl.GL_FLOAT, False),
+                (bitangent_loc, "bitangent", 3, gl.GL_FLOAT, False),
+            ]
+
+        dtype = np.dtype(fields)
+        data = np.empty(num_verts, dtype=dtype)
+        data["position"] = positions
+        data["normal"] = normals
+        data["uv"] = uvs
+        if tangents is not None:
+            data["tangent"] = tangents[:, :3]
+            data["bitangent"] = (
+                np.cross(normals, tangents[:, :3]) * tangents[:, 3:4]
+            )
+        return data, VertexLayout(dtype, attributes, scale, offset)
+
+    if quantize:
+        fields = [("position", np.uint16, 4)]
+        attributes = [
+            (position_loc, "position", 3, gl.GL_UNSIGNED_SHORT, True),
+        ]
+    else:
+        fields = [("position", np.float32, 3)]
+        attributes = [(position_loc, "position", 3, gl.GL_FLOAT, False)]
+
+    fields += [("normal", np.int32), ("uv", np.float16, 2)]
+    attributes += [
+        (normal_loc, "normal", 4, gl.GL_INT_2_10_10_10_REV, True),
+        (uv_loc, "uv", 2, gl.GL_HALF_FLOAT, False),
+    ]
+    if tangents is not None:
+        fields += [("tangent", np.int32)]
+        attributes += [
+            (tangent_loc, "tangent", 4, gl.GL_INT_2_10_10_10_REV, True),
+        ]
+
+    dtype = np.dtype(fields)
+    data = np.zeros(num_verts, dtype=dtype)
+
+    if quantize:
+        data["position"][:, :3], scale, offset = quantize_positions(positions)
+    else:
+        data["position"] = positions
+
+    data["normal"] = pack_snorm_2_10_10_10(normals)
+    data["uv"] = uvs
+    if tangents is not None:
+        data["tangent"] = pack_snorm_2_10_10_10(
+            tangents[:, :3], tangents[:, 3]
+        )
+
+    return data, VertexLayout(dtype, attributes, scale, offset)